@@ -0,0 +1,165 @@
+"""
+用户 admin 列表页基准测试
+
+在 SQLite 中预置大量用户，分别用 Django 默认的列表页（COUNT(*) + OFFSET 分页 + LIKE '%x%' 搜索）
+和 users.admin.UserAdmin（键集分页 + 估算行数 + 前缀搜索）打开首页、中间页、末页、搜索和过滤结果，
+统计每个请求的耗时（含模板渲染）、其中SQL的耗时和查询数；模板渲染的耗时与表的大小无关，SQL的耗时随行数、页码增长：
+    python -m benchmarks.admin              # 预置 200000 个用户
+    python -m benchmarks.admin -u 1000000   # 预置的用户数，已有的用户不重复创建
+SQLite 没有行数的统计信息，超过 count_limit 时显示“10000+”；SQLite 的 LIKE 不区分大小写，不能使用普通索引，
+前缀搜索在 MySQL（LIKE 'x%' 使用 username、mobile 的唯一索引）上的差距比这里大。
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+from benchmarks.run import PASSWORD, percentile  # noqa: E402
+
+BATCH_SIZE = 5000
+
+
+def seed_users(total):
+    """按注册时间递增预置用户，每1000个中有1个管理员"""
+    from django.contrib.auth.hashers import make_password
+    from django.core.management import call_command
+    from django.utils import timezone
+    from users.models import User
+
+    call_command('migrate', verbosity=0)
+    existing = User.objects.filter(username__startswith='admin').count()
+    encoded = make_password(PASSWORD)
+    started = timezone.now() - datetime.timedelta(days=365)
+    for offset in range(existing, total, BATCH_SIZE):
+        User.objects.bulk_create([
+            User(
+                username='admin%07d' % i, mobile='13%09d' % i, password=encoded, is_staff=i % 1000 == 0,
+                date_joined=started + datetime.timedelta(seconds=i * 10),
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, total))
+        ])
+    return User.objects.create_superuser('bench_root%d' % time.time(), mobile='12%09d' % (time.time() % 1e9),
+                                         password=PASSWORD)
+
+
+def make_admins():
+    """
+    :return: (Django 默认列表页的 admin, UserAdmin)
+    """
+    from django.contrib.admin import AdminSite, ModelAdmin
+    from django.contrib.admin.views.main import ChangeList
+    from users.admin import UserAdmin
+    from users.models import User
+
+    class StockUserAdmin(UserAdmin):
+        show_full_result_count = True
+        search_fields = ('username', 'mobile')
+
+        def get_changelist(self, request, **kwargs):
+            return ChangeList
+
+        def get_search_results(self, request, queryset, search_term):
+            return ModelAdmin.get_search_results(self, request, queryset, search_term)
+
+    site = AdminSite(name='bench_admin')
+    return StockUserAdmin(User, site), UserAdmin(User, site)
+
+
+def request_changelist(model_admin, superuser, query):
+    """
+    :return: (耗时秒数, SQL耗时秒数, SQL查询数, ChangeList)
+    """
+    from django.db import connection
+    from django.test import RequestFactory
+
+    request = RequestFactory().get('/admin/users/user/', query)
+    request.user = superuser
+    queries = [0, 0.0]
+
+    def count_query(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries[0] += 1
+            queries[1] += time.perf_counter() - started
+
+    with connection.execute_wrapper(count_query):
+        started = time.perf_counter()
+        response = model_admin.changelist_view(request)
+        response.render()
+        elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError('列表页返回%d：%s' % (response.status_code, query))
+    return elapsed, queries[1], queries[0], response.context_data['cl']
+
+
+def measure(model_admin, superuser, query, repeat):
+    """
+    :return: (耗时中位数ms, SQL耗时中位数ms, SQL查询数, ChangeList)
+    """
+    results = [request_changelist(model_admin, superuser, query) for _ in range(repeat)]
+    return (
+        percentile([result[0] for result in results], 0.5) * 1000,
+        percentile([result[1] for result in results], 0.5) * 1000,
+        results[0][2],
+        results[0][3],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='my_mall 用户 admin 列表页基准测试')
+    parser.add_argument('-u', '--users', type=int, default=200000, help='预置的用户数')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每个场景的请求次数，取中位数')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from my_mall.utils.keyset_admin import CURSOR_VAR
+    from users.models import User
+
+    started = time.perf_counter()
+    superuser = seed_users(args.users)
+    total = User.objects.count()
+    print('%d个用户，预置耗时%.1fs' % (total, time.perf_counter() - started))
+
+    stock, keyset = make_admins()
+    per_page = keyset.list_per_page
+    pages = (total + per_page - 1) // per_page
+    ordered = User.objects.order_by('-date_joined', '-id')
+    first = measure(keyset, superuser, {}, 1)[3]
+
+    def cursor_at(index):
+        # 第 index 行之后的一页，定位游标的 OFFSET 查询不计入耗时
+        return {CURSOR_VAR: first.encode_cursor(first.keyset, 'next', ordered[index - 1])}
+
+    middle, last = pages // 2, pages - 1
+    scenarios = [
+        ('first page', {}, {}),
+        ('page %d' % (middle + 1), {'p': middle}, cursor_at(middle * per_page)),
+        ('page %d (last)' % (last + 1), {'p': last}, cursor_at(last * per_page)),
+        ('search prefix', {'q': 'admin00012'}, {'q': 'admin00012'}),
+        ('search mobile', {'q': '13000012'}, {'q': '13000012'}),
+        ('filter is_staff', {'is_staff__exact': '1'}, {'is_staff__exact': '1'}),
+    ]
+
+    print('%-20s %10s %10s %8s %10s %10s %8s %10s' % (
+        'scenario', 'stock_ms', 'sql_ms', 'queries', 'keyset_ms', 'sql_ms', 'queries', 'rows'))
+    for name, stock_query, keyset_query in scenarios:
+        stock_ms, stock_sql_ms, stock_queries, stock_cl = measure(stock, superuser, stock_query, args.repeat)
+        keyset_ms, keyset_sql_ms, keyset_queries, keyset_cl = measure(keyset, superuser, keyset_query, args.repeat)
+        # 搜索的匹配方式不同（包含/前缀），只比较分页和过滤的结果
+        rows = [obj.pk for obj in keyset_cl.result_list]
+        status = '' if 'q' in stock_query or rows == [obj.pk for obj in stock_cl.result_list] else 'MISMATCH'
+        print('%-20s %10.2f %10.2f %8d %10.2f %10.2f %8d %10s %s' % (
+            name, stock_ms, stock_sql_ms, stock_queries, keyset_ms, keyset_sql_ms, keyset_queries,
+            keyset_cl.result_count_display, status))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+"""
+主从路由测试配置
+在 benchmarks.settings 的基础上增加两个 SQLite 文件作为从库，由 benchmarks.replicas 复制主库文件模拟主从同步：
+    python -m benchmarks.replicas
+"""
+import os
+
+from benchmarks.settings import *  # noqa: F401,F403
+from benchmarks.settings import BENCH_DIR, DATABASES
+
+REPLICA_ALIASES = ['replica1', 'replica2']
+
+DATABASES = dict(DATABASES)
+DATABASES['default'] = dict(DATABASES['default'], CONN_MAX_AGE=300)
+for alias in REPLICA_ALIASES:
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        NAME=os.path.join(BENCH_DIR, '%s.sqlite3' % alias),
+        TEST={'MIRROR': 'default'},
+    )
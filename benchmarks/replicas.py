@@ -0,0 +1,153 @@
+"""
+主从路由与持久连接测试
+
+使用 benchmarks.replica_settings：主库和两个从库都是 SQLite 文件，复制主库文件即一次"主从同步"，
+两次同步之间从库上的数据是旧的，用来检查读己之写。依次检查：
+(1) 查重接口、登录时按账号查询用户读从库，写操作（注册、更新 last_login）使用主库；
+(2) 注册后同一浏览器带着 pin cookie 读主库，能立即查到新用户；其他浏览器读从库，同步后才能查到；
+(3) 通过 WSGIHandler 处理请求（与WSGI服务器相同，请求结束时按 CONN_MAX_AGE 关闭连接），
+    统计 CONN_MAX_AGE=0 与持久连接时新建的数据库连接数：
+    python -m benchmarks.replicas
+    python -m benchmarks.replicas -n 500
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.replica_settings')
+
+import django  # noqa: E402
+
+from benchmarks.run import PASSWORD, setup_database, sms_code_for  # noqa: E402
+
+
+def sync_replicas():
+    """复制主库文件到各个从库"""
+    from django.conf import settings
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.close()
+    for alias in settings.REPLICA_ALIASES:
+        shutil.copyfile(settings.DATABASES['default']['NAME'], settings.DATABASES[alias]['NAME'])
+
+
+class QueryCounter(object):
+    """按数据库别名统计查询次数"""
+
+    def __init__(self):
+        self.queries = Counter()
+
+    def __enter__(self):
+        from django.db import connections
+
+        def wrapper(execute, sql, params, many, context):
+            self.queries[context['connection'].alias] += 1
+            return execute(sql, params, many, context)
+
+        self.contexts = [connection.execute_wrapper(wrapper) for connection in connections.all()]
+        for context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for context in reversed(self.contexts):
+            context.__exit__(*exc_info)
+
+    def summary(self):
+        primary = self.queries['default']
+        replicas = sum(count for alias, count in self.queries.items() if alias != 'default')
+        return 'primary=%d replicas=%d' % (primary, replicas)
+
+
+def check(name, response, counter, expected=None):
+    data = response.json() if response['Content-Type'] == 'application/json' else {}
+    value = data.get('count', response.status_code)
+    status = '' if expected is None else ('ok' if value == expected else 'UNEXPECTED(%s)' % expected)
+    print('%-44s %-6s %-22s %s' % (name, value, counter.summary(), status))
+
+
+def check_routing():
+    from django.conf import settings
+    from django.test import Client
+
+    pin_cookie = settings.DATABASE_ROUTING.get('PIN_COOKIE', 'pin_primary')
+    writer, other = Client(), Client()
+    username, mobile = 'replica%06d' % (time.time() % 1000000), '137%08d' % (time.time() % 100000000)
+    print('%-44s %-6s %-22s' % ('step', 'result', 'queries'))
+
+    with QueryCounter() as counter:
+        check('existing username count', other.get('/usernames/bench00001/count/'), counter, 1)
+    with QueryCounter() as counter:
+        response = writer.post('/register/', {
+            'username': username, 'password': PASSWORD, 'password2': PASSWORD, 'mobile': mobile,
+            'sms_code': sms_code_for(mobile), 'allow': 'on',
+        })
+        check('register (pin cookie: %s)' % (pin_cookie in response.cookies), response, counter, 302)
+    with QueryCounter() as counter:
+        check('new username, same browser (pinned)', writer.get('/usernames/%s/count/' % username), counter, 1)
+    with QueryCounter() as counter:
+        check('new username, other browser (stale)', other.get('/usernames/%s/count/' % username), counter, 0)
+    sync_replicas()
+    with QueryCounter() as counter:
+        check('new username, other browser (synced)', other.get('/usernames/%s/count/' % username), counter, 1)
+    with QueryCounter() as counter:
+        response = other.post('/login/', {'username': 'bench00002', 'password': PASSWORD})
+        check('login', response, counter, 302)
+
+
+def count_connections(requests, conn_max_age):
+    """通过 WSGIHandler 发出请求，统计新建的数据库连接数和每个请求的耗时"""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test import RequestFactory
+
+    for connection in connections.all():
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    created = []
+
+    def on_created(sender, connection, **kwargs):
+        created.append(connection.alias)
+
+    connection_created.connect(on_created)
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    try:
+        started = time.perf_counter()
+        for i in range(requests):
+            environ = factory._base_environ(PATH_INFO='/usernames/bench%05d/count/' % (i % 100), REQUEST_METHOD='GET')
+            result = handler(environ, lambda status, headers: None)
+            b''.join(result)
+            result.close()
+        elapsed = time.perf_counter() - started
+    finally:
+        connection_created.disconnect(on_created)
+    return len(created), elapsed * 1000 / requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='my_mall 主从路由与持久连接测试')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='统计连接数时的请求数')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    setup_database()
+    sync_replicas()
+
+    check_routing()
+
+    print()
+    print('%-14s %12s %10s' % ('CONN_MAX_AGE', 'connections', 'ms/req'))
+    for conn_max_age in (0, 300):
+        connections, ms = count_connections(args.requests, conn_max_age)
+        print('%-14s %12d %10.3f' % (conn_max_age, connections, ms))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
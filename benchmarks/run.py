@@ -0,0 +1,284 @@
+"""
+URL 基准测试
+
+使用 benchmarks.settings（SQLite + fakeredis）启动项目，按指定的并发数请求各个URL，
+统计吞吐量、p50/p99延迟、每个请求的SQL查询数和内存分配峰值：
+    python -m benchmarks.run                                # 运行全部场景
+    python -m benchmarks.run -s index -s info -c 16 -n 500  # 指定场景、并发数、请求数
+    python -m benchmarks.run --save                         # 将结果保存为基线
+    python -m benchmarks.run --compare                      # 与基线比较，性能回退时以非0状态退出
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+PASSWORD = 'benchpass123'
+SEED_USERS = 200
+RUN_ID = random.randint(0, 9999)
+
+
+# 各个场景：func(client, i) 发出第 i 个请求并返回响应；login 表示客户端需要先登录
+def index(client, i):
+    return client.get('/')
+
+
+def register_page(client, i):
+    return client.get('/register/')
+
+
+def sms_code_for(mobile):
+    """
+    发送短信验证码，并从 FakeProvider 的 outbox 中取出（见 benchmarks.settings.SMS_CODES）
+    :return: 验证码，5秒内没有发出时返回 None
+    """
+    from verifications.sms_codes import get_sms_service
+
+    service = get_sms_service()
+    service.send(mobile)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        code = service.provider.last_code(mobile)
+        if code is not None:
+            return code
+        time.sleep(0.001)
+    return None
+
+
+def register_post(client, i):
+    # 注册需要短信验证码，取验证码的时间计入耗时（FakeProvider 没有延迟，约1ms）
+    mobile = '139%04d%04d' % (RUN_ID, i % 10000)
+    return client.post('/register/', {
+        'username': 'r%04d_%06d' % (RUN_ID, i),
+        'password': PASSWORD,
+        'password2': PASSWORD,
+        'mobile': mobile,
+        'sms_code': sms_code_for(mobile),
+        'allow': 'on',
+    })
+
+
+def login_page(client, i):
+    return client.get('/login/')
+
+
+def login_post(client, i):
+    return client.post('/login/', {'username': 'bench%05d' % (i % SEED_USERS), 'password': PASSWORD})
+
+
+def username_count(client, i):
+    # 已注册与未注册的用户名各占一半
+    username = 'bench%05d' % (i % SEED_USERS) if i % 2 else 'fresh%06d' % i
+    return client.get('/usernames/%s/count/' % username)
+
+
+def mobile_count(client, i):
+    mobile = '135%08d' % (i % SEED_USERS) if i % 2 else '136%08d' % i
+    return client.get('/mobiles/%s/count/' % mobile)
+
+
+def availability(client, i):
+    # 同时查询用户名和手机号，已注册与未注册各占一半
+    if i % 2:
+        return client.get('/availability/?username=bench%05d&mobile=135%08d' % (i % SEED_USERS, i % SEED_USERS))
+    return client.get('/availability/?username=fresh%06d&mobile=136%08d' % (i, i))
+
+
+def info(client, i):
+    return client.get('/info/')
+
+
+SCENARIOS = {
+    'index': (index, False),
+    'register': (register_page, False),
+    'register_post': (register_post, False),
+    'login': (login_page, False),
+    'login_post': (login_post, False),
+    'username_count': (username_count, False),
+    'mobile_count': (mobile_count, False),
+    'availability': (availability, False),
+    'info': (info, True),
+}
+
+
+def setup_database():
+    """创建表并预置用户"""
+    from django.contrib.auth.hashers import make_password
+    from django.core.management import call_command
+    from users.models import User
+
+    call_command('migrate', verbosity=0)
+    encoded = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username='bench%05d' % i, mobile='135%08d' % i, password=encoded) for i in range(SEED_USERS)
+    ], ignore_conflicts=True)
+
+
+def make_client(login):
+    from django.conf import settings
+    from django.test import Client
+    from users.models import User
+
+    client = Client()
+    if login:
+        client.force_login(User.objects.get(username='bench00000'), settings.AUTHENTICATION_BACKENDS[0])
+    return client
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_scenario(name, concurrency, requests, warmup):
+    """
+    运行一个场景
+    :return: 统计结果
+    """
+    from django.db import connection
+
+    func, login = SCENARIOS[name]
+    counter = itertools.count()
+
+    def worker(client):
+        latencies, errors, queries = [], 0, [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        # connection 是线程内的数据库连接，每个线程分别统计
+        with connection.execute_wrapper(count_query):
+            while True:
+                i = next(counter)
+                if i >= requests:
+                    break
+                started = time.perf_counter()
+                response = func(client, i + warmup)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+        connection.close()
+        return latencies, errors, queries[0]
+
+    # 预热：填充模板、缓存、布隆过滤器等
+    warm_client = make_client(login)
+    for i in range(warmup):
+        func(warm_client, i)
+    time.sleep(0.5)
+
+    clients = [make_client(login) for _ in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(worker, clients))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    queries = sum(result[2] for result in results)
+
+    # 单独统计内存分配，避免 tracemalloc 的开销影响延迟
+    alloc_requests = min(requests, 50)
+    tracemalloc.start()
+    peak_total = 0
+    for i in range(alloc_requests):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(warm_client, requests + warmup + i)
+        peak_total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries': round(queries / len(latencies), 2),
+        'alloc_kib': round(peak_total / alloc_requests / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线比较
+    SQL查询数是确定的，不允许增加；延迟、吞吐量和内存分配允许 tolerance 的波动
+    :return: 回退项列表
+    """
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            failures.append('%s: SQL查询数 %.2f > 基线 %.2f' % (name, result['queries'], base['queries']))
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            failures.append('%s: p99 %.3fms > 基线 %.3fms' % (name, result['p99_ms'], base['p99_ms']))
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            failures.append('%s: 吞吐量 %.1f/s < 基线 %.1f/s' % (name, result['rps'], base['rps']))
+        if result['alloc_kib'] > base['alloc_kib'] * (1 + tolerance):
+            failures.append('%s: 内存分配 %.1fKiB > 基线 %.1fKiB' % (name, result['alloc_kib'], base['alloc_kib']))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='my_mall URL 基准测试')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS), help='要运行的场景，默认全部')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='并发线程数')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='每个场景的请求数')
+    parser.add_argument('--warmup', type=int, default=20, help='每个场景预热的请求数')
+    parser.add_argument('--save', action='store_true', help='将结果保存为基线')
+    parser.add_argument('--compare', action='store_true', help='与基线比较，回退时以非0状态退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='延迟、吞吐量、内存分配允许的波动比例')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基线文件')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    setup_database()
+
+    results = {}
+    print('%-16s %8s %7s %10s %10s %10s %8s %11s' % (
+        'scenario', 'requests', 'errors', 'req/s', 'p50(ms)', 'p99(ms)', 'queries', 'alloc(KiB)'))
+    for name in args.scenario or SCENARIOS:
+        result = results[name] = run_scenario(name, args.concurrency, args.requests, args.warmup)
+        print('%-16s %8d %7d %10.1f %10.3f %10.3f %8.2f %11.1f' % (
+            name, result['requests'], result['errors'], result['rps'],
+            result['p50_ms'], result['p99_ms'], result['queries'], result['alloc_kib']))
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('基线已保存到 %s' % args.baseline)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print('基线文件 %s 不存在，请先使用 --save 生成' % args.baseline)
+            return 2
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        if failures:
+            print('性能回退：')
+            for failure in failures:
+                print('  ' + failure)
+            return 1
+        print('未发现性能回退')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
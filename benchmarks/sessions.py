@@ -0,0 +1,125 @@
+"""
+session存储基准测试
+
+分别使用 Django 自带的缓存session和 my_mall.utils.session_backends（签名cookie模式开/关），
+按 匿名访问首页 -> 登录 -> 已登录访问用户中心 -> 退出 的流程发出请求，
+统计每个请求对 session 缓存的访问次数（每次即一次Redis往返）、耗时以及保存的session大小：
+    python -m benchmarks.sessions
+    python -m benchmarks.sessions -n 500
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+from benchmarks.run import PASSWORD, SEED_USERS, setup_database  # noqa: E402
+
+ENGINES = [
+    ('cache', 'django.contrib.sessions.backends.cache', {}),
+    ('compact', 'my_mall.utils.session_backends', {'SIGNED_COOKIE': False}),
+    ('compact+cookie', 'my_mall.utils.session_backends', {'SIGNED_COOKIE': True}),
+]
+
+# 会访问Redis的缓存方法
+CACHE_METHODS = ('get', 'set', 'add', 'delete', 'has_key', 'touch', 'get_many', 'set_many', 'delete_many')
+
+
+class CacheOpCounter(object):
+    """统计对缓存对象的方法调用次数"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.ops = Counter()
+        self.written = []
+
+    def wrap(self, name):
+        method = getattr(self.cache, name)
+
+        def counted(*args, **kwargs):
+            self.ops[name] += 1
+            if name in ('set', 'add') and len(args) > 1:
+                self.written.append(args[1])
+            return method(*args, **kwargs)
+
+        return counted
+
+    def __enter__(self):
+        for name in CACHE_METHODS:
+            setattr(self.cache, name, self.wrap(name))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name in CACHE_METHODS:
+            delattr(self.cache, name)
+
+    def total(self):
+        return sum(self.ops.values())
+
+
+def value_size(value):
+    """保存到Redis中的字节数：django_redis 对非整数的值使用pickle序列化"""
+    import pickle
+    return len(pickle.dumps(value, pickle.DEFAULT_PROTOCOL))
+
+
+def run_engine(engine, options, requests):
+    """
+    使用指定的session存储运行一遍流程
+    :return: {步骤: (每个请求的Redis访问次数, 每个请求的耗时ms)}, session大小, cookie长度
+    """
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.test import Client, override_settings
+
+    results = {}
+    with override_settings(SESSION_ENGINE=engine, SESSION_STORE=options):
+        counter = CacheOpCounter(caches[settings.SESSION_CACHE_ALIAS])
+        clients = [Client() for _ in range(requests)]
+        steps = [
+            ('anonymous /', lambda client, i: client.get('/')),
+            ('POST /login/', lambda client, i: client.post('/login/', {
+                'username': 'bench%05d' % (i % SEED_USERS), 'password': PASSWORD, 'remembered': 'on'})),
+            ('GET /info/', lambda client, i: client.get('/info/')),
+            ('GET /logout/', lambda client, i: client.get('/logout/')),
+        ]
+        cookie_lengths = []
+        with counter:
+            for step, func in steps:
+                before = counter.total()
+                started = time.perf_counter()
+                for i, client in enumerate(clients):
+                    response = func(client, i)
+                    if response.status_code >= 400:
+                        raise RuntimeError('%s 返回 %d' % (step, response.status_code))
+                    if step == 'POST /login/':
+                        cookie_lengths.append(len(client.cookies[settings.SESSION_COOKIE_NAME].value))
+                elapsed = time.perf_counter() - started
+                results[step] = ((counter.total() - before) / requests, elapsed * 1000 / requests)
+        sizes = [value_size(value) for value in counter.written]
+    return results, (sum(sizes) // len(sizes) if sizes else 0), sum(cookie_lengths) // len(cookie_lengths)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='my_mall session存储基准测试')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='每个步骤的请求数（客户端数）')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    setup_database()
+
+    print('%-16s %-14s %12s %10s' % ('engine', 'step', 'redis ops', 'ms/req'))
+    for name, engine, options in ENGINES:
+        results, size, cookie_length = run_engine(engine, options, args.requests)
+        for step, (ops, ms) in results.items():
+            print('%-16s %-14s %12.2f %10.3f' % (name, step, ops, ms))
+        print('%-16s session大小 %dB，cookie长度 %d' % (name, size, cookie_length))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+基准测试配置
+在开发环境配置的基础上，改用 SQLite + fakeredis，不依赖外部的 MySQL 和 Redis：
+    python -m benchmarks.run
+没有安装 fakeredis 时退化为进程内缓存，依赖 Redis 命令的功能（Redis布隆过滤器、Lua限流）会走各自的降级逻辑；
+短信验证码只能保存在 Redis 中，这时 register_post 场景的请求都会失败。
+"""
+import copy
+import os
+import tempfile
+
+from my_mall.settings.dev import *  # noqa: F401,F403
+from my_mall.settings.dev import (
+    CACHES, IMAGE_CAPTCHA, LOGGING, PERFORMANCE, SMS_CODES, STATIC_PAGES, THROTTLING, USER_EXISTENCE_INDEX,
+)
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+# 数据库、日志等文件所在的目录，由 benchmarks.run 通过环境变量传入，进程池中的子进程也使用同一个目录
+BENCH_DIR = os.environ.setdefault('MALL_BENCH_DIR', tempfile.mkdtemp(prefix='mall-bench-'))
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BENCH_DIR, 'db.sqlite3'),
+        'OPTIONS': {'timeout': 30}, # 并发写入时等待锁的时间
+    },
+}
+
+try:
+    from fakeredis import FakeConnection, FakeServer
+except ImportError:
+    FakeServer = None
+
+CACHES = copy.deepcopy(CACHES)
+if FakeServer is not None:
+    # 所有缓存别名共享同一个进程内的 Redis 替身
+    FAKE_REDIS_SERVER = FakeServer()
+    for cache in CACHES.values():
+        cache['OPTIONS']['CONNECTION_POOL_KWARGS'] = dict(
+            cache['OPTIONS'].get('CONNECTION_POOL_KWARGS', {}),
+            connection_class=FakeConnection,
+            server=FAKE_REDIS_SERVER,
+        )
+else:
+    for alias, cache in CACHES.items():
+        CACHES[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    USER_EXISTENCE_INDEX = dict(USER_EXISTENCE_INDEX, BACKEND='users.existence.LocalBloomIndex')
+    IMAGE_CAPTCHA = dict(IMAGE_CAPTCHA, BACKEND='verifications.image_codes.LocalCaptchaPool')
+
+# 压测时不限流
+THROTTLING = dict(THROTTLING, RATES={})
+
+# 不发送短信，注册场景从 FakeProvider 的 outbox 中取验证码，见 benchmarks.run.sms_code_for
+SMS_CODES = dict(SMS_CODES, PROVIDER='verifications.sms_providers.FakeProvider', PROVIDER_OPTIONS={}, BATCH_WAIT=0)
+
+LOGGING = copy.deepcopy(LOGGING)
+LOGGING['handlers']['file']['filename'] = os.path.join(BENCH_DIR, 'mall.log')
+
+# 性能统计文件也写到临时目录中
+PERFORMANCE = dict(PERFORMANCE, DUMP_DIR=BENCH_DIR)
+
+# DEBUG=False 时清单存储需要先执行 collectstatic，压测只关心视图本身
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# 静态首页写到临时目录中，压测默认不生成（首页走整页缓存）
+STATIC_PAGES = {
+    name: dict(options, PATH=os.path.join(BENCH_DIR, 'static_pages', os.path.basename(options['PATH'])))
+    for name, options in STATIC_PAGES.items()
+}
@@ -0,0 +1,95 @@
+"""
+流式渲染与压缩基准测试
+
+(1) 模板：分别使用 render() 和 stream_template() 渲染首页、用户中心页面，
+    统计首字节时间（得到第一个数据块）和完成时间；
+(2) 传输：通过完整的中间件栈请求首页和用户中心，统计不压缩、gzip、条件请求(304)时发送的字节数：
+    python -m benchmarks.streaming
+    python -m benchmarks.streaming -n 500
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+from benchmarks.run import make_client, percentile, setup_database  # noqa: E402
+
+TEMPLATES = ('index.html', 'user_center_info.html')
+
+
+def time_template(template_name, requests, streaming):
+    """
+    :return: (首字节时间ms的中位数, 完成时间ms的中位数, 数据块数)
+    """
+    from django.contrib.auth.models import AnonymousUser
+    from django.shortcuts import render
+    from django.test import RequestFactory
+
+    from my_mall.utils.streaming import stream_template
+
+    factory = RequestFactory()
+    first, total, chunks = [], [], 0
+    for _ in range(requests):
+        request = factory.get('/')
+        request.user = AnonymousUser()
+        started = time.perf_counter()
+        if streaming:
+            content = iter(stream_template(request, template_name))
+            next(content)
+            first.append(time.perf_counter() - started)
+            chunks = 1 + sum(1 for _ in content)
+        else:
+            render(request, template_name).content
+            first.append(time.perf_counter() - started)
+            chunks = 1
+        total.append(time.perf_counter() - started)
+    return percentile(first, 0.5) * 1000, percentile(total, 0.5) * 1000, chunks
+
+
+def wire_bytes(client, path, **headers):
+    """:return: (状态码, 响应体字节数, Content-Encoding, ETag)"""
+    response = client.get(path, **headers)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size, response.get('Content-Encoding', '-'), response.get('ETag')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='my_mall 流式渲染与压缩基准测试')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='每种渲染方式的请求数')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    setup_database()
+
+    print('%-24s %-8s %12s %12s %8s' % ('template', 'mode', 'ttfb p50 ms', 'total p50 ms', 'chunks'))
+    for template_name in TEMPLATES:
+        for mode, streaming in (('render', False), ('stream', True)):
+            # 预热：编译模板
+            time_template(template_name, 1, streaming)
+            ttfb, total, chunks = time_template(template_name, args.requests, streaming)
+            print('%-24s %-8s %12.3f %12.3f %8d' % (template_name, mode, ttfb, total, chunks))
+
+    client = make_client(login=True)
+    print()
+    print('%-8s %-10s %8s %10s %10s' % ('path', 'request', 'status', 'bytes', 'encoding'))
+    for path in ('/', '/info/'):
+        # 首页第一次请求写入页面缓存
+        status, size, encoding, etag = wire_bytes(client, path)
+        status, size, encoding, etag = wire_bytes(client, path)
+        print('%-8s %-10s %8d %10d %10s' % (path, 'identity', status, size, encoding))
+        status, size, encoding, _ = wire_bytes(client, path, HTTP_ACCEPT_ENCODING='gzip')
+        print('%-8s %-10s %8d %10d %10s' % (path, 'gzip', status, size, encoding))
+        status, size, encoding, _ = wire_bytes(client, path, HTTP_IF_NONE_MATCH=etag or '"none"')
+        print('%-8s %-10s %8d %10d %10s' % (path, '304', status, size, encoding))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
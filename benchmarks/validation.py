@@ -0,0 +1,69 @@
+"""
+参数校验基准测试
+
+比较 users.validators 中预编译的声明式校验与原来视图中逐个字段 re.match 字符串正则的耗时：
+    python -m benchmarks.validation
+    python -m benchmarks.validation -n 200000
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+CASES = {
+    'valid': {'username': 'bench00001', 'password': 'benchpass123', 'password2': 'benchpass123',
+              'mobile': '13500000001', 'sms_code': '123456', 'allow': 'on'},
+    'bad_mobile': {'username': 'bench00001', 'password': 'benchpass123', 'password2': 'benchpass123',
+                   'mobile': '12345', 'sms_code': '123456', 'allow': 'on'},
+    'missing': {'username': 'bench00001', 'password': 'benchpass123'},
+}
+
+
+def match_chain(data):
+    """原 RegisterView.post 中的校验：遇到第一个错误即返回"""
+    username = data.get('username')
+    password = data.get('password')
+    password2 = data.get('password2')
+    mobile = data.get('mobile')
+    allow = data.get('allow')
+    if not all([username, password, password2, mobile, allow]):
+        return '缺少必传参数'
+    if not re.match(r'^[a-zA-Z0-9_-]{5,20}$', username):
+        return '请输入5-20个字符的用户名'
+    if not re.match(r'^[0-9A-Za-z]{8,20}$', password):
+        return '请输入8-20位的密码'
+    if password != password2:
+        return '两次输入的密码不一致'
+    if not re.match(r'^1[3-9]\d{9}$', mobile):
+        return '请输入正确的手机号码'
+    if allow != 'on':
+        return '请勾选用户协议'
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='my_mall 参数校验基准测试')
+    parser.add_argument('-n', '--number', type=int, default=100000, help='每种情况的执行次数')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.http import QueryDict
+    from users.validators import RegisterSchema
+
+    print('%-12s %16s %16s %8s' % ('case', 're.match(us)', 'schema(us)', 'ratio'))
+    for name, data in CASES.items():
+        query = QueryDict(mutable=True)
+        query.update(data)
+        chain = min(timeit.repeat(lambda: match_chain(query), number=args.number, repeat=7)) / args.number
+        schema = min(timeit.repeat(lambda: RegisterSchema.validate(query), number=args.number, repeat=7)) / args.number
+        print('%-12s %16.3f %16.3f %8.2f' % (name, chain * 1e6, schema * 1e6, chain / schema))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
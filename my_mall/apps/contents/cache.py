@@ -0,0 +1,29 @@
+'''
+首页的整页缓存与静态化
+'''
+from django.conf import settings
+
+from my_mall.utils.page_cache import PageCache
+from my_mall.utils.static_pages import StaticPage
+
+
+# 首页只随请求路径变化，配置见 settings.PAGE_CACHES['index']
+index_page_cache = PageCache('index', **getattr(settings, 'PAGE_CACHES', {}).get('index', {}))
+
+# 生成的首页文件由nginx直接返回，配置见 settings.STATIC_PAGES['index']
+index_static_page = StaticPage('index', 'index.html')
+
+
+def invalidate_index(wait=False):
+    """
+    首页内容（广告、模板等）变化时调用，使首页缓存失效并重新生成静态首页
+    :param wait: 是否立即生成，否则在 DEBOUNCE 秒后由后台线程生成（进程即将退出时需要立即生成）
+    """
+    index_page_cache.invalidate()
+    if index_static_page.path is None:
+        return
+    if wait:
+        index_static_page.cancel()
+        index_static_page.generate()
+    else:
+        index_static_page.schedule()
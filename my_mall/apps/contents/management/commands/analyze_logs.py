@@ -0,0 +1,334 @@
+'''
+日志分析：python manage.py analyze_logs [文件 ...] [--top 20] [--workers 4] [--since "2026-10-18 12:00"] [--json]
+
+默认分析 LOGGING 中 file 处理器的日志文件及其轮转文件（mall.log、mall.log.1 ... mall.log.10），
+每个文件由一个进程通过 mmap 逐行读取，只遍历一次，各进程的结果在主进程中合并：
+    modules     每个模块各级别的日志数
+    locations   WARNING 以上日志最多的代码位置（模块:行号），附一条示例消息
+    endpoints   每个视图的慢请求数、耗时分布（perf.Histogram）、4xx/5xx 数
+    slowest     耗时最长的 --top 个请求
+内存占用与日志大小无关：模块、代码位置、视图的数量都是有限的，慢请求只保留 --top 个，
+路径通过 resolve() 归并为视图名（与 PerformanceMiddleware 记录的名称相同），超过 MAX_ENDPOINTS 的归入 (other)。
+
+日志格式为 LOGGING 中的 verbose（---LEVEL 时间 模块 行号 消息---）或 json（每行一个JSON）。
+耗时只来自 PerformanceMiddleware 的 slow request 日志，即超过 PERFORMANCE['SLOW_REQUEST_MS'] 的请求；
+4xx/5xx 来自 django.request 的 Not Found、Internal Server Error 等日志。
+'''
+import functools
+import glob
+import heapq
+import json
+import mmap
+import multiprocessing
+import os
+import re
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+from my_mall.utils.perf import Histogram
+
+# 单个文件中最多统计的视图数
+MAX_ENDPOINTS = 1000
+
+# 示例消息的最大长度
+SAMPLE_LENGTH = 200
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+# ---WARNING 2026-10-18 12:00:00,123 middleware 48 slow request ...
+HEADER_RE = re.compile(rb'---(DEBUG|INFO|WARNING|ERROR|CRITICAL) (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ (\S+) (\d+) ?')
+
+# PerformanceMiddleware：slow request GET /info/ users:info 812.3ms
+SLOW_RE = re.compile(r'^slow request (\S+) (\S+) (\S+) ([\d.]+)ms')
+
+# django.request：Internal Server Error: /info/、Not Found: /x/、Method Not Allowed (PUT): /login/
+STATUS_RE = re.compile(
+    r'^(Internal Server Error|Service Unavailable|Not Found|Bad Request|Forbidden|Method Not Allowed|Gone)[^:]*: (/\S*)'
+)
+SERVER_ERRORS = {'Internal Server Error', 'Service Unavailable'}
+
+
+@functools.lru_cache(maxsize=4096)
+def endpoint_for(path):
+    """路径对应的视图名"""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+def normalize_time(value):
+    """把 --since/--until 转为日志中的时间格式，便于直接按字符串比较"""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    raise CommandError('无法解析时间%s，格式为 YYYY-MM-DD [HH:MM[:SS]]' % value)
+
+
+def merge_histogram(target, source):
+    target.buckets = [a + b for a, b in zip(target.buckets, source.buckets)]
+    target.count += source.count
+    target.sum += source.sum
+
+
+class EndpointStats(object):
+    """单个视图的慢请求与错误统计"""
+
+    def __init__(self):
+        self.slow = Histogram()
+        self.max_ms = 0.0
+        self.client_errors = 0
+        self.server_errors = 0
+
+    def merge(self, other):
+        merge_histogram(self.slow, other.slow)
+        self.max_ms = max(self.max_ms, other.max_ms)
+        self.client_errors += other.client_errors
+        self.server_errors += other.server_errors
+
+    def to_dict(self):
+        data = self.slow.to_dict()
+        if not self.slow.count:
+            data.update(p50_ms=None, p99_ms=None)
+        data.update(max_ms=self.max_ms, client_errors=self.client_errors, server_errors=self.server_errors)
+        return data
+
+
+class LogStats(object):
+    """一个或多个日志文件的汇总结果"""
+
+    def __init__(self, top):
+        self.top = top
+        self.files = []
+        self.records = 0
+        self.first = None
+        self.last = None
+        self.modules = {}  # {模块: {级别: 条数}}
+        self.locations = {}  # {(模块, 行号, 级别): [条数, 示例消息]}
+        self.endpoints = {}  # {视图名: EndpointStats}
+        self.slowest = []  # 小顶堆 [(耗时, 时间, 方法, 路径, 视图)]
+
+    def endpoint(self, name):
+        stats = self.endpoints.get(name)
+        if stats is None:
+            if len(self.endpoints) >= MAX_ENDPOINTS:
+                name = '(other)'
+                stats = self.endpoints.get(name)
+            if stats is None:
+                stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def add(self, level, time, module, lineno, message):
+        self.records += 1
+        if self.first is None or time < self.first:
+            self.first = time
+        if self.last is None or time > self.last:
+            self.last = time
+        counts = self.modules.setdefault(module, {})
+        counts[level] = counts.get(level, 0) + 1
+        if level in ('DEBUG', 'INFO'):
+            return
+
+        location = self.locations.get((module, lineno, level))
+        if location is None:
+            self.locations[(module, lineno, level)] = [1, message[:SAMPLE_LENGTH]]
+        else:
+            location[0] += 1
+
+        match = SLOW_RE.match(message)
+        if match:
+            method, path, view, ms = match.groups()
+            ms = float(ms)
+            stats = self.endpoint(view)
+            stats.slow.add(ms)
+            stats.max_ms = max(stats.max_ms, ms)
+            item = (ms, time, method, path, view)
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+            return
+        match = STATUS_RE.match(message)
+        if match:
+            reason, path = match.groups()
+            stats = self.endpoint(endpoint_for(path))
+            if reason in SERVER_ERRORS:
+                stats.server_errors += 1
+            else:
+                stats.client_errors += 1
+
+    def merge(self, other):
+        self.files.extend(other.files)
+        self.records += other.records
+        self.first = min(filter(None, (self.first, other.first)), default=None)
+        self.last = max(filter(None, (self.last, other.last)), default=None)
+        for module, counts in other.modules.items():
+            target = self.modules.setdefault(module, {})
+            for level, count in counts.items():
+                target[level] = target.get(level, 0) + count
+        for key, (count, sample) in other.locations.items():
+            location = self.locations.setdefault(key, [0, sample])
+            location[0] += count
+        for name, stats in other.endpoints.items():
+            self.endpoint(name).merge(stats)
+        self.slowest = heapq.nlargest(self.top, self.slowest + other.slowest)
+        heapq.heapify(self.slowest)
+
+    def to_dict(self, top):
+        def errors(counts):
+            return counts.get('ERROR', 0) + counts.get('CRITICAL', 0)
+
+        return {
+            'files': self.files,
+            'records': self.records,
+            'first': self.first,
+            'last': self.last,
+            'modules': [
+                dict(module=module, total=sum(counts.values()), errors=errors(counts), **counts)
+                for module, counts in sorted(
+                    self.modules.items(), key=lambda item: (-errors(item[1]), -sum(item[1].values())))
+            ],
+            'locations': [
+                {'module': module, 'lineno': lineno, 'level': level, 'count': count, 'sample': sample}
+                for (module, lineno, level), (count, sample) in sorted(
+                    self.locations.items(), key=lambda item: (-LEVELS.index(item[0][2]), -item[1][0]))[:top]
+            ],
+            'endpoints': [
+                dict(endpoint=name, **stats.to_dict())
+                for name, stats in sorted(
+                    self.endpoints.items(),
+                    key=lambda item: (-item[1].server_errors, -item[1].slow.sum, -item[1].client_errors))
+            ],
+            'slowest': [
+                {'ms': ms, 'time': time, 'method': method, 'path': path, 'endpoint': view}
+                for ms, time, method, path, view in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+def iter_records(mm):
+    """
+    逐行遍历日志，续行（异常堆栈、多行消息）属于上一条日志，不单独统计
+    :return: (级别, 时间, 模块, 行号, 消息) 的迭代器，DEBUG、INFO 日志不解码消息
+    """
+    for line in iter(mm.readline, b''):
+        if line.startswith(b'---'):
+            match = HEADER_RE.match(line)
+            if match:
+                level, time, module, lineno = match.groups()
+                level = level.decode()
+                message = ''
+                if level not in ('DEBUG', 'INFO'):
+                    message = line[match.end():].rstrip(b'\r\n')
+                    if message.endswith(b'---'):
+                        message = message[:-3]
+                    message = message.decode('utf-8', 'replace')
+                yield level, time.decode(), module.decode(), int(lineno), message
+        elif line.startswith(b'{'):
+            try:
+                data = json.loads(line)
+                yield data['level'], data['time'][:19], data['module'], data['lineno'], data['message']
+            except (ValueError, KeyError, TypeError):
+                continue
+
+
+def analyze_file(args):
+    """在子进程中分析一个日志文件"""
+    path, top, since, until = args
+    stats = LogStats(top)
+    stats.files.append(path)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return stats
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for level, time, module, lineno, message in iter_records(mm):
+                if since and time < since or until and time >= until:
+                    continue
+                stats.add(level, time, module, lineno, message)
+    return stats
+
+
+def default_paths():
+    filename = settings.LOGGING['handlers']['file']['filename']
+    return [path for path in glob.glob(glob.escape(filename) + '*') if os.path.isfile(path)]
+
+
+class Command(BaseCommand):
+    help = '并行分析日志文件及其轮转文件，统计各模块、各视图的错误数与慢请求耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='日志文件，默认为 LOGGING 中的日志文件及其轮转文件')
+        parser.add_argument('--top', type=int, default=20, help='列出的慢请求数和代码位置数')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数，不超过文件数')
+        parser.add_argument('--since', help='只统计该时间之后的日志，如 "2026-10-18 12:00"')
+        parser.add_argument('--until', help='只统计该时间之前的日志')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or default_paths()
+        missing = [path for path in paths if not os.path.isfile(path)]
+        if missing:
+            raise CommandError('日志文件不存在：%s' % ', '.join(missing))
+        if not paths:
+            raise CommandError('没有找到日志文件')
+        top = options['top']
+        since = normalize_time(options['since']) if options['since'] else None
+        until = normalize_time(options['until']) if options['until'] else None
+
+        # 大文件先开始，减少最后只剩一个进程在运行的时间
+        tasks = [(path, top, since, until) for path in sorted(paths, key=os.path.getsize, reverse=True)]
+        workers = max(1, min(options['workers'], len(tasks)))
+        stats = LogStats(top)
+        if workers == 1:
+            results = map(analyze_file, tasks)
+        else:
+            # 子进程需要 resolve() 路径，spawn 方式启动时先初始化 Django
+            pool = multiprocessing.Pool(workers, initializer=django.setup)
+            results = pool.imap_unordered(analyze_file, tasks)
+        try:
+            for result in results:
+                stats.merge(result)
+        finally:
+            if workers > 1:
+                pool.close()
+                pool.join()
+
+        report = stats.to_dict(top)
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.write_report(report)
+
+    def write_report(self, report):
+        self.stdout.write('%d个文件，%d条日志，%s 至 %s' % (
+            len(report['files']), report['records'], report['first'] or '-', report['last'] or '-'))
+
+        self.stdout.write('\n%-24s %8s %8s %8s %8s %8s' % ('module', 'total', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'))
+        for item in report['modules']:
+            self.stdout.write('%-24s %8d %8d %8d %8d %8d' % (
+                item['module'], item['total'], item.get('INFO', 0), item.get('WARNING', 0),
+                item.get('ERROR', 0), item.get('CRITICAL', 0)))
+
+        self.stdout.write('\n%-36s %6s %10s %8s %8s %10s %6s %6s' % (
+            'endpoint', 'slow', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms', '4xx', '5xx'))
+        for item in report['endpoints']:
+            self.stdout.write('%-36s %6d %10.1f %8s %8s %10.1f %6d %6d' % (
+                item['endpoint'], item['count'], item['mean_ms'], item['p50_ms'] or '-', item['p99_ms'] or '-',
+                item['max_ms'], item['client_errors'], item['server_errors']))
+
+        self.stdout.write('\n%-8s %6s  %s' % ('level', 'count', 'location / sample'))
+        for item in report['locations']:
+            self.stdout.write('%-8s %6d  %s:%d %s' % (
+                item['level'], item['count'], item['module'], item['lineno'], item['sample']))
+
+        self.stdout.write('\n%10s  %-19s %-6s %s' % ('ms', 'time', 'method', 'path (endpoint)'))
+        for item in report['slowest']:
+            self.stdout.write('%10.1f  %-19s %-6s %s (%s)' % (
+                item['ms'], item['time'], item['method'], item['path'], item['endpoint']))
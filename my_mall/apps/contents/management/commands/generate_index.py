@@ -0,0 +1,17 @@
+'''
+生成静态首页：python manage.py generate_index
+部署时在 collectstatic 之后执行（页面中引用带哈希的静态文件），生成的文件见 settings.STATIC_PAGES['index']
+'''
+from django.core.management.base import BaseCommand, CommandError
+
+from contents.cache import index_static_page
+
+
+class Command(BaseCommand):
+    help = '渲染首页模板，写入 STATIC_PAGES 中配置的静态文件'
+
+    def handle(self, *args, **options):
+        if index_static_page.path is None:
+            raise CommandError('没有配置 STATIC_PAGES["index"]["PATH"]')
+        size = index_static_page.generate()
+        self.stdout.write(self.style.SUCCESS('已生成%s，%d字节' % (index_static_page.path, size)))
@@ -0,0 +1,123 @@
+'''
+导入耗时分析：python manage.py import_profile [--top 15] [--module users.count_views ...]
+
+在新的解释器进程中以 python -X importtime 依次加载：
+    settings        配置模块
+    app:<应用>      INSTALLED_APPS 中的每个应用（django.setup() 之前按顺序导入应用模块）
+    app registry    django.setup() 的其余部分：模型、AppConfig.ready()
+    urlconf         ROOT_URLCONF；视图通过 lazy_view 引用时不在这里导入
+    module:<模块>   --module 指定的模块，默认为各个视图模块
+    jinja2          创建 Jinja2 环境并加载一个模板
+importtime 的输出按阶段汇总为每个阶段的导入耗时和模块数，并列出每个阶段中累计耗时最多的顶层导入。
+'''
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 默认分析的视图模块
+DEFAULT_MODULES = ['users.count_views', 'users.views', 'contents.views']
+
+# 阶段之间在 stderr 中写入的标记，importtime 的输出也写到 stderr
+MARKER = '@@phase '
+
+PROBE = r'''
+import importlib, sys
+MARKER = %(marker)r
+def phase(name):
+    sys.stderr.write(MARKER + name + '\n')
+    sys.stderr.flush()
+phase('settings')
+from django.conf import settings
+settings.INSTALLED_APPS
+for entry in settings.INSTALLED_APPS:
+    phase('app:' + entry)
+    try:
+        importlib.import_module(entry)
+    except ImportError:
+        # 'users.apps.UsersConfig' 这样的 AppConfig 路径
+        importlib.import_module(entry.rpartition('.')[0])
+phase('app registry')
+import django
+django.setup(set_prefix=False)
+phase('urlconf')
+from django.urls import get_resolver
+get_resolver().url_patterns
+for module in sys.argv[2:]:
+    phase('module:' + module)
+    importlib.import_module(module)
+phase('jinja2')
+from django.template import loader
+loader.get_template(sys.argv[1])
+phase('end')
+'''
+
+# import time:       self [us] |  cumulative | imported package
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+def parse(stderr):
+    """
+    :return: [(阶段, [(模块, 自身耗时us, 累计耗时us, 层级), ...]), ...]
+    """
+    phases, current = [], None
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            current = (line[len(MARKER):], [])
+            phases.append(current)
+            continue
+        match = LINE_RE.match(line)
+        if match and current is not None:
+            self_us, cumulative_us, indent, module = match.groups()
+            current[1].append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return [phase for phase in phases if phase[0] != 'end']
+
+
+class Command(BaseCommand):
+    help = '使用 python -X importtime 分析配置、各应用、路由、视图模块和Jinja2环境的导入耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', action='append', dest='modules', help='单独统计的模块，可以指定多次')
+        parser.add_argument('--template', default='index.html', help='jinja2 阶段加载的模板')
+        parser.add_argument('--top', type=int, default=5, help='每个阶段列出的顶层导入数')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+
+    def handle(self, *args, **options):
+        modules = options['modules'] or DEFAULT_MODULES
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE % {'marker': MARKER}, options['template']] + modules,
+            cwd=os.path.dirname(settings.BASE_DIR), env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+        )
+        if result.returncode != 0:
+            raise CommandError('导入失败：\n%s' % result.stderr[-4000:])
+
+        report = []
+        for name, imports in parse(result.stderr):
+            # 同一阶段中最外层的导入，累计耗时不重复计算
+            top_level = [item for item in imports if item[3] == min((i[3] for i in imports), default=0)]
+            report.append({
+                'phase': name,
+                'ms': sum(self_us for _, self_us, _, _ in imports) / 1000,
+                'modules': len(imports),
+                'top': [
+                    {'module': module, 'ms': cumulative_us / 1000}
+                    for module, _, cumulative_us, _ in sorted(top_level, key=lambda item: -item[2])[:options['top']]
+                ],
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write('%-36s %10s %8s' % ('phase', 'ms', 'modules'))
+        for phase in report:
+            self.stdout.write('%-36s %10.1f %8d' % (phase['phase'], phase['ms'], phase['modules']))
+            for item in phase['top']:
+                self.stdout.write('    %-32s %10.1f' % (item['module'], item['ms']))
+        self.stdout.write(self.style.SUCCESS('合计%.1fms，%d个模块' % (
+            sum(phase['ms'] for phase in report), sum(phase['modules'] for phase in report))))
@@ -0,0 +1,15 @@
+'''
+使首页缓存失效：python manage.py invalidate_index
+发布新模板或修改首页广告后执行，同时重新生成静态首页
+'''
+from django.core.management.base import BaseCommand
+
+from contents.cache import invalidate_index
+
+
+class Command(BaseCommand):
+    help = '使首页的整页缓存失效，并重新生成静态首页'
+
+    def handle(self, *args, **options):
+        invalidate_index(wait=True)
+        self.stdout.write(self.style.SUCCESS('首页缓存已失效'))
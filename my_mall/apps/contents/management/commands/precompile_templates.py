@@ -0,0 +1,33 @@
+'''
+预编译所有Jinja2模板：python manage.py precompile_templates
+在构建/发布阶段执行，将编译结果写入 JINJA2_BYTECODE_CACHE_DIR，worker启动后直接加载字节码
+'''
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.backends.jinja2 import Jinja2
+
+
+class Command(BaseCommand):
+    help = '预编译所有Jinja2模板，写入模板字节码缓存'
+
+    def handle(self, *args, **options):
+        jinja2_engines = [engine for engine in engines.all() if isinstance(engine, Jinja2)]
+        if not jinja2_engines:
+            raise CommandError('没有配置Jinja2模板引擎')
+
+        for engine in jinja2_engines:
+            env = engine.env
+            if env.bytecode_cache is None:
+                raise CommandError('模板引擎%s没有配置字节码缓存，请设置JINJA2_BYTECODE_CACHE_DIR' % engine.name)
+
+            started = time.monotonic()
+            names = env.list_templates()
+            for name in names:
+                # get_template 会在字节码缓存缺失时编译模板并写入缓存
+                env.get_template(name)
+                self.stdout.write('  %s' % name)
+            self.stdout.write(self.style.SUCCESS(
+                '引擎%s：已编译%d个模板，耗时%.3fs' % (engine.name, len(names), time.monotonic() - started)
+            ))
@@ -0,0 +1,113 @@
+'''
+worker启动耗时报告：python manage.py startup_report [--target wsgi|asgi|all] [--repeat 5]
+
+每次在新的解释器进程中按阶段计时，与 gunicorn/uvicorn 的 worker 启动过程相同：
+    import django      导入 Django
+    settings           导入配置模块
+    app registry       django.setup()：导入 INSTALLED_APPS 及其模型、执行 AppConfig.ready()
+    handler            导入 wsgi.py/asgi.py：创建 handler、加载中间件
+    urlconf            导入 ROOT_URLCONF 及各应用的视图（第一个请求时才会发生）
+    templates          加载 Jinja2 环境并编译/加载一个模板（第一次渲染页面时才会发生）
+输出各阶段耗时的中位数和新导入的模块数；子进程使用当前的 DJANGO_SETTINGS_MODULE（可以用 --settings 指定）。
+'''
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 在子进程中执行的计时脚本
+PROBE = r'''
+import json, sys, time
+base = len(sys.modules)
+phases = []
+def mark(name, started):
+    phases.append((name, time.perf_counter() - started, len(sys.modules)))
+    return time.perf_counter()
+t = time.perf_counter()
+import django
+t = mark('import django', t)
+from django.conf import settings
+settings.INSTALLED_APPS
+t = mark('settings', t)
+django.setup(set_prefix=False)
+t = mark('app registry', t)
+import importlib
+importlib.import_module(sys.argv[1])
+t = mark('handler', t)
+from django.urls import get_resolver
+get_resolver().url_patterns
+t = mark('urlconf', t)
+from django.template import loader
+loader.get_template(sys.argv[2])
+t = mark('templates', t)
+print(json.dumps({'base': base, 'phases': phases}))
+'''
+
+TARGETS = {
+    'wsgi': 'my_mall.wsgi',
+    'asgi': 'my_mall.asgi',
+}
+
+
+class Command(BaseCommand):
+    help = '统计 wsgi.py/asgi.py 启动时各阶段的导入与初始化耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['wsgi', 'asgi', 'all'], default='all', help='统计的入口')
+        parser.add_argument('--repeat', type=int, default=5, help='每个入口启动的次数，取中位数')
+        parser.add_argument('--template', default='index.html', help='templates 阶段加载的模板')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+
+    def handle(self, *args, **options):
+        targets = list(TARGETS) if options['target'] == 'all' else [options['target']]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        # manage.py 所在的目录，子进程从这里导入 my_mall
+        cwd = os.path.dirname(settings.BASE_DIR)
+
+        report = {}
+        for target in targets:
+            runs, totals = [], []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = subprocess.run(
+                    [sys.executable, '-c', PROBE, TARGETS[target], options['template']],
+                    cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                )
+                totals.append(time.perf_counter() - started)
+                if result.returncode != 0:
+                    raise CommandError('启动%s失败：\n%s' % (target, result.stderr))
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            report[target] = {
+                'process_ms': statistics.median(totals) * 1000,
+                'base_modules': runs[0]['base'],
+                'phases': [
+                    {
+                        'phase': name,
+                        'ms': statistics.median(run['phases'][i][1] for run in runs) * 1000,
+                        'modules': modules,
+                    }
+                    for i, (name, _, modules) in enumerate(runs[0]['phases'])
+                ],
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write('配置模块：%s' % env['DJANGO_SETTINGS_MODULE'])
+        for target, data in report.items():
+            self.stdout.write('\n%s（%d次启动的中位数）' % (target, options['repeat']))
+            self.stdout.write('%-16s %10s %10s' % ('phase', 'ms', 'modules'))
+            previous = data['base_modules']
+            for phase in data['phases']:
+                self.stdout.write('%-16s %10.1f %10d' % (phase['phase'], phase['ms'], phase['modules'] - previous))
+                previous = phase['modules']
+            in_process = sum(phase['ms'] for phase in data['phases'])
+            self.stdout.write(self.style.SUCCESS(
+                '合计%.1fms，进程总耗时（含解释器启动）%.1fms，新导入%d个模块' % (
+                    in_process, data['process_ms'], previous - data['base_modules'])
+            ))
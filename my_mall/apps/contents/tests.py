@@ -1,3 +1,115 @@
-from django.test import TestCase
+'''
+项目公共模块（my_mall.utils）的测试
+'''
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from my_mall.utils import db_router
+from my_mall.utils.db_router import (
+    PrimaryReplicaRouter, ReplicaPinningMiddleware, RoutingState, current_state, replica_reads,
+)
+from users.models import User
+
+
+@override_settings(DATABASE_ROUTING={'PRIMARY': 'default', 'REPLICAS': ['replica'], 'REPLICA_RETRY': 30})
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    """主从路由：读己之写和从库不可用时回到主库，不连接真实的从库"""
+
+    def setUp(self):
+        self.primary = mock.Mock(in_atomic_block=False)
+        self.replica = mock.Mock(connection=object())
+        patcher = mock.patch.object(db_router, 'connections', {'default': self.primary, 'replica': self.replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        unavailable = mock.patch.dict(db_router._unavailable, clear=True)
+        unavailable.start()
+        self.addCleanup(unavailable.stop)
+        self.router = PrimaryReplicaRouter()
+
+    def set_state(self, state):
+        token = current_state.set(state)
+        self.addCleanup(current_state.reset, token)
+
+    def test_primary_outside_replica_reads(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_replica_inside_replica_reads(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+
+    def test_pinned_after_write(self):
+        state = RoutingState()
+        self.set_state(state)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertTrue(state.wrote)
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_pinned_state(self):
+        self.set_state(RoutingState(pinned=True))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_primary_in_atomic_block(self):
+        self.primary.in_atomic_block = True
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        self.replica.connection = None
+        self.replica.ensure_connection.side_effect = OperationalError('connection refused')
+        with replica_reads():
+            with self.assertLogs('django', 'ERROR'):
+                self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertIn('replica', db_router._unavailable)
+            # REPLICA_RETRY 秒内不再尝试连接
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.replica.ensure_connection.call_count, 1)
+
+    def test_connects_replica_on_first_read(self):
+        self.replica.connection = None
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+        self.replica.ensure_connection.assert_called_once_with()
+
+
+@override_settings(DATABASE_ROUTING={'PRIMARY': 'default', 'REPLICAS': ['replica'], 'PIN_COOKIE': 'pin_primary'})
+class ReplicaPinningMiddlewareTest(SimpleTestCase):
+    """请求中写过主库时设置 PIN_COOKIE，带有该cookie的请求只读主库"""
+
+    def setUp(self):
+        patcher = mock.patch.object(db_router, 'connections', {
+            'default': mock.Mock(in_atomic_block=False), 'replica': mock.Mock(connection=object()),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def get_response(self, write=False):
+        def view(request):
+            if write:
+                self.router.db_for_write(User)
+            with replica_reads():
+                return HttpResponse(self.router.db_for_read(User))
+        return ReplicaPinningMiddleware(view)
+
+    def test_reads_replica_without_cookie(self):
+        response = self.get_response()(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn('pin_primary', response.cookies)
+
+    def test_write_sets_pin_cookie(self):
+        response = self.get_response(write=True)(self.factory.post('/'))
+        self.assertEqual(response.content, b'default')
+        self.assertIn('pin_primary', response.cookies)
+
+    def test_pin_cookie_reads_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES['pin_primary'] = '1'
+        response = self.get_response()(request)
+        self.assertEqual(response.content, b'default')
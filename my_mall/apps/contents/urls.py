@@ -1,11 +1,15 @@
 '''
 新建contents子路由
 '''
+from django.conf import settings
 from django.conf.urls import url
-from . import views
+from my_mall.utils.lazy_urls import lazy_view
+
+# ASGI部署时使用异步视图，见 settings.ASYNC_VIEWS
+async_views = getattr(settings, 'ASYNC_VIEWS', {}).get('ENABLED', False)
 
 app_name = 'contents'
 urlpatterns = [
     # 首页广告: '/'
-    url(r'^$', views.IndexView.as_view(), name='index'),
+    url(r'^$', lazy_view('contents.views.AsyncIndexView', is_async=True) if async_views else lazy_view('contents.views.IndexView'), name='index'),
 ]
\ No newline at end of file
@@ -1,5 +1,10 @@
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.gzip import gzip_page
+
+from contents.cache import index_page_cache, index_static_page
+from my_mall.utils.aio import AsyncView, run_sync
 
 # Create your views here.
 
@@ -7,6 +12,28 @@ from django.views import View
 class IndexView(View):
     """首页广告"""
 
+    # 命中缓存时返回预先压缩的内容并处理条件请求，见 my_mall.utils.page_cache；gzip_page 只压缩缓存缺失时新渲染的页面
+    @method_decorator(gzip_page)
     def get(self, request):
-        """提供首页广告页面"""
-        return render(request, 'index.html')
\ No newline at end of file
+        """
+        提供首页广告页面：首页通常由nginx直接返回静态化的文件，转发到这里时也优先返回该文件，
+        还没有生成时使用整页缓存，缓存缺失时才渲染模板
+        """
+        response = index_static_page.serve(request)
+        if response is not None:
+            return response
+        return index_page_cache.get_or_render(request, lambda: render(request, 'index.html'))
+
+
+class AsyncIndexView(AsyncView):
+    """首页广告（异步版本，ASGI部署时使用）"""
+
+    async def get(self, request):
+        """静态首页或进程内缓存命中时直接在事件循环中返回，否则在线程池中读取Redis或渲染模板"""
+        # 静态首页只检查文件的修改时间，文件变化后才读取一次
+        response = index_static_page.serve(request)
+        if response is None:
+            response = index_page_cache.peek(request)
+        if response is not None:
+            return response
+        return await run_sync(IndexView().get, request)
@@ -1,3 +1,51 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from my_mall.utils.keyset_admin import KeysetPaginationMixin
+
+from .models import User
 
 # Register your models here.
+
+
+@admin.register(User)
+class UserAdmin(KeysetPaginationMixin, BaseUserAdmin):
+    """
+    用户管理：mall_users 有几百万行时列表页仍然只读一页数据
+    按注册时间倒序键集分页（mall_users_joined_idx），行数超过 count_limit 时估算，
+    只按 username、mobile 的前缀搜索，使用各自的唯一索引
+    """
+    fieldsets = (
+        (None, {'fields': ('username', 'password')}),
+        (_('Personal info'), {'fields': ('mobile', 'email', 'first_name', 'last_name')}),
+        (_('Permissions'), {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
+        (_('Important dates'), {'fields': ('last_login', 'date_joined')}),
+    )
+    add_fieldsets = (
+        (None, {
+            'classes': ('wide',),
+            'fields': ('username', 'mobile', 'password1', 'password2'),
+        }),
+    )
+    list_display = ('id', 'username', 'mobile', 'email', 'is_staff', 'is_active', 'date_joined')
+    # 不按 groups 过滤：多对多过滤需要 JOIN 和 DISTINCT
+    list_filter = ('is_staff', 'is_active')
+    # 只用于显示搜索框，搜索条件见 get_search_results
+    search_fields = ('^username', '^mobile')
+    ordering = ('-date_joined', '-id')
+    # 只能按有索引的字段排序，其他字段排序时要扫描全表
+    sortable_by = ('id', 'username', 'mobile', 'date_joined')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        每个关键字按前缀匹配用户名，全为数字时同时匹配手机号（LIKE 'x%' 可以使用索引）
+        :return: (queryset, 是否需要 distinct)
+        """
+        for term in search_term.split():
+            condition = Q(username__istartswith=term)
+            if term.isdigit():
+                condition |= Q(mobile__startswith=term)
+            queryset = queryset.filter(condition)
+        return queryset, False
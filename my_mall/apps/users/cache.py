@@ -0,0 +1,174 @@
+'''
+用户对象缓存
+
+登录后每个请求都会由 AuthenticationMiddleware 根据session中的用户id查询用户，
+登录时也要根据用户名或手机号查询用户。这里将用户缓存在 default 缓存中：
+    user:pk:<id>            -> 用户除密码以外的字段值和会话哈希（get_session_auth_hash()）
+    user:account:<account>  -> 用户id
+缓存中不保存密码哈希：从缓存构造的用户对象延迟加载 password 字段，登录校验密码时从主库读取这一列，
+AuthenticationMiddleware 核对session时使用缓存的会话哈希，浏览页面时仍然不查询数据库。
+用户保存时（包括修改密码、登录时更新last_login）用最新的值覆盖 user:pk:<id>，删除时删除，
+user:account:<account> 只记录id，取出用户后还会核对用户名/手机号，因此不需要单独失效。
+
+缓存依赖 post_save/post_delete 信号更新：queryset.update()、原生SQL等不发送信号的写入
+（如批量禁用用户 is_active=False、批量重置密码）之后必须调用 invalidate_user_pks()，
+否则缓存中的旧值最多保留 TIMEOUT 秒，期间被禁用的用户仍然可以通过session访问。
+
+配置项 USER_CACHE：
+    CACHE_ALIAS: 使用的Django缓存别名
+    TIMEOUT:     缓存有效期（秒）
+'''
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import User
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 600,
+}
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'USER_CACHE', {}))
+
+
+def user_key(pk):
+    return 'user:pk:%s' % pk
+
+
+def account_key(account):
+    return 'user:account:%s' % account
+
+
+# 不写入缓存的字段
+EXCLUDED_FIELDS = ('password',)
+
+
+def dump_user(user):
+    """
+    :param user: 用户对象
+    :return: 写入缓存的值
+    """
+    values = {
+        field.attname: getattr(user, field.attname)
+        for field in user._meta.concrete_fields if field.attname not in EXCLUDED_FIELDS
+    }
+    return {'values': values, 'session_hash': user.get_session_auth_hash()}
+
+
+def load_user(data):
+    """
+    从缓存的值构造用户对象，password 为延迟加载的字段，访问时从主库读取
+    :param data: dump_user 的返回值
+    :return: user
+    """
+    values = data['values']
+    user = User.from_db('default', list(values), list(values.values()))
+    user._session_auth_hash = data['session_hash']
+    return user
+
+
+def get_user_by_pk(pk):
+    """
+    根据用户id查询用户，优先读缓存
+    :param pk: 用户id
+    :return: user，不存在返回 None
+    """
+    options = get_options()
+    cache = caches[options['CACHE_ALIAS']]
+    try:
+        data = cache.get(user_key(pk))
+    except Exception as e:
+        logger.error('读取用户缓存失败：%s' % e)
+        data = None
+    if data is not None:
+        return load_user(data)
+
+    try:
+        user = User.objects.get(pk=pk)
+    except User.DoesNotExist:
+        return None
+    try:
+        cache.set(user_key(pk), dump_user(user), options['TIMEOUT'])
+    except Exception as e:
+        logger.error('写入用户缓存失败：%s' % e)
+    return user
+
+
+def get_user_by_account_cached(account, field, load):
+    """
+    根据用户名或手机号查询用户，优先读缓存
+    :param account: 用户名或手机号
+    :param field: account 对应的字段，'username' 或 'mobile'
+    :param load: 缓存缺失时从数据库查询用户的函数，返回 user 或 None
+    :return: user，不存在返回 None
+    """
+    options = get_options()
+    cache = caches[options['CACHE_ALIAS']]
+    try:
+        pk = cache.get(account_key(account))
+    except Exception as e:
+        logger.error('读取用户缓存失败：%s' % e)
+        pk = None
+    if pk is not None:
+        user = get_user_by_pk(pk)
+        # 用户名/手机号可能已被修改，核对后再使用
+        if user is not None and getattr(user, field) == account:
+            return user
+
+    user = load()
+    if user is not None:
+        try:
+            cache.set_many({
+                account_key(account): user.pk,
+                user_key(user.pk): dump_user(user),
+            }, options['TIMEOUT'])
+        except Exception as e:
+            logger.error('写入用户缓存失败：%s' % e)
+    return user
+
+
+def refresh_user(user):
+    """
+    用户保存后用最新的值覆盖缓存，保存后紧接着的请求（如登录后跳转）也不必查询数据库；
+    除密码以外还有字段未加载的对象不能写入缓存，直接删除
+    :param user: 用户对象
+    """
+    options = get_options()
+    cache = caches[options['CACHE_ALIAS']]
+    try:
+        if user.get_deferred_fields() - set(EXCLUDED_FIELDS):
+            cache.delete(user_key(user.pk))
+        else:
+            cache.set(user_key(user.pk), dump_user(user), options['TIMEOUT'])
+    except Exception as e:
+        logger.error('更新用户缓存失败：%s' % e)
+
+
+def invalidate_user(user):
+    """
+    用户删除后删除缓存
+    :param user: 用户对象
+    """
+    try:
+        caches[get_options()['CACHE_ALIAS']].delete(user_key(user.pk))
+    except Exception as e:
+        logger.error('删除用户缓存失败：%s' % e)
+
+
+def invalidate_user_pks(pks):
+    """
+    删除一批用户的缓存，用于 queryset.update()、原生SQL等不发送信号的写入之后：
+        User.objects.filter(pk__in=pks).update(is_active=False)
+        invalidate_user_pks(pks)
+    :param pks: 用户id列表
+    """
+    try:
+        caches[get_options()['CACHE_ALIAS']].delete_many([user_key(pk) for pk in pks])
+    except Exception as e:
+        logger.error('删除用户缓存失败：%s' % e)
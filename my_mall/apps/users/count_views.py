@@ -0,0 +1,160 @@
+'''
+用户名/手机号查重接口
+
+只返回JSON，不依赖模板、认证和密码哈希，与页面视图（users.views）分开，
+只处理这些接口的worker不会导入页面相关的模块，见 my_mall.utils.lazy_urls
+'''
+from django import http
+from django.db.models import Q
+from django.views import View
+
+from my_mall.utils.aio import AsyncView, run_sync
+from my_mall.utils.db_router import replica_reads
+from my_mall.utils.response_code import RETCODE
+from my_mall.utils.throttling import AsyncThrottleMixin, ThrottleMixin
+from my_mall.utils.validation import validation_error_response
+from users.existence import get_existence_index
+from users.models import User
+from users.validators import AvailabilitySchema
+
+
+@replica_reads()
+def count_username(username):
+    """
+    查询用户名的注册数量：布隆过滤器判定一定不存在时，不再查询数据库；查询从库
+    :param username: 用户名
+    :return: 0 或 1
+    """
+    if get_existence_index().might_exist('username', username):
+        return User.objects.filter(username=username).count()
+    return 0
+
+
+@replica_reads()
+def count_mobile(mobile):
+    """
+    查询手机号的注册数量：布隆过滤器判定一定不存在时，不再查询数据库；查询从库
+    :param mobile: 手机号
+    :return: 0 或 1
+    """
+    if get_existence_index().might_exist('mobile', mobile):
+        return User.objects.filter(mobile=mobile).count()
+    return 0
+
+
+@replica_reads()
+def check_availability(username=None, mobile=None):
+    """
+    查询用户名和手机号的注册数量，两者都可能存在时只查询一次数据库（从库）
+    :param username: 用户名，None 表示不查询
+    :param mobile: 手机号，None 表示不查询
+    :return: {'username': 0 或 1, 'mobile': 0 或 1}，只包含要查询的字段
+    """
+    result, query = {}, Q()
+    index = get_existence_index()
+    for field, value in (('username', username), ('mobile', mobile)):
+        if value is None:
+            continue
+        result[field] = 0
+        # 布隆过滤器判定一定不存在的字段不需要查询
+        if index.might_exist(field, value):
+            query |= Q(**{field: value})
+    if query:
+        for existing_username, existing_mobile in User.objects.filter(query).values_list('username', 'mobile')[:2]:
+            if 'username' in result and existing_username == username:
+                result['username'] = 1
+            if 'mobile' in result and existing_mobile == mobile:
+                result['mobile'] = 1
+    return result
+
+
+def availability_params(request):
+    """
+    校验可用性查询的参数
+    :return: (username, mobile, 错误响应)
+    """
+    data, errors = AvailabilitySchema.validate(request.GET)
+    if not data and not errors:
+        errors = {'username': (RETCODE.NECESSARYPARAMERR, '缺少必传参数')}
+    if errors:
+        return None, None, validation_error_response(errors)
+    return data.get('username'), data.get('mobile'), None
+
+
+def availability_response(counts):
+    data = {'code': RETCODE.OK, 'errmsg': 'OK'}
+    for field, count in counts.items():
+        data['%s_count' % field] = count
+    return http.JsonResponse(data)
+
+
+class AvailabilityView(ThrottleMixin, View):
+    """同时判断用户名和手机号是否重复注册"""
+    throttle_scope = 'count'
+
+    def get(self, request):
+        """
+        :param request: 请求对象，查询参数 username、mobile 至少有一个
+        :return: JSON，username_count、mobile_count
+        """
+        username, mobile, error = availability_params(request)
+        if error is not None:
+            return error
+        return availability_response(check_availability(username, mobile))
+
+
+class UsernameCountView(ThrottleMixin, View):
+    """判断用户名是否重复注册"""
+    throttle_scope = 'count'
+
+    def get(self, request, username):
+        """
+        :param request: 请求对象
+        :param username: 用户名
+        :return: JSON
+        """
+        count = count_username(username)
+        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': 'OK', 'count': count})
+    
+
+class MobileCountView(ThrottleMixin, View):
+    """判断手机号是否重复注册"""
+    throttle_scope = 'count'
+
+    def get(self, request, mobile):
+        """
+        :param request: 请求对象
+        :param mobile: 手机号
+        :return: JSON
+        """
+        count = count_mobile(mobile)
+        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': 'OK', 'count': count})
+
+
+class AsyncUsernameCountView(AsyncThrottleMixin, AsyncView):
+    """判断用户名是否重复注册（异步版本，ASGI部署时使用）"""
+    throttle_scope = 'count'
+
+    async def get(self, request, username):
+        count = await run_sync(count_username, username)
+        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': 'OK', 'count': count})
+
+
+class AsyncMobileCountView(AsyncThrottleMixin, AsyncView):
+    """判断手机号是否重复注册（异步版本，ASGI部署时使用）"""
+    throttle_scope = 'count'
+
+    async def get(self, request, mobile):
+        count = await run_sync(count_mobile, mobile)
+        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': 'OK', 'count': count})
+
+
+class AsyncAvailabilityView(AsyncThrottleMixin, AsyncView):
+    """同时判断用户名和手机号是否重复注册（异步版本，ASGI部署时使用）"""
+    throttle_scope = 'count'
+
+    async def get(self, request):
+        username, mobile, error = availability_params(request)
+        if error is not None:
+            return error
+        return availability_response(await run_sync(check_availability, username, mobile))
@@ -0,0 +1,295 @@
+'''
+用户名/手机号存在性索引
+
+注册页每次失焦都会请求 /usernames/<username>/count/ 和 /mobiles/<mobile>/count/，
+这里用布隆过滤器在进程内记录已注册的用户名和手机号：
+(1) 布隆过滤器判定"不存在"，则一定不存在，直接返回，不查询数据库；
+(2) 布隆过滤器判定"可能存在"，再回源数据库查询确认。
+
+配置项 USER_EXISTENCE_INDEX：
+    BACKEND:          索引实现类，默认 'users.existence.LocalBloomIndex'
+    CAPACITY:         预估的用户规模
+    ERROR_RATE:       期望的误判率
+    REFRESH_INTERVAL: 进程内索引从数据库重建的周期（秒），None 表示不重建
+    KEY_PREFIX:       RedisBloomIndex 在 Redis 中保存位图的键前缀
+'''
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'BACKEND': 'users.existence.LocalBloomIndex',
+    'CAPACITY': 1000000,
+    'ERROR_RATE': 0.001,
+    'REFRESH_INTERVAL': 300,
+    'KEY_PREFIX': 'bloom:users',
+}
+
+
+def bloom_parameters(capacity, error_rate):
+    """
+    计算布隆过滤器参数：位数组长度 m = -n*ln(p)/(ln2)^2，哈希函数个数 k = m/n*ln2
+    :param capacity: 预估元素个数 n
+    :param error_rate: 期望误判率 p
+    :return: (m, k)
+    """
+    size = int(-capacity * math.log(error_rate) / (math.log(2) ** 2)) + 1
+    hash_count = max(1, int(round(size / capacity * math.log(2))))
+    return size, hash_count
+
+
+def bloom_offsets(value, size, hash_count):
+    """
+    计算 value 对应的 k 个位偏移（双重哈希）
+    :param value: 用户名或手机号
+    :return: 位偏移列表
+    """
+    digest = hashlib.md5(value.encode('utf-8')).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % size for i in range(hash_count)]
+
+
+class BloomFilter(object):
+    """
+    进程内布隆过滤器
+    位的排列方式与 Redis 的 SETBIT/GETBIT 一致（每个字节的高位在前），
+    这样可以直接用 Redis 中 GET 到的位图初始化
+    """
+
+    def __init__(self, capacity, error_rate, bits=None):
+        self.size, self.hash_count = bloom_parameters(capacity, error_rate)
+        length = (self.size + 7) // 8
+        self.bits = bytearray(length)
+        if bits:
+            self.bits[:len(bits)] = bits[:length]
+
+    def offsets(self, value):
+        return bloom_offsets(value, self.size, self.hash_count)
+
+    def add(self, value):
+        for offset in self.offsets(value):
+            self.bits[offset >> 3] |= 0x80 >> (offset & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[offset >> 3] & (0x80 >> (offset & 7)) for offset in self.offsets(value))
+
+
+class LocalBloomIndex(object):
+    """
+    进程内存在性索引
+    每个字段一个布隆过滤器，首次使用时在后台线程中从 User 表预热，
+    预热完成前所有查询都返回"可能存在"，即回源数据库，保证结果正确
+    """
+    fields = ('username', 'mobile')
+
+    def __init__(self, options):
+        self.capacity = options['CAPACITY']
+        self.error_rate = options['ERROR_RATE']
+        self.refresh_interval = options['REFRESH_INTERVAL']
+        self.filters = None
+        self.warmed_at = None
+        self._lock = threading.Lock()
+        self._warming = False
+
+    def new_filter(self, bits=None):
+        return BloomFilter(self.capacity, self.error_rate, bits)
+
+    def load_filters(self):
+        """
+        从数据库构建全部字段的布隆过滤器
+        :return: {字段名: BloomFilter}
+        """
+        from .models import User
+
+        filters = {field: self.new_filter() for field in self.fields}
+        for row in User.objects.values_list(*self.fields).iterator(chunk_size=2000):
+            for field, value in zip(self.fields, row):
+                filters[field].add(value)
+        return filters
+
+    def warm(self):
+        """构建索引并原子地替换当前的过滤器"""
+        started = time.monotonic()
+        try:
+            filters = self.load_filters()
+        except Exception as e:
+            logger.error('用户存在性索引预热失败：%s' % e)
+        else:
+            self.filters = filters
+            self.warmed_at = time.monotonic()
+            logger.info('用户存在性索引预热完成，耗时%.3fs' % (self.warmed_at - started))
+        finally:
+            self._warming = False
+
+    def ensure_warm(self):
+        """首次使用或到达重建周期时，在后台线程中预热"""
+        if self.warmed_at is not None:
+            if self.refresh_interval is None or time.monotonic() - self.warmed_at < self.refresh_interval:
+                return
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self.warm, name='user-existence-warm', daemon=True).start()
+
+    def might_exist(self, field, value):
+        """
+        判断字段值是否可能已存在
+        :param field: 'username' 或 'mobile'
+        :param value: 字段值
+        :return: False 表示一定不存在；True 表示可能存在，需要回源数据库确认
+        """
+        self.ensure_warm()
+        filters = self.filters
+        if filters is None:
+            return True
+        return value in filters[field]
+
+    def add(self, **values):
+        """
+        新用户写入数据库后，同步更新索引
+        :param values: username=..., mobile=...
+        """
+        filters = self.filters
+        if filters is None:
+            # 还未预热，预热时会从数据库读到这条记录
+            return
+        for field, value in values.items():
+            if field in filters and value:
+                filters[field].add(value)
+
+    def add_many(self, values_list):
+        """
+        批量更新索引，用于 bulk_create 等不发送 post_save 信号的批量写入
+        :param values_list: [{'username': ..., 'mobile': ...}, ...]
+        """
+        filters = self.filters
+        if filters is None:
+            return
+        for values in values_list:
+            for field, value in values.items():
+                if field in filters and value:
+                    filters[field].add(value)
+
+
+class RedisBloomIndex(LocalBloomIndex):
+    """
+    进程内索引 + Redis 镜像
+    所有 worker 共享 default 缓存中的位图：新用户的位同时写入本地和 Redis，
+    本地判定不存在时再查询一次 Redis，以发现其他 worker 新注册的用户；
+    预热时优先从 Redis 直接读取位图，每 REFRESH_INTERVAL 秒由一个 worker 重新扫描数据库，见 load_filters
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.key_prefix = options['KEY_PREFIX']
+        self.size, self.hash_count = bloom_parameters(self.capacity, self.error_rate)
+
+    def key(self, field):
+        return '%s:%s' % (self.key_prefix, field)
+
+    def get_redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def load_filters(self):
+        """
+        ready 键在 REFRESH_INTERVAL 秒后过期：过期前各 worker 直接读取 Redis 中的位图，
+        过期后由一个 worker（rebuild 锁）重新扫描数据库并合并到 Redis，
+        这样不经过 post_save 写入的用户（queryset.update()、原生SQL等）最多在一个周期后被索引
+        """
+        redis_conn = self.get_redis()
+        ready_key = self.key('ready')
+        if not redis_conn.exists(ready_key) and redis_conn.set(self.key('rebuild'), 1, nx=True, ex=300):
+            try:
+                return self.rebuild(redis_conn, ready_key)
+            finally:
+                redis_conn.delete(self.key('rebuild'))
+
+        # 已预热，或其他 worker 正在重建：读取 Redis 中的位图
+        pl = redis_conn.pipeline(transaction=False)
+        for field in self.fields:
+            pl.get(self.key(field))
+        bitmaps = pl.execute()
+        if not all(bitmaps):
+            # Redis 中还没有位图（第一次重建尚未完成），只在本地扫描数据库
+            return super().load_filters()
+        return {field: self.new_filter(bits) for field, bits in zip(self.fields, bitmaps)}
+
+    def rebuild(self, redis_conn, ready_key):
+        """扫描数据库重建索引，合并到 Redis 中的位图"""
+        filters = super().load_filters()
+        pl = redis_conn.pipeline(transaction=False)
+        for field, bloom in filters.items():
+            # 用 BITOP OR 合并而不是 SET 覆盖，避免冲掉预热期间其他 worker 写入的位
+            tmp_key = self.key('%s:tmp' % field)
+            pl.set(tmp_key, bytes(bloom.bits))
+            pl.bitop('OR', self.key(field), self.key(field), tmp_key)
+            pl.delete(tmp_key)
+        pl.set(ready_key, 1, ex=int(self.refresh_interval) if self.refresh_interval else None)
+        pl.execute()
+        return filters
+
+    def might_exist(self, field, value):
+        if super().might_exist(field, value):
+            return True
+        try:
+            pl = self.get_redis().pipeline(transaction=False)
+            for offset in bloom_offsets(value, self.size, self.hash_count):
+                pl.getbit(self.key(field), offset)
+            if not all(pl.execute()):
+                return False
+        except Exception as e:
+            logger.error('查询Redis用户存在性索引失败：%s' % e)
+            return True
+        # Redis 中存在：是其他 worker 新注册的用户，同步到本地
+        self.filters[field].add(value)
+        return True
+
+    def add(self, **values):
+        self.add_many([values])
+
+    def add_many(self, values_list):
+        super().add_many(values_list)
+        offsets = {}
+        for values in values_list:
+            for field, value in values.items():
+                if field in self.fields and value:
+                    offsets.setdefault(field, set()).update(bloom_offsets(value, self.size, self.hash_count))
+        try:
+            # 每个字段只发送一条 BITFIELD 命令，一次设置这一批的所有位
+            pl = self.get_redis().pipeline(transaction=False)
+            for field, field_offsets in offsets.items():
+                args = []
+                for offset in sorted(field_offsets):
+                    args.extend(('SET', 'u1', offset, 1))
+                pl.execute_command('BITFIELD', self.key(field), *args)
+            pl.execute()
+        except Exception as e:
+            logger.error('更新Redis用户存在性索引失败：%s' % e)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_existence_index():
+    """
+    获取按配置创建的存在性索引（进程内单例）
+    :return: 索引对象
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                options = dict(DEFAULTS, **getattr(settings, 'USER_EXISTENCE_INDEX', {}))
+                _index = import_string(options['BACKEND'])(options)
+    return _index
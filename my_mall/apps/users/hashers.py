@@ -0,0 +1,17 @@
+'''
+可调节迭代次数的密码哈希算法
+
+PBKDF2 的计算量与迭代次数成正比。在 PASSWORD_HASHING['PBKDF2_ITERATIONS'] 中调整迭代次数，
+用户下次登录时会按新的迭代次数重新计算哈希（见 UsernameMobileAuthBackend），从而平滑迁移；
+调整前可以用 python manage.py benchmark_hasher 测量不同迭代次数的耗时。
+'''
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """迭代次数可配置的 PBKDF2-SHA256，算法名与Django自带的相同，已有的哈希值可以直接校验"""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASHING', {}).get('PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
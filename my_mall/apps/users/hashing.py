@@ -0,0 +1,202 @@
+'''
+密码哈希服务
+
+PBKDF2 是刻意设计的慢哈希，登录和注册时在请求线程中计算会占满worker的CPU。
+这里把哈希计算交给一个有界的进程池：
+(1) 同时排队+计算的任务数不超过 MAX_PENDING，超过时立即抛出 HashingBusy，
+    视图据此返回 RETCODE.THROTTLINGERR，而不是让请求无限排队；
+    名额在任务结束时才释放，请求等待超时后任务仍在进程中计算，继续占用名额；
+(2) 进程池的大小 MAX_WORKERS 决定了哈希计算最多占用的CPU核数，0 表示在请求线程中计算。
+
+配置项 PASSWORD_HASHING：
+    MAX_WORKERS:  进程池大小
+    MAX_PENDING:  最多同时排队+计算的任务数
+    TIMEOUT:      等待单个任务的最长时间（秒）
+    START_METHOD: 进程池的启动方式（'fork'/'spawn'/'forkserver'），None 表示平台默认
+'''
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'MAX_WORKERS': 2,
+    'MAX_PENDING': 16,
+    'TIMEOUT': 5,
+    'START_METHOD': None,
+}
+
+
+class HashingBusy(Exception):
+    """哈希服务繁忙，请求应当被拒绝"""
+    pass
+
+
+def _init_worker():
+    """进程池中的进程以 spawn 方式启动时，需要先初始化Django"""
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def create_process_pool(max_workers, start_method=None):
+    """
+    创建计算密码哈希的进程池，进程启动时初始化Django
+    :param max_workers: 进程数
+    :param start_method: 进程的启动方式，None 表示平台默认
+    :return: ProcessPoolExecutor
+    """
+    mp_context = multiprocessing.get_context(start_method)
+    return ProcessPoolExecutor(max_workers, mp_context=mp_context, initializer=_init_worker)
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+def hash_passwords(passwords):
+    """
+    批量计算密码哈希，在 create_process_pool() 创建的进程池中执行，一批只有一次进程间通信
+    :param passwords: 密码明文列表
+    :return: 哈希字符串列表
+    """
+    return [_make_password(password) for password in passwords]
+
+
+def _check_password(password, encoded):
+    """
+    校验密码，逻辑与 django.contrib.auth.hashers.check_password 相同
+    :return: (密码是否正确, 是否需要用首选的哈希算法重新计算)
+    """
+    from django.contrib.auth.hashers import get_hasher, identify_hasher
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, False
+    valid = hasher.verify(password, encoded)
+    preferred = get_hasher('default')
+    must_update = valid and (hasher.algorithm != preferred.algorithm or preferred.must_update(encoded))
+    return valid, must_update
+
+
+class PasswordHashingService(object):
+    """有界进程池中的密码哈希服务"""
+
+    def __init__(self, options):
+        self.max_workers = options['MAX_WORKERS']
+        self.timeout = options['TIMEOUT']
+        self.start_method = options['START_METHOD']
+        self._slots = threading.BoundedSemaphore(options['MAX_PENDING'])
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'count': 0, 'seconds': 0.0, 'rejected': 0}
+
+    def get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = create_process_pool(self.max_workers, self.start_method)
+        return self._executor
+
+    def reset_executor(self, executor):
+        """进程池中的进程异常退出后，丢弃整个进程池，下次使用时重建"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _count(self, name, value=1):
+        # 统计在多个请求线程中更新
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _release_slot(self, future):
+        self._slots.release()
+
+    def run(self, func, *args):
+        """
+        在进程池中执行哈希计算
+        :raise HashingBusy: 排队任务已满或等待超时
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HashingBusy()
+        started = time.monotonic()
+        try:
+            if not self.max_workers:
+                try:
+                    return func(*args)
+                finally:
+                    self._slots.release()
+            return self._run_in_pool(func, *args)
+        finally:
+            with self._stats_lock:
+                self.stats['count'] += 1
+                self.stats['seconds'] += time.monotonic() - started
+
+    def _run_in_pool(self, func, *args):
+        """提交到进程池，名额由任务结束时的回调释放"""
+        executor = self.get_executor()
+        try:
+            try:
+                future = executor.submit(func, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(self._release_slot)
+            try:
+                return future.result(self.timeout)
+            except TimeoutError:
+                # 已经开始计算的任务无法取消，计算完成后才释放名额
+                future.cancel()
+                self._count('rejected')
+                raise HashingBusy()
+        except BrokenProcessPool:
+            logger.error('密码哈希进程池异常，重建进程池')
+            self.reset_executor(executor)
+            raise HashingBusy()
+
+    def make_password(self, password):
+        """
+        计算密码的哈希值
+        :param password: 密码明文
+        :return: 可以直接保存到 User.password 的哈希字符串
+        """
+        return self.run(_make_password, password)
+
+    def check_password(self, password, encoded):
+        """
+        校验密码
+        :param password: 密码明文
+        :param encoded: User.password 中保存的哈希字符串
+        :return: (密码是否正确, 是否需要重新计算哈希)
+        """
+        if not password or not encoded:
+            return False, False
+        return self.run(_check_password, password, encoded)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_hashing_service():
+    """
+    获取按配置创建的密码哈希服务（进程内单例）
+    :return: PasswordHashingService
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PasswordHashingService(dict(DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})))
+    return _service
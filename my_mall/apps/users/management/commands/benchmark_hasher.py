@@ -0,0 +1,39 @@
+'''
+测量密码哈希的耗时：python manage.py benchmark_hasher [--iterations 100000 216000] [--rounds 20]
+用于评估调整 PASSWORD_HASHING['PBKDF2_ITERATIONS'] 的效果
+'''
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+from users.hashing import get_hashing_service
+
+
+class Command(BaseCommand):
+    help = '测量当前配置及指定迭代次数下密码哈希的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, nargs='*', default=[], help='额外测量的PBKDF2迭代次数')
+        parser.add_argument('--rounds', type=int, default=20, help='每种配置计算的次数')
+
+    def handle(self, *args, **options):
+        rounds = options['rounds']
+        hasher = get_hasher('default')
+        self.report('当前配置 %s' % hasher.algorithm, rounds, lambda: hasher.encode('benchmark123', hasher.salt()))
+
+        for iterations in options['iterations']:
+            self.report('pbkdf2_sha256 iterations=%d' % iterations, rounds,
+                        lambda: hasher.encode('benchmark123', hasher.salt(), iterations))
+
+        # 经过哈希服务（进程池）的耗时，包含进程间通信的开销
+        service = get_hashing_service()
+        self.report('哈希服务 make_password', rounds, lambda: service.make_password('benchmark123'))
+
+    def report(self, name, rounds, func):
+        func()  # 预热，排除进程池启动的时间
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        elapsed = (time.perf_counter() - started) / rounds
+        self.stdout.write('%-40s %8.2f ms/次  %8.1f 次/秒' % (name, elapsed * 1000, 1 / elapsed))
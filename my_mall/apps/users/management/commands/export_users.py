@@ -0,0 +1,91 @@
+'''
+批量导出用户：python manage.py export_users users.csv [--format csv|jsonl] [--chunk-size 2000]
+
+按主键分批读取（WHERE id > 上一批的最大id ORDER BY id LIMIT n），每批查询都走主键索引，
+MySQL 客户端也不会一次性缓存整个结果集，内存占用与用户数无关。
+导出的 password 是哈希值，可以用 import_users --hashed 导入。
+'''
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+
+FIELDS = ('id', 'username', 'mobile', 'password', 'email', 'is_active', 'date_joined', 'last_login')
+
+
+class Command(BaseCommand):
+    help = '将用户导出为CSV/JSONL文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="导出文件，'-' 表示标准输出")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='文件格式，默认按扩展名判断')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每次查询的用户数')
+        parser.add_argument('--progress', type=float, default=2, help='报告进度的间隔（秒）')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+
+        if path == '-':
+            stream = sys.stdout
+        else:
+            try:
+                stream = open(path, 'w', encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError('无法打开文件%s：%s' % (path, e))
+
+        started = last_report = time.monotonic()
+        count = 0
+        try:
+            write = self.csv_writer(stream) if fmt == 'csv' else self.jsonl_writer(stream)
+            for chunk in self.iter_chunks(options['chunk_size']):
+                for row in chunk:
+                    write(row)
+                count += len(chunk)
+                now = time.monotonic()
+                if now - last_report >= options['progress']:
+                    last_report = now
+                    self.stderr.write('已导出%d个用户，%.0f个/秒' % (count, count / (now - started)))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS('共导出%d个用户，耗时%.1fs' % (count, elapsed)))
+
+    @staticmethod
+    def iter_chunks(chunk_size):
+        """按主键分批读取用户"""
+        last_id = 0
+        while True:
+            chunk = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list(*FIELDS)[:chunk_size]
+            )
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1][0]
+
+    @staticmethod
+    def csv_writer(stream):
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+
+        def write(row):
+            writer.writerow(['' if value is None else value.isoformat() if hasattr(value, 'isoformat') else value
+                             for value in row])
+
+        return write
+
+    @staticmethod
+    def jsonl_writer(stream):
+        def write(row):
+            data = {field: value.isoformat() if hasattr(value, 'isoformat') else value
+                    for field, value in zip(FIELDS, row)}
+            stream.write(json.dumps(data, ensure_ascii=False) + '\n')
+
+        return write
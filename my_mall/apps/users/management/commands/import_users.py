@@ -0,0 +1,218 @@
+'''
+批量导入用户：python manage.py import_users users.csv [--format csv|jsonl] [--hashed] [--batch-size 1000] [--workers 4]
+
+逐行读取CSV/JSONL（'-' 表示标准输入），内存占用与文件大小无关：
+    username,mobile,password[,email,is_active,date_joined,last_login]
+(1) 每批先用一次查询过滤掉用户名或手机号已存在的行，不为它们计算密码哈希；
+(2) 密码明文在进程池中按批计算哈希，同时处理的批数有上限；--hashed 表示文件中已经是哈希值（如 export_users 的导出结果）；
+(3) 每批在一个事务中 bulk_create，bulk_create 不发送 post_save 信号，由本命令批量更新用户存在性索引。
+'''
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.existence import get_existence_index
+from users.hashing import create_process_pool, hash_passwords
+from users.models import User
+from users.validators import ImportUserSchema
+
+FIELDS = ('username', 'mobile', 'password', 'email', 'is_active', 'date_joined', 'last_login')
+
+# 最多报告的错误行数
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '从CSV/JSONL文件批量导入用户'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="导入文件，'-' 表示标准输入")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='文件格式，默认按扩展名判断')
+        parser.add_argument('--hashed', action='store_true', help='password 列已经是哈希值')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的用户数')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='计算密码哈希的进程数，0 表示在当前进程中计算')
+        parser.add_argument('--progress', type=float, default=2, help='报告进度的间隔（秒）')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        self.hashed = options['hashed']
+        self.batch_size = options['batch_size']
+        self.progress_interval = options['progress']
+        self.index = get_existence_index()
+        self.stats = {'read': 0, 'created': 0, 'existing': 0, 'invalid': 0}
+        self.started = self.last_report = time.monotonic()
+
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError('无法打开文件%s：%s' % (path, e))
+
+        with stream:
+            rows = self.read_csv(stream) if fmt == 'csv' else self.read_jsonl(stream)
+            batches = self.clean_batches(rows)
+            if self.hashed or not options['workers']:
+                for batch in batches:
+                    self.insert(batch, self.hash_batch(batch))
+            else:
+                self.import_parallel(batches, options['workers'])
+
+        self.report(final=True)
+
+    def import_parallel(self, batches, workers):
+        """进程池计算哈希，当前进程按顺序写入；最多 2 * workers 批在处理中"""
+        with create_process_pool(workers) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append((batch, pool.submit(hash_passwords, [row['password'] for row in batch])))
+                if len(pending) >= workers * 2:
+                    batch, future = pending.popleft()
+                    self.insert(batch, future.result())
+            while pending:
+                batch, future = pending.popleft()
+                self.insert(batch, future.result())
+
+    def hash_batch(self, batch):
+        passwords = [row['password'] for row in batch]
+        return passwords if self.hashed else hash_passwords(passwords)
+
+    @staticmethod
+    def read_csv(stream):
+        reader = csv.DictReader(stream)
+        missing = {'username', 'mobile', 'password'} - set(reader.fieldnames or [])
+        if missing:
+            raise CommandError('CSV缺少列：%s' % ', '.join(sorted(missing)))
+        # 第1行是表头
+        for line_no, row in enumerate(reader, 2):
+            yield line_no, row
+
+    @staticmethod
+    def read_jsonl(stream):
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = e
+            yield line_no, row
+
+    def clean_row(self, row):
+        """
+        校验一行数据
+        :return: 只含 FIELDS 中字段的字典
+        :raise RowError: 数据不合法
+        """
+        if not isinstance(row, dict):
+            raise RowError('无法解析：%s' % row)
+        cleaned, errors = ImportUserSchema.validate(row)
+        if errors:
+            raise RowError('；'.join('%s: %s' % (name, message) for name, (code, message) in errors.items()))
+        data = {field: row[field] for field in FIELDS if row.get(field) not in (None, '')}
+        # JSONL 中的手机号可能是数字，使用校验后的字符串
+        data.update(cleaned)
+        if self.hashed:
+            try:
+                identify_hasher(data['password'])
+            except ValueError:
+                raise RowError('无法识别的密码哈希')
+        if 'is_active' in data and not isinstance(data['is_active'], bool):
+            data['is_active'] = str(data['is_active']).lower() in ('1', 'true', 'yes')
+        for field in ('date_joined', 'last_login'):
+            if field in data:
+                value = parse_datetime(str(data[field]))
+                if value is None:
+                    raise RowError('%s格式错误：%s' % (field, data[field]))
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                data[field] = value
+        return data
+
+    def clean_batches(self, rows):
+        """
+        按批校验数据，去掉批内重复及数据库中已存在的用户
+        :return: 生成器，每次返回一批待写入的行
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.batch_size))
+            if not chunk:
+                return
+            self.stats['read'] += len(chunk)
+            batch, usernames, mobiles = [], set(), set()
+            for line_no, row in chunk:
+                try:
+                    data = self.clean_row(row)
+                except RowError as e:
+                    self.stats['invalid'] += 1
+                    if self.stats['invalid'] <= MAX_REPORTED_ERRORS:
+                        self.stderr.write('第%d行：%s' % (line_no, e))
+                    continue
+                if data['username'] in usernames or data['mobile'] in mobiles:
+                    self.stats['existing'] += 1
+                    continue
+                usernames.add(data['username'])
+                mobiles.add(data['mobile'])
+                batch.append(data)
+
+            existing = User.objects.filter(Q(username__in=usernames) | Q(mobile__in=mobiles))
+            existing_usernames, existing_mobiles = set(), set()
+            for username, mobile in existing.values_list('username', 'mobile'):
+                existing_usernames.add(username)
+                existing_mobiles.add(mobile)
+            fresh = [
+                data for data in batch
+                if data['username'] not in existing_usernames and data['mobile'] not in existing_mobiles
+            ]
+            self.stats['existing'] += len(batch) - len(fresh)
+            if fresh:
+                yield fresh
+
+    def insert(self, batch, encoded):
+        """写入一批用户并更新存在性索引"""
+        users = [User(**dict(data, password=password)) for data, password in zip(batch, encoded)]
+        usernames = User.objects.filter(username__in=[user.username for user in users])
+        with transaction.atomic():
+            # 处理中的其他批次或并发注册可能已经写入了相同的用户名/手机号，这些行被忽略，
+            # bulk_create 不返回实际写入的行数，用写入前后本批用户名的数量之差统计
+            before = usernames.count()
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            created = usernames.count() - before
+        self.index.add_many([{'username': user.username, 'mobile': user.mobile} for user in users])
+        self.stats['created'] += created
+        self.stats['existing'] += len(users) - created
+        self.report()
+
+    def report(self, final=False):
+        now = time.monotonic()
+        if not final and now - self.last_report < self.progress_interval:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        message = '已读取%(read)d行，写入%(created)d，已存在%(existing)d，无效%(invalid)d' % self.stats
+        message += '，%.0f行/秒，耗时%.1fs' % (self.stats['read'] / elapsed if elapsed else 0, elapsed)
+        if final:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stderr.write(message)
@@ -12,6 +12,18 @@ class User(AbstractUser):
         db_table = 'mall_users'
         verbose_name = '用户'
         verbose_name_plural = verbose_name
+        # admin 列表页按注册时间倒序的键集分页，username、mobile 的前缀搜索使用各自的唯一索引
+        indexes = [
+            models.Index(fields=['date_joined', 'id'], name='mall_users_joined_idx'),
+            models.Index(fields=['is_staff', 'date_joined', 'id'], name='mall_users_staff_joined_idx'),
+        ]
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    def get_session_auth_hash(self):
+        """从用户缓存构造、没有加载密码的对象使用缓存中的会话哈希，核对session时不查询数据库，见 users.cache"""
+        session_hash = self.__dict__.get('_session_auth_hash')
+        if session_hash is not None and 'password' not in self.__dict__:
+            return session_hash
+        return super().get_session_auth_hash()
\ No newline at end of file
@@ -0,0 +1,33 @@
+'''
+用户模型的信号处理
+'''
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User
+from .existence import get_existence_index
+from .cache import refresh_user, invalidate_user
+
+
+@receiver(post_save, sender=User, dispatch_uid='users.update_existence_index')
+def update_existence_index(sender, instance, created, update_fields=None, **kwargs):
+    """
+    用户保存后更新用户名/手机号存在性索引
+    登录时 update_last_login 只更新 last_login 字段，无需更新索引
+    """
+    if update_fields and not {'username', 'mobile'} & set(update_fields):
+        return
+    get_existence_index().add(username=instance.username, mobile=instance.mobile)
+
+
+@receiver(post_save, sender=User, dispatch_uid='users.refresh_user_cache')
+def refresh_user_cache(sender, instance, **kwargs):
+    """用户保存（包括修改密码、更新last_login）后，用最新的用户对象覆盖缓存，事务回滚时不更新"""
+    transaction.on_commit(lambda: refresh_user(instance))
+
+
+@receiver(post_delete, sender=User, dispatch_uid='users.invalidate_user_cache')
+def invalidate_user_cache(sender, instance, **kwargs):
+    """用户删除后，删除用户缓存"""
+    transaction.on_commit(lambda: invalidate_user(instance))
@@ -1,3 +1,52 @@
+'''
+用户注册的测试
+短信验证码保存在 settings.SMS_CODES['CACHE_ALIAS'] 对应的 Redis 中，测试结束后删除
+'''
 from django.test import TestCase
 
-# Create your tests here.
+from my_mall.utils.response_code import RETCODE
+from users.models import User
+from verifications.sms_codes import get_sms_service
+
+
+class RegisterSMSCodeTest(TestCase):
+    """注册时校验短信验证码"""
+    mobile = '13800138001'
+
+    def setUp(self):
+        self.service = get_sms_service()
+        self.addCleanup(self.service.get_redis().delete, *self.service.keys(self.mobile))
+        self.data = {
+            'username': 'sms_test_user', 'password': 'testpass123', 'password2': 'testpass123',
+            'mobile': self.mobile, 'allow': 'on',
+        }
+
+    def send_code(self):
+        self.assertEqual(self.service.send(self.mobile), 0)
+        return self.service.get_redis().get(self.service.keys(self.mobile)[1]).decode()
+
+    def assert_rejected(self, response):
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], RETCODE.SMSCODERR)
+        self.assertFalse(User.objects.filter(mobile=self.mobile).exists())
+
+    def test_missing_sms_code(self):
+        self.send_code()
+        self.assert_rejected(self.client.post('/register/', self.data))
+        self.assert_rejected(self.client.post('/register/', dict(self.data, sms_code='')))
+
+    def test_wrong_sms_code(self):
+        code = self.send_code()
+        wrong = '%06d' % ((int(code) + 1) % 10 ** 6)
+        self.assert_rejected(self.client.post('/register/', dict(self.data, sms_code=wrong)))
+
+    def test_expired_sms_code(self):
+        self.assert_rejected(self.client.post('/register/', dict(self.data, sms_code='123456')))
+
+    def test_correct_sms_code(self):
+        code = self.send_code()
+        response = self.client.post('/register/', dict(self.data, sms_code=code))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(User.objects.filter(username='sms_test_user', mobile=self.mobile).exists())
+        # 注册成功后验证码被删除，不能再次使用
+        self.assertIsNone(self.service.check(self.mobile, code))
@@ -1,23 +1,38 @@
 '''
 新建users子路由
 '''
+from django.conf import settings
 from django.conf.urls import url
-from . import views
+from my_mall.utils.lazy_urls import lazy_view
+from .validators import MOBILE_PATTERN, USERNAME_PATTERN
+
+# ASGI部署时使用异步视图，见 settings.ASYNC_VIEWS
+async_views = getattr(settings, 'ASYNC_VIEWS', {}).get('ENABLED', False)
+
+
+def view(name, async_name=None):
+    """视图在第一次请求时才导入，只处理查重接口的worker不导入页面视图及模板，见 my_mall.utils.lazy_urls"""
+    if async_views and async_name:
+        return lazy_view('users.%s' % async_name, is_async=True)
+    return lazy_view('users.%s' % name)
+
 
 app_name = 'users'
 urlpatterns = [
     # 用户注册: reverse(users:register) == '/register/'
-    url(r'^register/$', views.RegisterView.as_view(), name='register'),
+    url(r'^register/$', view('views.RegisterView'), name='register'),
     # 判断用户名是否重复注册
-    url(r'^usernames/(?P<username>[a-zA-Z0-9_-]{5,20})/count/$', views.UsernameCountView.as_view()),
+    url(r'^usernames/(?P<username>%s)/count/$' % USERNAME_PATTERN, view('count_views.UsernameCountView', 'count_views.AsyncUsernameCountView')),
     # 判断手机号是否重复注册
-    url(r'^mobiles/(?P<mobile>1[3-9]\d{9})/count/$', views.MobileCountView.as_view()),
+    url(r'^mobiles/(?P<mobile>%s)/count/$' % MOBILE_PATTERN, view('count_views.MobileCountView', 'count_views.AsyncMobileCountView')),
+    # 同时判断用户名和手机号是否重复注册：/availability/?username=...&mobile=...
+    url(r'^availability/$', view('count_views.AvailabilityView', 'count_views.AsyncAvailabilityView'), name='availability'),
 
     # 用户登录
-    url(r'^login/$', views.LoginView.as_view(), name='login'),
+    url(r'^login/$', view('views.LoginView', 'views.AsyncLoginView'), name='login'),
     # 用户退出登录
-    url(r'^logout/$', views.LogoutView.as_view(), name='logout'),
+    url(r'^logout/$', view('views.LogoutView'), name='logout'),
     
     # 用户中心
-    url(r'^info/$', views.UserInfoView.as_view(), name='info')
+    url(r'^info/$', view('views.UserInfoView'), name='info')
 ]
\ No newline at end of file
@@ -1,28 +1,47 @@
 '''
 自定义用户认证后端，实现多账号登录
 '''
+import logging
+
 from django.contrib.auth.backends import ModelBackend
-import re
+from my_mall.utils.db_router import replica_reads
 from .models import User
+from .cache import get_user_by_account_cached, get_user_by_pk
+from .hashing import HashingBusy, get_hashing_service
+from .validators import is_mobile
+
+logger = logging.getLogger('django')
 
 
-def get_user_by_account(account):
+def get_user_by_account(account, request=None):
     """
     根据account查询用户
     :param account: 用户名或者手机号
+    :param request: 请求对象，传入时同一请求内的重复查询直接使用第一次的结果
     :return: user
     """
-    try:
-        if re.match('^1[3-9]\d{9}$', account):
-            # 手机号登录
-            user = User.objects.get(mobile=account)
-        else:
-            # 用户名登录
-            user = User.objects.get(username=account)
-    except User.DoesNotExist:
-        return None
+    memo = request.__dict__.setdefault('_account_users', {}) if request is not None else {}
+    if account in memo:
+        return memo[account]
+
+    if is_mobile(account):
+        # 手机号登录
+        field = 'mobile'
     else:
-        return user
+        # 用户名登录
+        field = 'username'
+
+    def load():
+        # 登录前的查询读从库；之后更新 last_login 等写操作由路由发往主库
+        try:
+            with replica_reads():
+                return User.objects.get(**{field: account})
+        except User.DoesNotExist:
+            return None
+
+    # 优先读取用户缓存，缓存缺失时才查询数据库
+    user = memo[account] = get_user_by_account_cached(account, field, load)
+    return user
 
 
 class UsernameMobileAuthBackend(ModelBackend):
@@ -38,9 +57,32 @@ class UsernameMobileAuthBackend(ModelBackend):
         :return: user
         """
         # 根据传入的username获取user对象。username可以是手机号也可以是账号
-        user = get_user_by_account(username)
-        # 如果可以查询到用户，还需要校验密码是否正确
-        if user and user.check_password(password):
-            return user
-        else:
-            return None
\ No newline at end of file
+        user = get_user_by_account(username, request)
+        if user is None:
+            return None
+        # 如果可以查询到用户，还需要校验密码是否正确：在哈希服务的进程池中计算，繁忙时抛出 HashingBusy
+        hashing = get_hashing_service()
+        valid, must_update = hashing.check_password(password, user.password)
+        if not valid:
+            return None
+        if must_update:
+            # 哈希算法或迭代次数已调整：用新的配置重新计算并保存，实现平滑迁移
+            # 密码已经校验通过，哈希服务繁忙时不拒绝登录，下次登录时再重新计算
+            try:
+                encoded = hashing.make_password(password)
+            except HashingBusy:
+                logger.warning('哈希服务繁忙，用户%s的密码哈希推迟到下次登录时更新' % user.pk)
+            else:
+                user.password = encoded
+                user.save(update_fields=['password'])
+        return user
+
+    def get_user(self, user_id):
+        """
+        重写根据用户id查询用户的方法，AuthenticationMiddleware 每个请求都会调用，
+        优先读取用户缓存，登录用户浏览页面时不查询数据库
+        :param user_id: session中保存的用户id
+        :return: user
+        """
+        user = get_user_by_pk(user_id)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,51 @@
+'''
+用户相关参数的格式与校验规则
+视图、认证后端、路由和导入命令共用这里的正则，前端 register.js / login.js 中的正则与之保持一致
+'''
+import re
+
+from my_mall.utils.response_code import RETCODE
+from my_mall.utils.validation import Field, Schema
+from verifications.validators import SMS_CODE_PATTERN
+
+# 不含 ^ 和 $，路由中可以直接拼接
+USERNAME_PATTERN = r'[a-zA-Z0-9_-]{5,20}'
+MOBILE_PATTERN = r'1[3-9]\d{9}'
+PASSWORD_PATTERN = r'[0-9A-Za-z]{8,20}'
+
+mobile_re = re.compile(MOBILE_PATTERN)
+
+
+def is_mobile(value):
+    return mobile_re.fullmatch(value) is not None
+
+
+class RegisterSchema(Schema):
+    """用户注册"""
+    username = Field(USERNAME_PATTERN, code=RETCODE.USERERR, message='请输入5-20个字符的用户名')
+    password = Field(PASSWORD_PATTERN, code=RETCODE.PWDERR, message='请输入8-20位的密码')
+    password2 = Field(equals='password', code=RETCODE.CPWDERR, message='两次输入的密码不一致')
+    mobile = Field(MOBILE_PATTERN, code=RETCODE.MOBILEERR, message='请输入正确的手机号码')
+    # 没有填写时 RegisterView 同样返回 RETCODE.SMSCODERR，而不是缺少必传参数
+    sms_code = Field(SMS_CODE_PATTERN, required=False, code=RETCODE.SMSCODERR, message='请填写短信验证码')
+    allow = Field(choices=('on',), code=RETCODE.ALLOWERR, message='请勾选用户协议')
+
+
+class LoginSchema(Schema):
+    """用户登录，用户名也可以是手机号"""
+    username = Field(USERNAME_PATTERN, code=RETCODE.USERERR, message='请输入正确的用户名或手机号')
+    password = Field(PASSWORD_PATTERN, code=RETCODE.PWDERR, message='密码最少8位，最长20位')
+    remembered = Field(required=False)
+
+
+class AvailabilitySchema(Schema):
+    """用户名、手机号是否重复注册，至少传一个"""
+    username = Field(USERNAME_PATTERN, required=False, code=RETCODE.USERERR, message='请输入5-20个字符的用户名')
+    mobile = Field(MOBILE_PATTERN, required=False, code=RETCODE.MOBILEERR, message='请输入正确的手机号码')
+
+
+class ImportUserSchema(Schema):
+    """批量导入用户"""
+    username = Field(USERNAME_PATTERN, code=RETCODE.USERERR, message='用户名格式错误')
+    mobile = Field(MOBILE_PATTERN, code=RETCODE.MOBILEERR, message='手机号格式错误')
+    password = Field(code=RETCODE.PWDERR)
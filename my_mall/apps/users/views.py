@@ -1,22 +1,64 @@
 from django.shortcuts import render, redirect
 from django.views import View
 import re
-from django import http
 from users.models import User
 from my_mall.utils.response_code import RETCODE
-from django.db import DatabaseError
+from django.db import DatabaseError, IntegrityError, transaction
 from django.contrib.auth import login, authenticate, logout
 from django.urls import reverse
 import logging
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from users.hashing import get_hashing_service, HashingBusy
+from my_mall.utils.responses import throttled_response
+from my_mall.utils.throttling import ThrottleMixin, AsyncThrottleMixin
+from my_mall.utils.aio import AsyncView, run_sync
+from my_mall.utils.validation import validation_error_response
+from my_mall.utils.streaming import TemplateValidators, stream_template
+from users.validators import LoginSchema, RegisterSchema
+from verifications.sms_codes import check_sms_code, consume_sms_code
 
 # Create your views here.
 
 
 logger = logging.getLogger('django')
 
-class RegisterView(View):
+# 用户名/手机号唯一约束冲突对应的错误码和提示
+DUPLICATE_ERRORS = {
+    'username': (RETCODE.USERERR, '用户名已存在'),
+    'mobile': (RETCODE.MOBILEERR, '手机号已存在'),
+}
+
+
+MYSQL_DUPLICATE_RE = re.compile(r"for key '([^']+)'")
+SQLITE_DUPLICATE_RE = re.compile(r'UNIQUE constraint failed: (\S+)')
+
+
+def duplicate_field(error):
+    """
+    从唯一约束冲突的异常信息中找出冲突的字段
+    MySQL: Duplicate entry '...' for key 'mall_users.mobile'（5.7 为 key 'mobile'）
+    SQLite: UNIQUE constraint failed: mall_users.mobile
+    :param error: IntegrityError
+    :return: 'username'、'mobile'，无法识别返回 None
+    """
+    message = str(error)
+    # 冲突的值可能包含字段名，只检查约束名部分
+    match = MYSQL_DUPLICATE_RE.search(message) or SQLITE_DUPLICATE_RE.search(message)
+    constraint = match.group(1) if match else message
+    for field in DUPLICATE_ERRORS:
+        if field in constraint:
+            return field
+    return None
+
+
+class RegisterView(ThrottleMixin, View):
     """用户注册"""
+    throttle_scope = 'register'
+    throttle_methods = ('POST',)
 
     def get(self, request):
         """
@@ -32,39 +74,56 @@ class RegisterView(View):
         :param request: 请求对象
         :return: 注册结果
         """
-        # 接收参数：表单参数
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        password2 = request.POST.get('password2')
-        mobile = request.POST.get('mobile')
-        allow = request.POST.get('allow')
-
-        # 校验参数：前后端的校验需要分开，避免恶意用户越过前端逻辑发请求，要保证后端的安全，前后端的校验逻辑相同
-        # 判断参数是否齐全:all([列表])：会去校验列表中的元素是否为空，只要有一个为空，返回false
-        if not all([username, password, password2, mobile, allow]):
-            return http.HttpResponseForbidden('缺少必传参数')
-        # 判断用户名是否是5-20个字符
-        if not re.match(r'^[a-zA-Z0-9_-]{5,20}$', username):
-            return http.HttpResponseForbidden('请输入5-20个字符的用户名')
-        # 判断密码是否是8-20个数字
-        if not re.match(r'^[0-9A-Za-z]{8,20}$', password):
-            return http.HttpResponseForbidden('请输入8-20位的密码')
-        # 判断两次密码是否一致
-        if password != password2:
-            return http.HttpResponseForbidden('两次输入的密码不一致')
-        # 判断手机号是否合法
-        if not re.match(r'^1[3-9]\d{9}$', mobile):
-            return http.HttpResponseForbidden('请输入正确的手机号码')
-        # 判断是否勾选用户协议
-        if allow != 'on':
-            return http.HttpResponseForbidden('请勾选用户协议')
-        
+        # 接收并校验参数：前后端的校验需要分开，避免恶意用户越过前端逻辑发请求，要保证后端的安全，前后端的校验逻辑相同
+        # 参数是否齐全、用户名/密码/手机号/短信验证码的格式、两次密码是否一致、是否勾选用户协议，见 users.validators.RegisterSchema
+        data, errors = RegisterSchema.validate(request.POST)
+        if 'sms_code' not in data and 'sms_code' not in errors:
+            errors['sms_code'] = RegisterSchema.sms_code.error
+        if errors:
+            return validation_error_response(errors)
+        username, password, mobile = data['username'], data['password'], data['mobile']
+
+        # 校验短信验证码：此时只校验不删除，密码哈希繁忙或用户名/手机号已存在时用户可以继续使用同一个验证码，
+        # 注册成功后才删除，不能重复使用，见 verifications.sms_codes
+        try:
+            result = check_sms_code(mobile, data['sms_code'], consume=False)
+        except Exception as e:
+            logger.error('校验短信验证码失败：%s' % e)
+            return render(request, 'register.html', {'register_errmsg': '注册失败'})
+        if not result:
+            errmsg = '短信验证码已失效' if result is None else '输入短信验证码有误'
+            return validation_error_response({'sms_code': (RETCODE.SMSCODERR, errmsg)})
+
+        # 计算密码哈希：在哈希服务的进程池中计算，繁忙时直接拒绝，避免请求堆积
+        try:
+            encoded_password = get_hashing_service().make_password(password)
+        except HashingBusy:
+            return throttled_response()
+
         # 保存注册数据：是注册业务的核心
+        # 与 create_user 相同，只是密码已经在哈希服务中计算好了
+        # 不预先查询用户名/手机号是否已存在，直接插入，由数据库的唯一索引判断，并发注册时也不会有竞争
         try:
-            user = User.objects.create_user(username=username, password=password, mobile=mobile)
-        except DatabaseError:
+            with transaction.atomic():
+                user = User(username=User.normalize_username(username), mobile=mobile, password=encoded_password)
+                user.save(force_insert=True)
+        except IntegrityError as e:
+            field = duplicate_field(e)
+            if field is None:
+                logger.error('注册失败：%s' % e)
+                return render(request, 'register.html', {'register_errmsg': '注册失败'})
+            code, errmsg = DUPLICATE_ERRORS[field]
+            return render(request, 'register.html', {'register_errmsg': errmsg, 'register_errcode': code})
+        except DatabaseError as e:
+            logger.error('注册失败：%s' % e)
             return render(request, 'register.html', {'register_errmsg':'注册失败'})
 
+        # 用户已经提交到数据库，删除用过的短信验证码；删除失败时验证码到期后自动失效，不影响注册结果
+        try:
+            consume_sms_code(mobile, data['sms_code'])
+        except Exception as e:
+            logger.error('删除短信验证码失败：%s' % e)
+
         # 实现状态保持
         # Django用户认证系统提供了 login() 方法
         # 封装了写入session的操作，帮助我们快速实现状态保持
@@ -80,34 +139,10 @@ class RegisterView(View):
         return response
     
 
-class UsernameCountView(View):
-    """判断用户名是否重复注册"""
-
-    def get(self, request, username):
-        """
-        :param request: 请求对象
-        :param username: 用户名
-        :return: JSON
-        """
-        count = User.objects.filter(username=username).count()
-        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': 'OK', 'count': count})
-    
-
-class MobileCountView(View):
-    """判断手机号是否重复注册"""
-
-    def get(self, request, mobile):
-        """
-        :param request: 请求对象
-        :param mobile: 手机号
-        :return: JSON
-        """
-        count = User.objects.filter(mobile=mobile).count()
-        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': 'OK', 'count': count})
-    
-
-class LoginView(View):
+class LoginView(ThrottleMixin, View):
     """用户登录"""
+    throttle_scope = 'login'
+    throttle_methods = ('POST',)
 
     def get(self, request):
         """提供用户登录页面"""
@@ -115,18 +150,11 @@ class LoginView(View):
 
     def post(self, request):
         """实现用户登录逻辑"""
-        # 接收参数
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        remembered = request.POST.get('remembered')
-
-        # 校验参数
-        if not all([username, password]):
-            return http.HttpResponseForbidden('缺少必传参数')
-        if not re.match(r'^[a-zA-Z0-9_-]{5,20}$', username):
-            return http.HttpResponseForbidden('请输入正确的用户名或手机号')
-        if not re.match(r'^[0-9A-Za-z]{8,20}$', password):
-            return http.HttpResponseForbidden('密码最少8位，最长20位')
+        # 接收并校验参数，见 users.validators.LoginSchema
+        data, errors = LoginSchema.validate(request.POST)
+        if errors:
+            return validation_error_response(errors)
+        username, password, remembered = data['username'], data['password'], data.get('remembered')
 
         # 认证用户:使用账号查询用户是否存在，如果用户存在，再校验密码是否正确，最后返回user对象。
         # 可以看到，上述过程完全可以自己实现而不调用authenticate。
@@ -134,7 +162,12 @@ class LoginView(View):
         # 下面，我们在user.utils.py中自定义authentication backends，以实现多用户登录（用户名or手机号均能登录），
         # 并在项目setting中配置自定义后端：AUTHENTICATION_BACKENDS = ['users.utils.UsernameMobileAuthBackend']。
         # 这样，from django.contrib.auth import authenticate 导入的 authenticate 就是我们自定义的 authenticate 方法。
-        user = authenticate(username=username, password=password)
+        # 传入request，认证后端可以在同一请求内复用查询到的用户
+        try:
+            user = authenticate(request, username=username, password=password)
+        except HashingBusy:
+            # 密码哈希服务繁忙
+            return throttled_response()
         if user is None:
             # 登录失败
             return render(request, 'login.html', {'account_errmsg': '账号或密码错误'})
@@ -168,6 +201,21 @@ class LoginView(View):
         return response
     
 
+class AsyncLoginView(AsyncThrottleMixin, AsyncView):
+    """
+    用户登录（异步版本，ASGI部署时使用）
+    登录过程中查询用户、计算密码哈希、写session都是阻塞操作，整体放到线程池中执行
+    """
+    throttle_scope = 'login'
+    throttle_methods = ('POST',)
+
+    async def get(self, request):
+        return await run_sync(LoginView().get, request)
+
+    async def post(self, request):
+        return await run_sync(LoginView().post, request)
+
+
 class LogoutView(View):
     """用户退出登录"""
 
@@ -211,6 +259,10 @@ class LogoutView(View):
 #             return redirect(reverse('users:login'))
         
 
+# 用户中心页面的 ETag/Last-Modified，ETag 按用户区分
+user_info_validators = TemplateValidators('user_center_info.html', key_func=lambda request: request.user.pk)
+
+
 class UserInfoView(LoginRequiredMixin, View):
     """用户中心
     LoginRequiredMixin一定要放在View之前，因为这里是多继承，
@@ -237,6 +289,12 @@ class UserInfoView(LoginRequiredMixin, View):
     优先级更高。此外，无论在哪里设置，均不能使用 reverse 函数，而必须直接给出路径，因为程序存在加载先后的问题，否则会报错。
     """
     
+    @method_decorator([
+        gzip_page,
+        # 浏览器保存页面，但每次都带上 ETag 验证
+        cache_control(private=True, no_cache=True),
+        condition(etag_func=user_info_validators.etag, last_modified_func=user_info_validators.last_modified),
+    ])
     def get(self,request):
-        """提供用户中心页面"""
-        return render(request, 'user_center_info.html')
\ No newline at end of file
+        """提供用户中心页面：用户信息由前端加载，页面只随模板变化，流式发送"""
+        return stream_template(request, 'user_center_info.html')
\ No newline at end of file
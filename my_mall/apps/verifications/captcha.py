@@ -0,0 +1,78 @@
+'''
+图形验证码图片的绘制
+
+绘制一张验证码需要若干毫秒的CPU时间，不在请求中进行，而是由 verifications.image_codes 在进程池中批量预先生成。
+这里的函数只依赖参数，可以在进程池的子进程中直接调用。
+'''
+import io
+import random
+
+_system_random = random.SystemRandom()
+
+# 去掉容易混淆的字符：0/O、1/I/L、2/Z、5/S、8/B
+CHARSET = 'ACDEFGHJKMNPQRTUVWXY34679'
+
+
+def load_font(path, size):
+    from PIL import ImageFont
+    if path:
+        return ImageFont.truetype(path, size)
+    try:
+        # Pillow 10.1 之后自带可缩放的默认字体
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render_captcha(length=4, width=120, height=40, font=None, image_format='JPEG', rng=None):
+    """
+    绘制一张验证码
+    :param length: 字符数
+    :param width: 图片宽度
+    :param height: 图片高度
+    :param font: TrueType 字体文件，None 表示使用 Pillow 的默认字体
+    :param image_format: 图片格式
+    :param rng: 干扰元素使用的随机数生成器；验证码文本总是使用 SystemRandom，不能被预测
+    :return: (验证码文本, 图片字节)
+    """
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = rng or random
+    text = ''.join(_system_random.choice(CHARSET) for _ in range(length))
+    image = Image.new('RGB', (width, height), (rng.randint(230, 255), rng.randint(230, 255), rng.randint(230, 255)))
+    draw = ImageDraw.Draw(image)
+    typeface = load_font(font, int(height * 0.75))
+
+    # 干扰点和干扰线
+    for _ in range(width * height // 20):
+        draw.point((rng.randrange(width), rng.randrange(height)),
+                   fill=(rng.randint(100, 220), rng.randint(100, 220), rng.randint(100, 220)))
+    for _ in range(4):
+        draw.line([(rng.randrange(width), rng.randrange(height)) for _ in range(2)],
+                  fill=(rng.randint(80, 200), rng.randint(80, 200), rng.randint(80, 200)), width=1)
+
+    # 每个字符单独旋转后贴到图片上
+    step = width / (length + 0.5)
+    for i, char in enumerate(text):
+        glyph = Image.new('RGBA', (height, height), (0, 0, 0, 0))
+        ImageDraw.Draw(glyph).text(
+            (height * 0.15, height * 0.05), char, font=typeface,
+            fill=(rng.randint(10, 120), rng.randint(10, 120), rng.randint(10, 120)),
+        )
+        glyph = glyph.rotate(rng.uniform(-30, 30), resample=Image.BICUBIC)
+        image.paste(glyph, (int(step * (i + 0.25) + rng.uniform(-3, 3)), rng.randint(-3, 3)), glyph)
+
+    image = image.filter(ImageFilter.SMOOTH)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=70)
+    return text, buffer.getvalue()
+
+
+def render_batch(count, options):
+    """
+    在进程池中批量绘制，一批只有一次进程间通信
+    :param count: 张数
+    :param options: render_captcha 的参数
+    :return: [(验证码文本, 图片字节), ...]
+    """
+    return [render_captcha(**options) for _ in range(count)]
@@ -0,0 +1,366 @@
+'''
+图形验证码池
+
+绘制验证码图片很耗CPU，这里不在请求中绘制，而是：
+(1) 后台线程把绘制任务交给进程池（MAX_WORKERS 个进程，每个任务绘制 BATCH_SIZE 张），结果放入验证码池；
+(2) 请求 /image_codes/<uuid>/ 时从池中轮换取出一张，把答案以 uuid 为键保存 TTL 秒，只需一次Redis往返；
+(3) 校验时用一个事务同时读取并删除答案，同一个答案只能校验一次，并发的重放请求也只有一个能读到。
+池中的验证码循环使用，每 REFRESH_INTERVAL 秒用 REFRESH_BATCH 张新的替换最旧的一批；
+池还没有填满时先补满，池为空（刚部署、Redis被清空）时在请求中同步绘制一张。
+补满和替换都用 Redis 锁协调，同一时间只有一个进程绘制，其他进程继续使用池中已有的验证码。
+
+配置项 IMAGE_CAPTCHA：
+    BACKEND:          验证码池的实现，RedisCaptchaPool（所有进程共享）或 LocalCaptchaPool（进程内，单进程部署或测试用）
+    CACHE_ALIAS:      RedisCaptchaPool 使用的 django_redis 缓存别名
+    KEY_PREFIX:       Redis 键的前缀
+    POOL_SIZE:        池中的验证码数
+    REFRESH_INTERVAL: 替换一批验证码的周期（秒）
+    REFRESH_BATCH:    每次替换的张数
+    FILL_TIMEOUT:     补满时 Redis 锁的有效期（秒），应大于一次补满的耗时，持有锁的进程退出后最多这么久由其他进程接手
+    MAX_WORKERS:      绘制验证码的进程数，0 表示在后台线程中绘制
+    BATCH_SIZE:       每个进程任务绘制的张数
+    START_METHOD:     进程池的启动方式，None 表示平台默认
+    TTL:              答案的有效期（秒）
+    LENGTH、WIDTH、HEIGHT、FONT、FORMAT: 验证码的字符数、图片尺寸、字体文件、图片格式
+'''
+import hmac
+import logging
+import multiprocessing
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .captcha import render_batch, render_captcha
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'BACKEND': 'verifications.image_codes.LocalCaptchaPool',
+    'CACHE_ALIAS': 'default',
+    'KEY_PREFIX': 'captcha',
+    'POOL_SIZE': 1000,
+    'REFRESH_INTERVAL': 60,
+    'REFRESH_BATCH': 100,
+    'FILL_TIMEOUT': 600,
+    'MAX_WORKERS': 2,
+    'BATCH_SIZE': 50,
+    'START_METHOD': None,
+    'TTL': 300,
+    'LENGTH': 4,
+    'WIDTH': 120,
+    'HEIGHT': 40,
+    'FONT': None,
+    'FORMAT': 'JPEG',
+}
+
+# KEYS[1]: 验证码池，KEYS[2]: 答案；ARGV: 答案的有效期（秒）
+# 把池尾的一张移到池头并返回，同时以 uuid 保存它的答案；返回 {验证码, 池的长度}
+TAKE_SCRIPT = """
+local entry = redis.call('RPOPLPUSH', KEYS[1], KEYS[1])
+if entry then
+    local length = string.byte(entry, 1)
+    redis.call('SET', KEYS[2], string.sub(entry, 2, length + 1), 'EX', ARGV[1])
+end
+return {entry, redis.call('LLEN', KEYS[1])}
+"""
+
+# KEYS[1]: 补满的锁；ARGV: 加锁时的随机值。只释放自己持有的锁
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 池没有填满、但没有拿到补满的锁时，过多久再尝试（秒）
+FILL_RETRY_INTERVAL = 5
+
+
+def encode_entry(text, image):
+    """池中的一张验证码：1字节的文本长度 + 文本 + 图片"""
+    text = text.encode()
+    return bytes([len(text)]) + text + image
+
+
+def decode_entry(entry):
+    """:return: (验证码文本, 图片字节)"""
+    length = entry[0]
+    return entry[1:length + 1].decode(), entry[length + 1:]
+
+
+class CaptchaPool(object):
+    """验证码池的公共逻辑：取出验证码、校验答案、后台补充"""
+
+    def __init__(self, options):
+        self.pool_size = options['POOL_SIZE']
+        self.refresh_interval = options['REFRESH_INTERVAL']
+        self.refresh_batch = options['REFRESH_BATCH']
+        self.fill_timeout = options['FILL_TIMEOUT']
+        self.max_workers = options['MAX_WORKERS']
+        self.batch_size = options['BATCH_SIZE']
+        self.start_method = options['START_METHOD']
+        self.ttl = options['TTL']
+        self.render_options = {
+            'length': options['LENGTH'],
+            'width': options['WIDTH'],
+            'height': options['HEIGHT'],
+            'font': options['FONT'],
+            'image_format': options['FORMAT'],
+        }
+        self.content_type = 'image/%s' % options['FORMAT'].lower()
+        self._filling = False
+        self._fill_lock = threading.Lock()
+        self._next_refresh = 0
+        self._next_fill = 0
+        self._next_warning = 0
+
+    # 存储相关的操作，由子类实现
+    def take(self, uuid):
+        """
+        轮换取出一张验证码，并以 uuid 保存答案
+        :return: ((验证码文本, 图片字节) 或 None, 池中的张数)
+        """
+        raise NotImplementedError
+
+    def save_answer(self, uuid, text):
+        raise NotImplementedError
+
+    def pop_answer(self, uuid):
+        """原子地读取并删除答案，:return: 答案，不存在或已过期时返回 None"""
+        raise NotImplementedError
+
+    def push(self, captchas):
+        """把新的验证码放入池中，超过 POOL_SIZE 时丢弃最旧的"""
+        raise NotImplementedError
+
+    def acquire_refresh(self):
+        """是否由当前进程替换这一批验证码"""
+        return True
+
+    def acquire_fill(self):
+        """是否由当前进程补满验证码池，补满后调用 release_fill()"""
+        return True
+
+    def release_fill(self):
+        pass
+
+    def get(self, uuid):
+        """
+        为 uuid 生成一张验证码
+        :return: 图片字节
+        """
+        captcha, size = self.take(uuid)
+        if captcha is None:
+            # 池为空：同步绘制一张，并在后台补满
+            if time.monotonic() >= self._next_warning:
+                self._next_warning = time.monotonic() + 60
+                logger.warning('图形验证码池为空，在请求中绘制验证码')
+            captcha = render_captcha(**self.render_options)
+            self.save_answer(uuid, captcha[0])
+        self.maybe_refill(size)
+        return captcha[1]
+
+    def check(self, uuid, text):
+        """
+        校验用户输入的验证码，答案无论是否正确都会被删除
+        :return: 正确返回 True，错误返回 False，不存在或已过期返回 None
+        """
+        answer = self.pop_answer(uuid)
+        if answer is None:
+            return None
+        # compare_digest 只接受 ASCII 字符串，比较编码后的字节，非 ASCII 的输入按错误处理
+        return hmac.compare_digest(answer.upper().encode(), (text or '').strip().upper().encode())
+
+    def maybe_refill(self, size):
+        """池没有填满时补满；每 REFRESH_INTERVAL 秒替换一批"""
+        now = time.monotonic()
+        if self._filling:
+            return
+        filling_up = size < self.pool_size
+        if now < (self._next_fill if filling_up else self._next_refresh):
+            return
+        with self._fill_lock:
+            if self._filling:
+                return
+            if filling_up:
+                # 没有拿到锁时说明其他进程正在补满，过一会儿再检查
+                self._next_fill = now + FILL_RETRY_INTERVAL
+                if not self.acquire_fill():
+                    return
+                count = self.pool_size - size
+            else:
+                self._next_refresh = now + self.refresh_interval
+                if not self.acquire_refresh():
+                    return
+                count = self.refresh_batch
+            self._filling = True
+        threading.Thread(target=self._refill, args=(count, filling_up), name='captcha-refill', daemon=True).start()
+
+    def _refill(self, count, filling_up=False):
+        try:
+            self.fill(count)
+        except Exception as e:
+            logger.error('补充图形验证码池失败：%s' % e)
+        finally:
+            if filling_up:
+                # 刚补满的池不需要马上替换
+                self._next_refresh = time.monotonic() + self.refresh_interval
+                try:
+                    self.release_fill()
+                except Exception as e:
+                    logger.error('释放图形验证码池的锁失败：%s' % e)
+            self._filling = False
+
+    def fill(self, count):
+        """
+        绘制 count 张验证码放入池中，阻塞直到完成
+        :return: 放入的张数
+        """
+        batches = [self.batch_size] * (count // self.batch_size)
+        if count % self.batch_size:
+            batches.append(count % self.batch_size)
+        if self.max_workers <= 0:
+            results = [render_batch(batch, self.render_options) for batch in batches]
+            for captchas in results:
+                self.push(captchas)
+            return count
+        # 每次补充时创建进程池，补充完成后退出，不常驻占用内存
+        mp_context = multiprocessing.get_context(self.start_method)
+        with ProcessPoolExecutor(min(self.max_workers, len(batches)), mp_context=mp_context) as executor:
+            for captchas in executor.map(render_batch, batches, [self.render_options] * len(batches)):
+                self.push(captchas)
+        return count
+
+
+class LocalCaptchaPool(CaptchaPool):
+    """进程内的验证码池，答案也保存在进程内，只适合单进程部署和测试"""
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._pool = deque(maxlen=self.pool_size)
+        self._answers = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def take(self, uuid):
+        with self._lock:
+            if not self._pool:
+                return None, 0
+            captcha = self._pool.pop()
+            self._pool.appendleft(captcha)
+            self._set_answer(uuid, captcha[0])
+            return captcha, len(self._pool)
+
+    def _set_answer(self, uuid, text):
+        now = time.monotonic()
+        if now >= self._next_purge:
+            # 定期清理过期的答案
+            self._answers = {key: value for key, value in self._answers.items() if value[1] > now}
+            self._next_purge = now + self.ttl
+        self._answers[uuid] = (text, now + self.ttl)
+
+    def save_answer(self, uuid, text):
+        with self._lock:
+            self._set_answer(uuid, text)
+
+    def pop_answer(self, uuid):
+        with self._lock:
+            answer = self._answers.pop(uuid, None)
+        if answer is None or answer[1] <= time.monotonic():
+            return None
+        return answer[0]
+
+    def push(self, captchas):
+        with self._lock:
+            self._pool.extendleft(captchas)
+
+
+class RedisCaptchaPool(CaptchaPool):
+    """
+    Redis 中的验证码池（列表）和答案，所有进程共享
+    补满和替换一批验证码都用 Redis 锁协调：补满时持有 fill 锁直到完成（最长 FILL_TIMEOUT 秒），
+    替换时 refresh 键在 REFRESH_INTERVAL 秒内只能设置一次
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.cache_alias = options['CACHE_ALIAS']
+        self.pool_key = '%s:pool' % options['KEY_PREFIX']
+        self.answer_prefix = '%s:answer:' % options['KEY_PREFIX']
+        self.refresh_key = '%s:refresh' % options['KEY_PREFIX']
+        self.fill_key = '%s:fill' % options['KEY_PREFIX']
+        self._script = None
+        self._fill_token = None
+
+    def get_redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.cache_alias)
+
+    def take(self, uuid):
+        if self._script is None:
+            self._script = self.get_redis().register_script(TAKE_SCRIPT)
+        entry, size = self._script(keys=[self.pool_key, self.answer_prefix + uuid], args=[self.ttl])
+        return (decode_entry(entry) if entry else None), size
+
+    def save_answer(self, uuid, text):
+        self.get_redis().set(self.answer_prefix + uuid, text, ex=self.ttl)
+
+    def pop_answer(self, uuid):
+        # GET 和 DEL 在一个事务中执行，相当于 Redis 6.2 的 GETDEL
+        pl = self.get_redis().pipeline(transaction=True)
+        pl.get(self.answer_prefix + uuid)
+        pl.delete(self.answer_prefix + uuid)
+        answer, _ = pl.execute()
+        return answer.decode() if answer is not None else None
+
+    def push(self, captchas):
+        pl = self.get_redis().pipeline(transaction=False)
+        pl.lpush(self.pool_key, *[encode_entry(text, image) for text, image in captchas])
+        pl.ltrim(self.pool_key, 0, self.pool_size - 1)
+        pl.execute()
+
+    def acquire_refresh(self):
+        return bool(self.get_redis().set(self.refresh_key, 1, nx=True, ex=max(1, int(self.refresh_interval))))
+
+    def acquire_fill(self):
+        token = secrets.token_hex(16)
+        if self.get_redis().set(self.fill_key, token, nx=True, ex=max(1, int(self.fill_timeout))):
+            self._fill_token = token
+            return True
+        return False
+
+    def release_fill(self):
+        if self._fill_token is not None:
+            self.get_redis().eval(RELEASE_SCRIPT, 1, self.fill_key, self._fill_token)
+            self._fill_token = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_captcha_pool():
+    """
+    获取按配置创建的验证码池（进程内单例）
+    :return: CaptchaPool
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = dict(DEFAULTS, **getattr(settings, 'IMAGE_CAPTCHA', {}))
+                _pool = import_string(options['BACKEND'])(options)
+    return _pool
+
+
+def check_image_code(uuid, text):
+    """
+    校验图形验证码，见 CaptchaPool.check
+    :return: True/False/None（已过期）
+    """
+    return get_captcha_pool().check(uuid, text)
@@ -0,0 +1,23 @@
+'''
+预先填充图形验证码池：python manage.py fill_captcha_pool
+部署或清空Redis之后执行，避免第一批请求在池为空时同步绘制验证码，配置见 settings.IMAGE_CAPTCHA
+'''
+import time
+
+from django.core.management.base import BaseCommand
+
+from verifications.image_codes import get_captcha_pool
+
+
+class Command(BaseCommand):
+    help = '用进程池绘制图形验证码，放入验证码池'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--count', type=int, default=None, help='绘制的张数，默认为 POOL_SIZE')
+
+    def handle(self, *args, **options):
+        pool = get_captcha_pool()
+        count = options['count'] or pool.pool_size
+        started = time.perf_counter()
+        pool.fill(count)
+        self.stdout.write(self.style.SUCCESS('已绘制%d张图形验证码，耗时%.1fs' % (count, time.perf_counter() - started)))
@@ -0,0 +1,386 @@
+'''
+短信验证码
+
+请求 /sms_codes/<mobile>/ 时不调用短信服务商（服务商的接口耗时几百毫秒到几秒），而是：
+(1) 一个 Lua 脚本（一次Redis往返）同时设置发送频率标记（SEND_INTERVAL 秒内同一手机号只能发送一次）和验证码，
+    标记已存在时什么也不写，返回还需要等待的秒数；
+(2) 把短信放入进程内的有界队列后立即返回，WORKERS 个发送线程从队列中取出短信，
+    每次最多凑齐 BATCH_SIZE 条（最多等待 BATCH_WAIT 秒）调用一次服务商接口；
+(3) 发送失败的短信按 RETRY_DELAY * 2^n 秒退避后重试，最多 MAX_RETRIES 次，验证码已过期的不再重试；
+(4) 队列已满时清除发送标记，视图返回 RETCODE.THROTTLINGERR，用户可以立即重试。
+进程退出时最多等待 SHUTDOWN_TIMEOUT 秒发送完队列中的短信。
+
+校验时验证码正确则删除，错误次数达到 MAX_ATTEMPTS 时也删除，需要重新获取，见 SMSCodeService.check()。
+校验之后还可能失败的业务（如注册时密码哈希繁忙、用户名已存在）用 check(consume=False) 只校验不删除，
+业务完成后再调用 consume() 删除，失败时用户不必等待 SEND_INTERVAL 重新获取验证码。
+
+配置项 SMS_CODES：
+    PROVIDER:         短信服务商的类路径，见 verifications.sms_providers
+    PROVIDER_OPTIONS: 传给服务商构造函数的关键字参数
+    CACHE_ALIAS:      保存验证码的 django_redis 缓存别名
+    KEY_PREFIX:       Redis 键的前缀
+    CODE_LENGTH:      验证码的位数
+    TTL:              验证码的有效期（秒）
+    SEND_INTERVAL:    同一手机号两次发送的最小间隔（秒）
+    MAX_ATTEMPTS:     每个验证码允许输错的次数
+    WORKERS:          发送线程数
+    QUEUE_SIZE:       队列中最多等待发送的短信数
+    BATCH_SIZE:       每次调用服务商接口最多发送的条数
+    BATCH_WAIT:       凑齐一批时最多等待的时间（秒）
+    MAX_RETRIES:      发送失败后的最大重试次数
+    RETRY_DELAY:      第一次重试前等待的时间（秒），之后每次加倍
+    SHUTDOWN_TIMEOUT: 进程退出时等待队列发送完的最长时间（秒）
+'''
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .sms_providers import SMSMessage, mask_mobile
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'PROVIDER': 'verifications.sms_providers.LoggingProvider',
+    'PROVIDER_OPTIONS': {},
+    'CACHE_ALIAS': 'default',
+    'KEY_PREFIX': 'sms',
+    'CODE_LENGTH': 6,
+    'TTL': 300,
+    'SEND_INTERVAL': 60,
+    'MAX_ATTEMPTS': 5,
+    'WORKERS': 2,
+    'QUEUE_SIZE': 1000,
+    'BATCH_SIZE': 50,
+    'BATCH_WAIT': 0.05,
+    'MAX_RETRIES': 3,
+    'RETRY_DELAY': 1,
+    'SHUTDOWN_TIMEOUT': 5,
+}
+
+# KEYS[1]: 发送标记，KEYS[2]: 验证码，KEYS[3]: 输错次数；ARGV: 验证码、有效期（秒）、发送间隔（秒）
+# 返回 0 表示已保存，否则为还需要等待的秒数
+SAVE_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[3]) then
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+    redis.call('DEL', KEYS[3])
+    return 0
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl < 1 then
+    return 1
+end
+return ttl
+"""
+
+# KEYS[1]: 验证码，KEYS[2]: 输错次数；ARGV: 用户输入的验证码、允许输错的次数、有效期（秒）、正确时是否删除（1/0）
+# 返回 1 正确，0 错误，-1 不存在或已过期
+CHECK_SCRIPT = """
+local code = redis.call('GET', KEYS[1])
+if not code then
+    return -1
+end
+if code == ARGV[1] then
+    if ARGV[4] == '1' then
+        redis.call('DEL', KEYS[1], KEYS[2])
+    end
+    return 1
+end
+if redis.call('INCR', KEYS[2]) >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+else
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+return 0
+"""
+
+# KEYS[1]: 验证码，KEYS[2]: 输错次数；ARGV[1]: 已校验过的验证码
+# 验证码未被替换时删除，返回是否删除
+CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+return 0
+"""
+
+
+class SMSBusy(Exception):
+    """发送队列已满，请求应当被拒绝"""
+    pass
+
+
+class SMSDispatcher(object):
+    """进程内的短信发送队列和发送线程"""
+
+    def __init__(self, provider, options):
+        self.provider = provider
+        self.workers = max(1, options['WORKERS'])
+        self.batch_size = max(1, min(options['BATCH_SIZE'], provider.max_batch_size))
+        self.batch_wait = options['BATCH_WAIT']
+        self.max_retries = options['MAX_RETRIES']
+        self.retry_delay = options['RETRY_DELAY']
+        self.shutdown_timeout = options['SHUTDOWN_TIMEOUT']
+        self.queue_size = options['QUEUE_SIZE']
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._pid = None
+        atexit.register(self.shutdown)
+
+    def _start(self):
+        """第一次发送时启动发送线程；fork 出的子进程中没有父进程的线程，重新创建队列和线程"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.queue_size)
+            # 等待重试的短信：[(重试时间, 序号, SMSMessage), ...]
+            self._retries = []
+            # 已从 _retries 中取出、正在重试的短信数
+            self._retrying = 0
+            self._sequence = itertools.count()
+            self._stopping = threading.Event()
+            self._threads = [
+                threading.Thread(target=self._run, name='sms-dispatch-%d' % i, daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, mobile, code, ttl):
+        """
+        把一条短信放入队列，立即返回
+        :raise SMSBusy: 队列已满
+        """
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(SMSMessage(mobile, code, ttl, 0, time.monotonic() + ttl))
+        except queue.Full:
+            self._count('rejected')
+            raise SMSBusy()
+        self._count('queued')
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _due_retries(self):
+        """
+        :return: (到期需要重试的短信, 距下一条到期的秒数)
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._retries)[2])
+            self._retrying += len(due)
+            wait = self._retries[0][0] - now if self._retries else None
+        return due, wait
+
+    def _run(self):
+        while True:
+            batch, wait = self._due_retries()
+            if not batch:
+                if self._stopping.is_set() and self._queue.empty():
+                    return
+                try:
+                    batch.append(self._queue.get(timeout=min(0.5, wait) if wait is not None else 0.5))
+                except queue.Empty:
+                    continue
+                self._collect(batch)
+                taken = len(batch)
+            else:
+                taken = 0
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+                if len(batch) > taken:
+                    with self._lock:
+                        self._retrying -= len(batch) - taken
+
+    def _collect(self, batch):
+        """在 BATCH_WAIT 秒内继续从队列中取短信，凑成一批"""
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+    def _deliver(self, batch):
+        try:
+            failed = self.provider.send_batch(batch)
+        except Exception as e:
+            logger.warning('调用短信服务商失败：%s' % e)
+            failed = batch
+        self._count('sent', len(batch) - len(failed))
+        if not failed:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for message in failed:
+                delay = self.retry_delay * 2 ** message.attempts
+                if message.attempts >= self.max_retries or now + delay >= message.expires:
+                    self.stats['failed'] += 1
+                    logger.error('短信发送失败，不再重试：%s，已尝试%d次' % (mask_mobile(message.mobile), message.attempts + 1))
+                    continue
+                self.stats['retried'] += 1
+                heapq.heappush(self._retries, (now + delay, next(self._sequence), message._replace(attempts=message.attempts + 1)))
+
+    def pending(self):
+        """:return: 队列中、正在发送和等待重试的短信数"""
+        if self._pid != os.getpid():
+            return 0
+        with self._lock:
+            return self._queue.unfinished_tasks + len(self._retries) + self._retrying
+
+    def flush(self, timeout=None):
+        """
+        等待已放入队列的短信发送完（包括重试）
+        :return: 是否全部完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout=None):
+        """停止发送线程，最多等待 timeout 秒（默认 SHUTDOWN_TIMEOUT）发送完队列中的短信"""
+        if self._pid != os.getpid():
+            return
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        left = self.pending()
+        if left:
+            logger.warning('进程退出时还有%d条短信没有发送' % left)
+        self._pid = None
+
+
+class SMSCodeService(object):
+    """保存、校验短信验证码，发送交给 SMSDispatcher"""
+
+    def __init__(self, options):
+        self.cache_alias = options['CACHE_ALIAS']
+        self.key_prefix = options['KEY_PREFIX']
+        self.code_length = options['CODE_LENGTH']
+        self.ttl = options['TTL']
+        self.send_interval = options['SEND_INTERVAL']
+        self.max_attempts = options['MAX_ATTEMPTS']
+        self.provider = import_string(options['PROVIDER'])(**options['PROVIDER_OPTIONS'])
+        self.dispatcher = SMSDispatcher(self.provider, options)
+        self._scripts = None
+
+    def get_redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.cache_alias)
+
+    def get_scripts(self):
+        if self._scripts is None:
+            redis = self.get_redis()
+            self._scripts = tuple(redis.register_script(script) for script in (SAVE_SCRIPT, CHECK_SCRIPT, CONSUME_SCRIPT))
+        return self._scripts
+
+    def keys(self, mobile):
+        """:return: (发送标记, 验证码, 输错次数) 的键"""
+        return tuple('%s:%s:%s' % (self.key_prefix, name, mobile) for name in ('flag', 'code', 'attempts'))
+
+    def generate_code(self):
+        return '%0*d' % (self.code_length, secrets.randbelow(10 ** self.code_length))
+
+    def send(self, mobile):
+        """
+        生成并保存验证码，放入发送队列
+        :param mobile: 手机号
+        :return: 0 表示已放入队列，否则为距离下次可以发送的秒数
+        :raise SMSBusy: 发送队列已满
+        """
+        code = self.generate_code()
+        flag_key, code_key, attempts_key = self.keys(mobile)
+        retry_after = self.get_scripts()[0](keys=[flag_key, code_key, attempts_key],
+                                            args=[code, self.ttl, self.send_interval])
+        if retry_after:
+            return int(retry_after)
+        try:
+            self.dispatcher.enqueue(mobile, code, self.ttl)
+        except SMSBusy:
+            # 没有发出去的验证码不占用发送间隔，用户可以立即重试
+            self.get_redis().delete(flag_key)
+            raise
+        return 0
+
+    def check(self, mobile, code, consume=True):
+        """
+        校验用户输入的短信验证码，输错 MAX_ATTEMPTS 次后删除
+        :param consume: 正确时是否删除；为 False 时业务完成后需要调用 consume()
+        :return: 正确返回 True，错误返回 False，不存在或已过期返回 None
+        """
+        _, code_key, attempts_key = self.keys(mobile)
+        result = self.get_scripts()[1](keys=[code_key, attempts_key],
+                                       args=[(code or '').strip(), self.max_attempts, self.ttl, int(consume)])
+        return None if result < 0 else bool(result)
+
+    def consume(self, mobile, code):
+        """
+        删除已经用 check(consume=False) 校验过的验证码，期间重新发送过的新验证码不受影响
+        :return: 是否删除
+        """
+        _, code_key, attempts_key = self.keys(mobile)
+        return bool(self.get_scripts()[2](keys=[code_key, attempts_key], args=[(code or '').strip()]))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_sms_service():
+    """
+    获取按配置创建的短信验证码服务（进程内单例）
+    :return: SMSCodeService
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SMSCodeService(dict(DEFAULTS, **getattr(settings, 'SMS_CODES', {})))
+    return _service
+
+
+def check_sms_code(mobile, code, consume=True):
+    """
+    校验短信验证码，见 SMSCodeService.check
+    :return: True/False/None（已过期）
+    """
+    return get_sms_service().check(mobile, code, consume)
+
+
+def consume_sms_code(mobile, code):
+    """
+    删除校验过的短信验证码，见 SMSCodeService.consume
+    :return: 是否删除
+    """
+    return get_sms_service().consume(mobile, code)
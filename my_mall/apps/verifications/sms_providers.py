@@ -0,0 +1,110 @@
+'''
+短信服务商
+
+接入新的服务商时继承 SMSProvider，实现 send()，服务商有批量接口时再实现 send_batch()，
+然后在 settings.SMS_CODES['PROVIDER'] 中配置类路径，PROVIDER_OPTIONS 作为关键字参数传给构造函数。
+send()/send_batch() 在 verifications.sms_codes 的发送线程中调用，不会阻塞请求。
+'''
+import logging
+import random
+import threading
+import time
+from collections import deque, namedtuple
+
+logger = logging.getLogger('django')
+
+# 一条待发送的短信；attempts 为已经失败的次数，expires 为验证码过期的时间（time.monotonic()）
+SMSMessage = namedtuple('SMSMessage', ['mobile', 'code', 'ttl', 'attempts', 'expires'])
+
+
+def mask_mobile(mobile):
+    """日志中只记录手机号的前3位和后4位"""
+    return mobile[:3] + '****' + mobile[-4:]
+
+
+class SMSProvider(object):
+    """短信服务商接口"""
+    # 服务商批量接口一次最多发送的条数
+    max_batch_size = 100
+
+    def __init__(self, **options):
+        self.options = options
+
+    def send(self, mobile, code, ttl):
+        """
+        发送一条验证码短信，失败时抛出异常
+        :param mobile: 手机号
+        :param code: 验证码
+        :param ttl: 验证码的有效期（秒），用于短信内容中的“N分钟内有效”
+        """
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        """
+        发送一批短信，默认逐条调用 send()
+        :param messages: [SMSMessage, ...]
+        :return: 发送失败的短信列表
+        """
+        failed = []
+        for message in messages:
+            try:
+                self.send(message.mobile, message.code, message.ttl)
+            except Exception as e:
+                logger.warning('短信发送失败：%s，%s' % (mask_mobile(message.mobile), e))
+                failed.append(message)
+        return failed
+
+
+class LoggingProvider(SMSProvider):
+    """只把验证码写入日志，开发环境使用"""
+
+    def send(self, mobile, code, ttl):
+        logger.info('短信验证码：%s -> %s，%d分钟内有效' % (mobile, code, ttl // 60))
+
+
+class FakeProvider(SMSProvider):
+    """
+    测试和压测用的服务商：不发送短信，记录在 outbox 中
+    :param latency: 每次调用服务商接口的耗时（秒）
+    :param failure_rate: 每条短信发送失败的概率
+    :param batch: 是否模拟批量接口（一次调用发送一批）
+    """
+
+    def __init__(self, latency=0, failure_rate=0, batch=True, **options):
+        super().__init__(**options)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.batch = batch
+        self.outbox = deque(maxlen=10000)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _deliver(self, message):
+        if self.failure_rate and random.random() < self.failure_rate:
+            return False
+        self.outbox.append((message.mobile, message.code))
+        return True
+
+    def send(self, mobile, code, ttl):
+        self._call()
+        if not self._deliver(SMSMessage(mobile, code, ttl, 0, None)):
+            raise IOError('模拟的发送失败')
+
+    def send_batch(self, messages):
+        if not self.batch:
+            return super().send_batch(messages)
+        self._call()
+        return [message for message in messages if not self._deliver(message)]
+
+    def last_code(self, mobile):
+        """:return: 最近一次发给 mobile 的验证码，没有时返回 None"""
+        for sent_mobile, code in reversed(self.outbox):
+            if sent_mobile == mobile:
+                return code
+        return None
@@ -0,0 +1,126 @@
+'''
+短信验证码的测试
+验证码保存在 settings.SMS_CODES['CACHE_ALIAS'] 对应的 Redis 中，测试使用单独的键前缀，结束后删除；
+短信服务商换成 FakeProvider，不发送短信
+'''
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from .sms_codes import DEFAULTS, SMSCodeService, SMSDispatcher
+from .sms_providers import FakeProvider
+
+MOBILE = '13800138000'
+
+
+def make_options(**overrides):
+    options = dict(DEFAULTS, **getattr(settings, 'SMS_CODES', {}))
+    options.update(PROVIDER='verifications.sms_providers.FakeProvider', PROVIDER_OPTIONS={},
+                   KEY_PREFIX='test:sms', BATCH_WAIT=0)
+    options.update(overrides)
+    return options
+
+
+class SMSCodeServiceTest(SimpleTestCase):
+    """保存、发送、校验短信验证码"""
+
+    def make_service(self, **overrides):
+        service = SMSCodeService(make_options(**overrides))
+        self.addCleanup(service.dispatcher.shutdown, 1)
+        self.addCleanup(service.get_redis().delete, *service.keys(MOBILE))
+        return service
+
+    def stored_code(self, service):
+        code = service.get_redis().get(service.keys(MOBILE)[1])
+        return code.decode() if code is not None else None
+
+    def test_send_delivers_to_provider(self):
+        service = self.make_service()
+        self.assertEqual(service.send(MOBILE), 0)
+        self.assertTrue(service.dispatcher.flush(5))
+        code = self.stored_code(service)
+        self.assertEqual(len(code), service.code_length)
+        self.assertEqual(list(service.provider.outbox), [(MOBILE, code)])
+
+    def test_wrong_code_keeps_stored_code(self):
+        service = self.make_service()
+        service.send(MOBILE)
+        code = self.stored_code(service)
+        wrong = '%06d' % ((int(code) + 1) % 10 ** 6)
+        self.assertIs(service.check(MOBILE, wrong), False)
+        self.assertEqual(self.stored_code(service), code)
+        # 正确的验证码只能使用一次
+        self.assertIs(service.check(MOBILE, code), True)
+        self.assertIsNone(service.check(MOBILE, code))
+
+    def test_max_attempts_deletes_code(self):
+        service = self.make_service(MAX_ATTEMPTS=2)
+        service.send(MOBILE)
+        code = self.stored_code(service)
+        wrong = '%06d' % ((int(code) + 1) % 10 ** 6)
+        service.check(MOBILE, wrong)
+        service.check(MOBILE, wrong)
+        self.assertIsNone(service.check(MOBILE, code))
+
+    def test_check_without_consume(self):
+        service = self.make_service()
+        service.send(MOBILE)
+        code = self.stored_code(service)
+        self.assertIs(service.check(MOBILE, code, consume=False), True)
+        self.assertIs(service.check(MOBILE, code, consume=False), True)
+        self.assertTrue(service.consume(MOBILE, code))
+        self.assertIsNone(service.check(MOBILE, code))
+        self.assertFalse(service.consume(MOBILE, code))
+
+    def test_expiry_and_send_interval(self):
+        service = self.make_service(TTL=1, SEND_INTERVAL=1)
+        self.assertEqual(service.send(MOBILE), 0)
+        code = self.stored_code(service)
+        # 发送间隔内不再生成新的验证码
+        self.assertGreater(service.send(MOBILE), 0)
+        self.assertEqual(self.stored_code(service), code)
+        time.sleep(1.5)
+        self.assertIsNone(service.check(MOBILE, code))
+        self.assertEqual(service.send(MOBILE), 0)
+
+
+class SMSDispatcherTest(SimpleTestCase):
+    """发送队列的批量发送与重试，不需要 Redis"""
+
+    def make_dispatcher(self, provider, **overrides):
+        dispatcher = SMSDispatcher(provider, make_options(**overrides))
+        self.addCleanup(dispatcher.shutdown, 1)
+        return dispatcher
+
+    def test_batches_messages(self):
+        provider = FakeProvider(latency=0.05)
+        dispatcher = self.make_dispatcher(provider, WORKERS=1, BATCH_SIZE=10, BATCH_WAIT=0.2)
+        for i in range(10):
+            dispatcher.enqueue('1380013%04d' % i, '%06d' % i, 60)
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(len(provider.outbox), 10)
+        self.assertLess(provider.calls, 10)
+
+    def test_retries_failed_messages(self):
+        provider = FakeProvider(failure_rate=1)
+        dispatcher = self.make_dispatcher(provider, RETRY_DELAY=0.05, MAX_RETRIES=3)
+        dispatcher.enqueue(MOBILE, '123456', 60)
+        deadline = time.monotonic() + 5
+        while not dispatcher.stats['retried'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # 服务商恢复后，等待重试的短信被发送
+        provider.failure_rate = 0
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(list(provider.outbox), [(MOBILE, '123456')])
+        self.assertGreaterEqual(dispatcher.stats['retried'], 1)
+        self.assertEqual(dispatcher.stats['failed'], 0)
+
+    def test_gives_up_after_max_retries(self):
+        provider = FakeProvider(failure_rate=1)
+        dispatcher = self.make_dispatcher(provider, RETRY_DELAY=0.01, MAX_RETRIES=2)
+        dispatcher.enqueue(MOBILE, '123456', 60)
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(provider.calls, 3)
+        self.assertEqual(dispatcher.stats['failed'], 1)
+        self.assertFalse(provider.outbox)
@@ -0,0 +1,15 @@
+'''
+新建verifications子路由
+'''
+from django.conf.urls import url
+from my_mall.utils.lazy_urls import lazy_view
+from users.validators import MOBILE_PATTERN
+from .validators import UUID_PATTERN
+
+app_name = 'verifications'
+urlpatterns = [
+    # 图形验证码: '/image_codes/<uuid>/'
+    url(r'^image_codes/(?P<uuid>%s)/$' % UUID_PATTERN, lazy_view('verifications.views.ImageCodeView'), name='image_codes'),
+    # 短信验证码: '/sms_codes/<mobile>/?image_code=...&uuid=...'
+    url(r'^sms_codes/(?P<mobile>%s)/$' % MOBILE_PATTERN, lazy_view('verifications.views.SMSCodeView'), name='sms_codes'),
+]
@@ -0,0 +1,16 @@
+'''
+验证码相关参数的格式与校验规则
+'''
+from my_mall.utils.response_code import RETCODE
+from my_mall.utils.validation import Field, Schema
+
+# 前端 generateUUID() 生成的编号，不含 ^ 和 $，路由中可以直接拼接
+UUID_PATTERN = r'[\w-]{1,64}'
+# 短信验证码，位数与 settings.SMS_CODES['CODE_LENGTH'] 一致
+SMS_CODE_PATTERN = r'[0-9]{6}'
+
+
+class SMSCodeSchema(Schema):
+    """获取短信验证码：先校验图形验证码"""
+    image_code = Field(r'[A-Za-z0-9]{1,8}', code=RETCODE.IMAGECODEERR, message='请填写图形验证码')
+    uuid = Field(UUID_PATTERN, code=RETCODE.IMAGECODEERR, message='图形验证码已失效')
@@ -0,0 +1,80 @@
+import logging
+
+from django import http
+from django.views import View
+
+from my_mall.utils.response_code import RETCODE
+from my_mall.utils.responses import throttled_response
+from my_mall.utils.throttling import ThrottleMixin
+from my_mall.utils.validation import validation_error_response
+from verifications.image_codes import check_image_code, get_captcha_pool
+from verifications.sms_codes import SMSBusy, get_sms_service
+from verifications.validators import SMSCodeSchema
+
+# Create your views here.
+
+
+logger = logging.getLogger('django')
+
+
+class ImageCodeView(ThrottleMixin, View):
+    """图形验证码"""
+    throttle_scope = 'image_code'
+    throttle_methods = ('GET',)
+
+    def get(self, request, uuid):
+        """
+        从验证码池中取出一张图片，答案以 uuid 保存，见 verifications.image_codes
+        :param request: 请求对象
+        :param uuid: 前端生成的唯一编号，提交时与用户输入的验证码一起发给后端校验
+        :return: 图片
+        """
+        pool = get_captcha_pool()
+        try:
+            image = pool.get(uuid)
+        except Exception as e:
+            logger.error('生成图形验证码失败：%s' % e)
+            return http.JsonResponse({'code': RETCODE.DBERR, 'errmsg': '生成图形验证码失败'}, status=503)
+        response = http.HttpResponse(image, content_type=pool.content_type)
+        # 每次请求都是新的验证码，不能被浏览器或代理缓存
+        response['Cache-Control'] = 'no-store, no-cache, max-age=0'
+        return response
+
+
+class SMSCodeView(ThrottleMixin, View):
+    """短信验证码"""
+    throttle_scope = 'sms_code'
+    throttle_methods = ('GET',)
+
+    def get(self, request, mobile):
+        """
+        校验图形验证码，保存短信验证码并放入发送队列，不等待短信服务商，见 verifications.sms_codes
+        :param request: 请求对象，查询参数 image_code、uuid
+        :param mobile: 手机号
+        :return: JSON
+        """
+        data, errors = SMSCodeSchema.validate(request.GET)
+        if errors:
+            return validation_error_response(errors)
+
+        # 图形验证码只能校验一次，无论对错前端都需要换一张
+        try:
+            result = check_image_code(data['uuid'], data['image_code'])
+        except Exception as e:
+            logger.error('校验图形验证码失败：%s' % e)
+            return http.JsonResponse({'code': RETCODE.DBERR, 'errmsg': '发送短信失败'}, status=503)
+        if not result:
+            errmsg = '图形验证码已失效' if result is None else '输入图形验证码有误'
+            return http.JsonResponse({'code': RETCODE.IMAGECODEERR, 'errmsg': errmsg}, status=400)
+
+        try:
+            retry_after = get_sms_service().send(mobile)
+        except SMSBusy:
+            return throttled_response()
+        except Exception as e:
+            logger.error('保存短信验证码失败：%s' % e)
+            return http.JsonResponse({'code': RETCODE.DBERR, 'errmsg': '发送短信失败'}, status=503)
+        if retry_after:
+            # 同一手机号 SEND_INTERVAL 秒内只能发送一次
+            return throttled_response(retry_after)
+        return http.JsonResponse({'code': RETCODE.OK, 'errmsg': '发送短信成功'})
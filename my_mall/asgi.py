@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_mall.settings')
+# 部署时默认使用生产环境配置，配置项从环境变量读取，见 my_mall.settings.prod
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_mall.settings.prod')
+# 在ASGI服务器下运行时使用异步视图，见 settings.ASYNC_VIEWS
+os.environ.setdefault('MALL_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -49,9 +49,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig', # 也可以只写包名 'users'
     # 注册首页广告模块
     'contents',
+    # 注册验证码模块
+    'verifications',
 ]
 
 MIDDLEWARE = [
+    'my_mall.utils.middleware.PerformanceMiddleware', # 请求性能统计，放在第一位
+    'my_mall.utils.db_router.ReplicaPinningMiddleware', # 读己之写：写过主库之后一段时间内只读主库
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +98,9 @@ TEMPLATES = [
     },
 ]
 
+# Jinja2模板字节码缓存目录，可通过 python manage.py precompile_templates 预先编译
+JINJA2_BYTECODE_CACHE_DIR = os.path.join(os.path.dirname(BASE_DIR), 'cache/jinja2')
+
 WSGI_APPLICATION = 'my_mall.wsgi.application'
 
 
@@ -114,30 +121,127 @@ DATABASES = {
         'PORT': 3306, # 数据库端口
         'USER': 'lj', # 数据库用户名
         'PASSWORD': '123456', # 数据库用户密码
-        'NAME': 'mymall' # 数据库名字
+        'NAME': 'mymall', # 数据库名字
+        'CONN_MAX_AGE': 300, # 持久连接，请求之间复用连接的最长时间（秒）
     },
+    # 只读从库，可以配置多个，配置与 default 相同，见 my_mall.utils.db_router
+    # 'replica1': {
+    #     'ENGINE': 'django.db.backends.mysql',
+    #     'HOST': '192.168.228.4',
+    #     'PORT': 3306,
+    #     'USER': 'lj',
+    #     'PASSWORD': '123456',
+    #     'NAME': 'mymall',
+    #     'CONN_MAX_AGE': 300,
+    #     'TEST': {'MIRROR': 'default'}, # 测试时直接使用主库
+    # },
+}
+
+# 主从路由：写操作及读己之写使用主库，查重、按账号查询用户等读操作使用从库
+DATABASE_ROUTERS = ['my_mall.utils.db_router.PrimaryReplicaRouter']
+
+DATABASE_ROUTING = {
+    'PRIMARY': 'default', # 主库别名
+    'REPLICAS': None, # 从库别名，None 表示 DATABASES 中的其他别名
+    'PIN_SECONDS': 5, # 写操作之后该浏览器只读主库的时间（秒），应大于复制延迟
+    'HEALTH_CHECK_INTERVAL': 10, # 持久连接的检查间隔（秒）
+    'REPLICA_RETRY': 30, # 不可用的从库多久之后再次尝试（秒）
 }
 
 
+# Redis连接池，所有缓存别名使用同一套配置，见 my_mall.utils.redis_pool
+REDIS_POOL_KWARGS = {
+    'max_connections': 50, # 每个进程到每个Redis库的最大连接数
+    'timeout': 2, # 连接全部被占用时等待空闲连接的最长时间（秒），超时抛出 ConnectionError
+}
+
 # 配置缓存
 CACHES = {
     "default": { # 默认
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "my_mall.utils.cache_backends.InstrumentedRedisCache", # 统计命中率的django_redis缓存
         "LOCATION": "redis://192.168.228.3:6379/0",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "CONNECTION_POOL_CLASS": "my_mall.utils.redis_pool.InstrumentedBlockingConnectionPool", # 有上限的阻塞连接池
+            "CONNECTION_POOL_KWARGS": REDIS_POOL_KWARGS,
+            "SOCKET_CONNECT_TIMEOUT": 1, # 建立连接的超时时间（秒）
+            "SOCKET_TIMEOUT": 1, # 读写的超时时间（秒）
         }
     },
     "session": { # session
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "my_mall.utils.cache_backends.InstrumentedRedisCache", # 统计命中率的django_redis缓存
         "LOCATION": "redis://192.168.228.3:6379/1",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "CONNECTION_POOL_CLASS": "my_mall.utils.redis_pool.InstrumentedBlockingConnectionPool", # 有上限的阻塞连接池
+            "CONNECTION_POOL_KWARGS": REDIS_POOL_KWARGS,
+            "SOCKET_CONNECT_TIMEOUT": 1, # 建立连接的超时时间（秒）
+            "SOCKET_TIMEOUT": 1, # 读写的超时时间（秒）
+        }
+    },
+    "verify_code": { # 验证码
+        "BACKEND": "my_mall.utils.cache_backends.InstrumentedRedisCache", # 统计命中率的django_redis缓存
+        "LOCATION": "redis://192.168.228.3:6379/2",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "CONNECTION_POOL_CLASS": "my_mall.utils.redis_pool.InstrumentedBlockingConnectionPool", # 有上限的阻塞连接池
+            "CONNECTION_POOL_KWARGS": REDIS_POOL_KWARGS,
+            "SOCKET_CONNECT_TIMEOUT": 1, # 建立连接的超时时间（秒）
+            "SOCKET_TIMEOUT": 1, # 读写的超时时间（秒）
         }
     },
 }
-SESSION_ENGINE = "django.contrib.sessions.backends.cache" # 配置session保存在缓存中
+SESSION_ENGINE = "my_mall.utils.session_backends" # 配置session紧凑地保存在缓存中，见 my_mall.utils.session_backends
 SESSION_CACHE_ALIAS = "session" # 使用别名为'session'的缓存保存session数据
+SESSION_STORE = {
+    'SIGNED_COOKIE': True, # 只含登录状态的session签名后保存在cookie中，不读写Redis
+}
+
+# 请求性能统计，见 my_mall.utils.perf
+PERFORMANCE = {
+    'SAMPLE_RATE': 0.1, # 记录数据库、缓存、模板明细的请求比例
+    'SERVER_TIMING': True, # 为抽样的请求添加 Server-Timing 响应头
+    'SLOW_REQUEST_MS': 500, # 耗时超过该值的请求记录到日志中
+    'DUMP_DIR': os.path.join(os.path.dirname(BASE_DIR), 'logs'), # 按进程写入 perf-<pid>.json
+    'DUMP_INTERVAL': 60, # 写入间隔（秒）
+    'METRICS_TOKEN': None, # 访问 /perf/metrics/ 的令牌（请求头 X-Metrics-Token），None 表示只允许 INTERNAL_IPS 访问
+}
+
+# 允许访问 /perf/metrics/ 的IP
+INTERNAL_IPS = ['127.0.0.1']
+
+# 用户对象缓存，认证后端根据用户id/用户名/手机号查询用户时优先读取，见 users.cache
+USER_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 600, # 用户保存或删除时会主动更新缓存
+}
+
+# 整页缓存：进程内LRU + default缓存，见 my_mall.utils.page_cache
+PAGE_CACHES = {
+    'index': { # 首页
+        'TIMEOUT': 300, # 页面保持新鲜的时间（秒）
+        'STALE_TIMEOUT': 60, # 过期后仍可返回旧页面的时间（秒），期间由一个请求负责重新渲染
+        'LOCAL_TIMEOUT': 5, # 进程内LRU不回查Redis的时间（秒），也是失效后各进程看到新页面的最长延迟
+    },
+}
+
+# 页面静态化，见 my_mall.utils.static_pages；生成的文件由nginx直接返回
+STATIC_PAGES = {
+    'index': { # 首页
+        'PATH': os.path.join(os.path.dirname(BASE_DIR), 'static_pages/index.html'), # 生成的HTML文件
+        'DEBOUNCE': 2, # 首页内容变化后等待的时间（秒），期间的多次变化只生成一次
+        'COMPRESS': True, # 同时生成 index.html.gz
+        'SERVE': True, # nginx 没有找到文件而转发请求时，视图直接返回已生成的文件
+    },
+}
+
+# 用户名/手机号存在性索引（布隆过滤器），用于注册时的重复注册校验，见 users.existence
+USER_EXISTENCE_INDEX = {
+    'BACKEND': 'users.existence.RedisBloomIndex', # 进程内布隆过滤器，并在default缓存中保存一份供所有进程共享
+    'CAPACITY': 1000000, # 预估的用户规模
+    'ERROR_RATE': 0.001, # 误判率，误判时回源数据库查询
+    'REFRESH_INTERVAL': 300, # 进程内索引的重建周期（秒）
+}
 
 
 # 配置日志
@@ -151,6 +255,9 @@ LOGGING = {
         'simple': {
             'format': '---%(levelname)s %(module)s %(lineno)d %(message)s---'
         },
+        'json': {  # 每条日志一行JSON，需要接入日志采集系统时将 file 的 formatter 改为 json
+            '()': 'my_mall.utils.log_handlers.JsonFormatter',
+        },
     },
     'filters': {  # 日志过滤器
         'require_debug_true': {  # django在debug模式下才输出日志
@@ -164,12 +271,14 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple' # 输出为 sample 格式
         },
-        'file': {  # 向文件中输出日志
+        'file': {  # 向文件中输出日志：请求线程只把日志放入队列，由后台线程批量写入文件，见 my_mall.utils.log_handlers
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
+            'class': 'my_mall.utils.log_handlers.QueuedRotatingFileHandler',
             'filename': os.path.join(os.path.dirname(BASE_DIR), 'logs/mall.log'),  # 日志文件的位置，写满一个文件后自动创建下一个文件
-            'maxBytes': 1 * 1024 * 1024, # 每个日志文件的最大容量，1m
+            'maxBytes': 50 * 1024 * 1024, # 每个日志文件的最大容量，50m
             'backupCount': 10, # 最多保存的日志文件的数量
+            'queueSize': 10000, # 日志队列的容量，写满后丢弃新日志，不阻塞请求
+            'batchSize': 500, # 后台线程每批写入的最大条数，每批flush一次
             'formatter': 'verbose' # 输出为 verbose 格式
         },
     },
@@ -192,6 +301,66 @@ LOGGING = {
 # logger.error('测试logging模块error')
 
 
+# 异步视图：ASGI部署时（asgi.py 设置了环境变量 MALL_ASYNC_VIEWS=1）在路由中使用异步版本的视图，见 my_mall.utils.aio
+ASYNC_VIEWS = {
+    'ENABLED': os.environ.get('MALL_ASYNC_VIEWS') == '1',
+    'MAX_WORKERS': 32, # 执行数据库查询、Redis读写等阻塞操作的线程池大小
+}
+
+# 访问频率限制：每个客户端IP在滑动窗口内的最大请求次数，见 my_mall.utils.throttling
+THROTTLING = {
+    'CACHE_ALIAS': 'default',
+    'RATES': {
+        'login': '10/m', # 登录
+        'register': '5/m', # 注册
+        'count': '60/m', # 用户名、手机号重复注册校验
+        'image_code': '30/m', # 图形验证码
+        'sms_code': '10/m', # 短信验证码（同一手机号的发送间隔见 SMS_CODES）
+    },
+}
+
+# 图形验证码：后台进程池预先绘制验证码放入池中，请求时只取出一张，见 verifications.image_codes
+IMAGE_CAPTCHA = {
+    'BACKEND': 'verifications.image_codes.RedisCaptchaPool', # 验证码池和答案保存在Redis中，所有进程共享
+    'CACHE_ALIAS': 'verify_code',
+    'POOL_SIZE': 1000, # 池中的验证码数
+    'REFRESH_INTERVAL': 60, # 每隔多少秒替换一批验证码
+    'REFRESH_BATCH': 100, # 每次替换的张数
+    'FILL_TIMEOUT': 600, # 补满时Redis锁的有效期（秒），应大于一次补满的耗时
+    'MAX_WORKERS': 2, # 绘制验证码的进程数；0表示在后台线程中绘制
+    'TTL': 300, # 答案的有效期（秒）
+}
+
+# 短信验证码：请求中只保存验证码并放入发送队列，由后台线程批量调用短信服务商，见 verifications.sms_codes
+SMS_CODES = {
+    'PROVIDER': 'verifications.sms_providers.LoggingProvider', # 开发环境只把验证码写入日志
+    'PROVIDER_OPTIONS': {}, # 传给服务商的参数（账号、模板编号等）
+    'CACHE_ALIAS': 'verify_code',
+    'TTL': 300, # 验证码的有效期（秒）
+    'SEND_INTERVAL': 60, # 同一手机号两次发送的最小间隔（秒）
+    'WORKERS': 2, # 发送线程数
+    'QUEUE_SIZE': 1000, # 等待发送的短信数上限，超过时返回 RETCODE.THROTTLINGERR
+    'BATCH_SIZE': 50, # 每次调用服务商接口最多发送的条数
+    'MAX_RETRIES': 3, # 发送失败后的重试次数
+}
+
+# 密码哈希服务：登录、注册时在有界进程池中计算密码哈希，见 users.hashing
+PASSWORD_HASHING = {
+    'MAX_WORKERS': 2, # 进程池大小，即密码哈希最多占用的CPU核数；0表示在请求线程中计算
+    'MAX_PENDING': 16, # 最多同时排队+计算的任务数，超过时返回 RETCODE.THROTTLINGERR
+    'TIMEOUT': 5, # 等待单个任务的最长时间（秒）
+    'PBKDF2_ITERATIONS': 216000, # PBKDF2迭代次数，调整后用户下次登录时自动重新计算哈希
+}
+
+# 首选的哈希算法排在第一位，其余用于校验已有的哈希值
+PASSWORD_HASHERS = [
+    'users.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -233,6 +402,24 @@ STATIC_URL = '/static/'
 # 配置静态文件加载路径
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic 的输出目录
+STATIC_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'static_root')
+
+# collectstatic 时压缩、合并静态文件并生成带哈希的文件名，见 my_mall.utils.static_storage
+# DEBUG=False 时模板中的 static() 需要先执行 collectstatic 生成清单
+STATICFILES_STORAGE = 'my_mall.utils.static_storage.CompressedManifestStaticFilesStorage'
+
+STATIC_ASSETS = {
+    'MINIFY': True, # 压缩JS/CSS，需要安装 rjsmin、rcssmin
+    'COMPRESS': ('gzip', 'br'), # 预压缩的格式，br 需要安装 brotli
+    'BUNDLES': { # 合并后的文件: 合并前的文件，模板中使用 static_bundle() 引用
+        'js/vendor.js': ['js/vue-2.5.16.js', 'js/axios-0.18.0.min.js'],
+        'css/base.css': ['css/reset.css', 'css/main.css'],
+    },
+    'SERVE': False, # 没有nginx等前置服务器时，由Django提供 STATIC_ROOT 中的文件
+    'MAX_AGE': 365 * 24 * 3600, # 带哈希的文件的缓存时间（秒）
+}
+
 # 'django.conf.global_settings'中可以查看所有的全局默认设置
 
 # 指定本项目用户模型类
@@ -2,7 +2,11 @@
 生产环境配置
 Django settings for my_mall project.
 
-Generated by 'django-admin startproject' using Django 3.1.
+在开发环境配置的基础上，从环境变量读取与部署相关的配置（密钥、数据库、Redis、域名等），
+关闭DEBUG（DEBUG下每条SQL都会保存在内存中），模板不再检查文件修改时间，
+并按 MALL_WORKER_ROLE 裁剪热点路径上用不到的应用和中间件：
+    web: 完整的站点（默认）
+    api: 只处理页面和接口请求的worker，不加载 admin、messages
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/topics/settings/
@@ -10,3 +14,137 @@ https://docs.djangoproject.com/en/3.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .dev import *  # noqa: F401,F403
+from .dev import (
+    BASE_DIR, CACHES, DATABASE_ROUTING, DATABASES, INSTALLED_APPS, JINJA2_BYTECODE_CACHE_DIR, LOGGING, MIDDLEWARE,
+    PERFORMANCE, STATIC_ASSETS, STATIC_PAGES, TEMPLATES,
+)
+
+
+def env(name, default=None):
+    """读取环境变量，没有默认值且未设置时报错"""
+    value = os.environ.get(name)
+    if value is None:
+        if default is None:
+            raise ImproperlyConfigured('缺少环境变量%s' % name)
+        return default
+    return value
+
+
+def env_bool(name, default=False):
+    return env(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default=''):
+    return [item.strip() for item in env(name, default).split(',') if item.strip()]
+
+
+SECRET_KEY = env('MALL_SECRET_KEY')
+
+DEBUG = False
+
+ALLOWED_HOSTS = env_list('MALL_ALLOWED_HOSTS')
+
+# worker的角色：web 或 api
+WORKER_ROLE = env('MALL_WORKER_ROLE', 'web')
+if WORKER_ROLE not in ('web', 'api'):
+    raise ImproperlyConfigured('MALL_WORKER_ROLE只能是web或api')
+
+# api worker 上不需要的应用和中间件
+API_EXCLUDED_APPS = ['django.contrib.admin', 'django.contrib.messages']
+API_EXCLUDED_MIDDLEWARE = ['django.contrib.messages.middleware.MessageMiddleware']
+
+INSTALLED_APPS = list(INSTALLED_APPS)
+MIDDLEWARE = list(MIDDLEWARE)
+if WORKER_ROLE == 'api':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in API_EXCLUDED_MIDDLEWARE]
+
+
+# 模板：不再检查模板文件的修改时间，已编译的模板常驻内存
+TEMPLATES = copy.deepcopy(TEMPLATES)
+for template in TEMPLATES:
+    processors = template['OPTIONS']['context_processors']
+    # debug 只在 DEBUG 下有用
+    processors.remove('django.template.context_processors.debug')
+    if 'django.contrib.messages' not in INSTALLED_APPS:
+        processors.remove('django.contrib.messages.context_processors.messages')
+    if template['BACKEND'] == 'django.template.backends.jinja2.Jinja2':
+        template['OPTIONS'].update({
+            'auto_reload': False, # 不检查模板文件是否修改（DEBUG=False 时的默认值），发布新模板需要重启worker
+            'cache_size': 1000, # 进程内缓存的已编译模板数
+        })
+    else:
+        # 显式使用缓存加载器（与 DEBUG=False 时的默认行为相同），需要去掉 APP_DIRS
+        template['APP_DIRS'] = False
+        template['OPTIONS']['loaders'] = [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ]
+
+JINJA2_BYTECODE_CACHE_DIR = env('MALL_JINJA2_CACHE_DIR', JINJA2_BYTECODE_CACHE_DIR)
+
+
+# 数据库：主库 + MALL_DB_REPLICAS 中的从库（逗号分隔的主机，其余配置与主库相同）
+DATABASES = copy.deepcopy(DATABASES)
+DATABASES['default'].update({
+    'HOST': env('MALL_DB_HOST'),
+    'PORT': int(env('MALL_DB_PORT', '3306')),
+    'USER': env('MALL_DB_USER'),
+    'PASSWORD': env('MALL_DB_PASSWORD'),
+    'NAME': env('MALL_DB_NAME', 'mymall'),
+    'CONN_MAX_AGE': int(env('MALL_DB_CONN_MAX_AGE', '300')),
+})
+for number, host in enumerate(env_list('MALL_DB_REPLICAS'), 1):
+    DATABASES['replica%d' % number] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+DATABASE_ROUTING = dict(DATABASE_ROUTING, REPLICAS=[alias for alias in DATABASES if alias != 'default'])
+
+
+# Redis：MALL_REDIS_URL 为不带库号的地址，如 redis://:password@10.0.0.5:6379
+REDIS_URL = env('MALL_REDIS_URL').rstrip('/')
+CACHES = copy.deepcopy(CACHES)
+CACHES['default']['LOCATION'] = REDIS_URL + '/0'
+CACHES['session']['LOCATION'] = REDIS_URL + '/1'
+CACHES['verify_code']['LOCATION'] = REDIS_URL + '/2'
+
+
+# 日志、性能统计、静态文件的目录
+LOG_DIR = env('MALL_LOG_DIR', os.path.join(os.path.dirname(BASE_DIR), 'logs'))
+LOGGING = copy.deepcopy(LOGGING)
+LOGGING['handlers']['file']['filename'] = os.path.join(LOG_DIR, 'mall.log')
+LOGGING['loggers']['django']['level'] = env('MALL_LOG_LEVEL', 'INFO')
+
+PERFORMANCE = dict(
+    PERFORMANCE,
+    SAMPLE_RATE=float(env('MALL_PERF_SAMPLE_RATE', '0.01')), # 生产环境降低抽样比例
+    SERVER_TIMING=env_bool('MALL_SERVER_TIMING'), # 不向外部暴露服务端耗时
+    DUMP_DIR=LOG_DIR,
+    # nginx 转发的请求都来自127.0.0.1，不能按 INTERNAL_IPS 判断；没有设置时关闭 /perf/metrics/
+    METRICS_TOKEN=env('MALL_METRICS_TOKEN', ''),
+)
+
+STATIC_ROOT = env('MALL_STATIC_ROOT', os.path.join(os.path.dirname(BASE_DIR), 'static_root'))
+STATIC_ASSETS = dict(STATIC_ASSETS, SERVE=env_bool('MALL_SERVE_STATIC'))
+
+# 静态化页面的目录，需要与nginx配置中的 root 一致
+STATIC_PAGES_DIR = env('MALL_STATIC_PAGES_DIR', os.path.join(os.path.dirname(BASE_DIR), 'static_pages'))
+STATIC_PAGES = {
+    name: dict(options, PATH=os.path.join(STATIC_PAGES_DIR, os.path.basename(options['PATH'])))
+    for name, options in STATIC_PAGES.items()
+}
+
+INTERNAL_IPS = env_list('MALL_INTERNAL_IPS', '127.0.0.1')
+
+
+# HTTPS：由前置的负载均衡终止TLS时设置 MALL_HTTPS=1
+if env_bool('MALL_HTTPS'):
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
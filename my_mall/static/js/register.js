@@ -10,22 +10,48 @@ let vm = new Vue({
         password: '',
         password2: '',
         mobile: '',
+        image_code: '',
+        sms_code: '',
         allow: '',
 
+        // 图形验证码
+        uuid: '',
+        image_code_url: '',
+
+        // 短信验证码
+        sms_code_tip: '获取短信验证码',
+        sending_flag: false, // 正在发送或倒计时中，不能重复点击
+
         // v-show
         error_name: false,
         error_password: false,
         error_password2: false,
         error_mobile: false,
+        error_image_code: false,
+        error_sms_code: false,
         error_allow: false,
 
         // error_message
         error_name_message: '',
         error_mobile_message: '',
+        error_image_code_message: '',
+        error_sms_code_message: '',
+
+        // 提交失败（查重请求出错、访问过于频繁）的提示
+        error_submit: false,
+        error_submit_message: '',
+    },
+    mounted() { // 页面加载完成后生成图形验证码
+        this.generate_image_code();
     },
     methods: { // 定义和实现事件方法
+        // 生成图形验证码：uuid 由前端生成，后端以它为键保存答案，点击图片时换一张
+        generate_image_code() {
+            this.uuid = generateUUID();
+            this.image_code_url = '/image_codes/' + this.uuid + '/';
+        },
         // 校验用户名
-        check_username() {
+        check_username(remote = true) {
             // 用户名是5-20个字符，[a-zA-Z0-9_-]
             // 定义正则
             let re = /^[a-zA-Z0-9_-]{5,20}$/;
@@ -38,25 +64,10 @@ let vm = new Vue({
                 this.error_name_message = '请输入5-20个字符的用户名';
                 this.error_name = true;
             }
-
-            // 判断用户名是否重复注册
-            if (this.error_name == false) { // 只有当用户输入的用户名满足条件时才会去判断
-                let url = '/usernames/' + this.username + '/count/';
-                axios.get(url, {
-                    responseType: 'json'
-                })
-                    .then(response => {
-                        if (response.data.count == 1) {
-                            // 用户名已存在
-                            this.error_name_message = '用户名已存在';
-                            this.error_name = true;
-                        } else {
-                            // 用户名不存在
-                            this.error_name = false;
-                        }
-                    })
+            // 判断用户名是否重复注册：只有当用户输入的用户名满足条件时才会去判断，提交时再与手机号一起判断
+            if (remote && this.error_name == false) {
+                this.request_availability({username: this.username})
                     .catch(error => {
-                        // 失败控制台打印信息
                         console.log(error.response);
                     })
             }
@@ -79,7 +90,7 @@ let vm = new Vue({
             }
         },
         // 校验手机号
-        check_mobile() {
+        check_mobile(remote = true) {
             let re = /^1[3-9]\d{9}$/;
             if (re.test(this.mobile)) {
                 this.error_mobile = false;
@@ -87,29 +98,84 @@ let vm = new Vue({
                 this.error_mobile_message = '您输入的手机号格式不正确';
                 this.error_mobile = true;
             }
-
-            // 判断手机号是否重复注册
-            if (this.error_mobile == false) { // 只有当用户输入的手机号满足条件时才会去判断
-                let url = '/mobiles/' + this.mobile + '/count/';
-                axios.get(url, {
-                    responseType: 'json'
-                })
-                    .then(response => {
-                        if (response.data.count == 1) {
-                            // 手机号已存在
-                            this.error_mobile_message = '手机号已存在';
-                            this.error_mobile = true;
-                        } else {
-                            // 手机号不存在
-                            this.error_mobile = false;
-                        }
-                    })
+            // 判断手机号是否重复注册：只有当用户输入的手机号满足条件时才会去判断，提交时再与用户名一起判断
+            if (remote && this.error_mobile == false) {
+                this.request_availability({mobile: this.mobile})
                     .catch(error => {
-                        // 失败控制台打印信息
                         console.log(error.response);
                     })
             }
         },
+        // 校验图形验证码：与后端 SMSCodeSchema.image_code 相同，只能是英文字母和数字
+        check_image_code() {
+            let re = /^[A-Za-z0-9]{1,8}$/;
+            if (re.test(this.image_code)) {
+                this.error_image_code = false;
+            } else {
+                this.error_image_code_message = '请填写图形验证码';
+                this.error_image_code = true;
+            }
+        },
+        // 发送短信验证码：后端只保存验证码并放入发送队列，立即返回
+        send_sms_code() {
+            if (this.sending_flag == true) {
+                return;
+            }
+            // 手机号和图形验证码都正确时才发送
+            this.check_mobile(false);
+            this.check_image_code();
+            if (this.error_mobile == true || this.error_image_code == true) {
+                return;
+            }
+            this.sending_flag = true;
+
+            let url = '/sms_codes/' + this.mobile + '/?image_code=' + encodeURIComponent(this.image_code) + '&uuid=' + this.uuid;
+            axios.get(url, {
+                responseType: 'json'
+            })
+                .then(response => {
+                    // 60秒倒计时，结束前不能再次发送
+                    let num = 60;
+                    let t = setInterval(() => {
+                        if (num == 1) {
+                            clearInterval(t);
+                            this.sms_code_tip = '获取短信验证码';
+                            this.sending_flag = false;
+                        } else {
+                            num -= 1;
+                            this.sms_code_tip = num + '秒';
+                        }
+                    }, 1000);
+                    this.error_sms_code = false;
+                })
+                .catch(error => {
+                    let data = error.response ? error.response.data : null;
+                    if (data && data.code == '4001') {
+                        // 图形验证码错误或已失效
+                        this.error_image_code_message = data.errmsg;
+                        this.error_image_code = true;
+                    } else {
+                        this.error_sms_code_message = data && data.errmsg ? data.errmsg : '发送短信失败';
+                        this.error_sms_code = true;
+                    }
+                    this.sending_flag = false;
+                })
+                .then(() => {
+                    // 图形验证码只能使用一次，无论是否发送成功都换一张
+                    this.generate_image_code();
+                    this.image_code = '';
+                })
+        },
+        // 校验短信验证码
+        check_sms_code() {
+            let re = /^\d{6}$/;
+            if (re.test(this.sms_code)) {
+                this.error_sms_code = false;
+            } else {
+                this.error_sms_code_message = '请填写短信验证码';
+                this.error_sms_code = true;
+            }
+        },
         // 校验是否勾选协议
         check_allow() {
             if (!this.allow) {
@@ -118,19 +184,56 @@ let vm = new Vue({
                 this.error_allow = false;
             }
         },
-        // 监听表单提交事件
+        // 查询用户名/手机号是否已注册，params 为 {username: ..., mobile: ...} 中的一项或两项
+        // 已注册时显示在对应的输入框后，返回的 Promise 结果为响应数据
+        request_availability(params) {
+            let query = Object.keys(params).map(key => key + '=' + encodeURIComponent(params[key])).join('&');
+            return axios.get('/availability/?' + query, {
+                responseType: 'json'
+            })
+                .then(response => {
+                    if (response.data.username_count == 1) {
+                        this.error_name_message = '用户名已存在';
+                        this.error_name = true;
+                    }
+                    if (response.data.mobile_count == 1) {
+                        this.error_mobile_message = '手机号已存在';
+                        this.error_mobile = true;
+                    }
+                    return response.data;
+                })
+        },
+        // 同时判断用户名和手机号是否重复注册，只发一个请求；都未注册时才提交表单
+        check_availability() {
+            this.error_submit = false;
+            this.request_availability({username: this.username, mobile: this.mobile})
+                .then(data => {
+                    if (data.username_count == 0 && data.mobile_count == 0) {
+                        // form.submit() 不会再次触发 submit 事件
+                        this.$refs.form.submit();
+                    }
+                })
+                .catch(error => {
+                    // 查重请求失败或被限流（429）时不提交，提示用户稍后重试
+                    let data = error.response ? error.response.data : null;
+                    this.error_submit_message = data && data.errmsg ? data.errmsg + '，请稍后再试' : '网络错误，请稍后再试';
+                    this.error_submit = true;
+                })
+        },
+        // 监听表单提交事件：先阻止提交（@submit.prevent），本地校验通过后由 check_availability 提交
         on_submit() {
-            this.check_username();
+            this.check_username(false);
             this.check_password();
             this.check_password2();
-            this.check_mobile();
+            this.check_mobile(false);
+            this.check_sms_code();
             this.check_allow();
 
-            // 在校验之后，注册数据中，只要有错误，就禁用掉表单的提交事件
-            if (this.error_name == true || this.error_password == true || this.error_password2 == true || this.error_mobile == true || this.error_allow == true) {
-                // 禁用掉表单的提交事件
-                window.event.returnValue = false;
+            // 注册数据中只要有错误，就不提交表单
+            if (this.error_name == true || this.error_password == true || this.error_password2 == true || this.error_mobile == true || this.error_sms_code == true || this.error_allow == true) {
+                return;
             }
+            this.check_availability();
         },
     }
 });
\ No newline at end of file
@@ -13,14 +13,31 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.apps import apps
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.conf.urls import url, include
+from my_mall.utils.lazy_urls import lazy_view
+from my_mall.utils.perf import metrics_view
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # 当前进程的性能统计，只允许 INTERNAL_IPS 访问
+    url(r'^perf/metrics/$', metrics_view),
     # users
     url(r'^', include('users.urls')),
     # contents
     url(r'^', include('contents.urls')),
+    # verifications
+    url(r'^', include('verifications.urls')),
 ]
+
+# api worker 不加载 admin，见 my_mall.settings.prod
+if apps.is_installed('django.contrib.admin'):
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+
+if getattr(settings, 'STATIC_ASSETS', {}).get('SERVE', False):
+    # 带哈希的静态文件，返回预压缩版本和长期缓存的响应头，见 my_mall.utils.static_storage
+    urlpatterns.insert(0, url(
+        r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), lazy_view('my_mall.utils.static_storage.serve_static'),
+    ))
@@ -0,0 +1,83 @@
+'''
+异步视图的支持
+
+Django 3.1 的 ORM 和缓存都只有同步接口，类视图也不支持 async def 的处理方法。这里提供：
+(1) run_sync：在有界线程池中执行同步调用（查询数据库、读写Redis、计算密码哈希），
+    线程池大小即同时进行阻塞操作的上限，等待中的请求只是挂起的协程，不占用线程；
+(2) AsyncView：处理方法为 async def 的类视图。
+
+配置项 ASYNC_VIEWS：
+    ENABLED:     是否在路由中使用异步视图，ASGI 部署时由 asgi.py 打开
+    MAX_WORKERS: 执行同步调用的线程池大小
+'''
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.decorators import classonlymethod
+from django.views import View
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_WORKERS': 32,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'ASYNC_VIEWS', {}))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(get_options()['MAX_WORKERS'], thread_name_prefix='sync-view')
+    return _executor
+
+
+def _call(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # 线程池中的线程不会收到 request_finished 信号，需要自己按 CONN_MAX_AGE 关闭过期的数据库连接
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    在有界线程池中执行同步函数，并等待其结果
+    :param func: 同步函数
+    :return: func 的返回值
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), context.run, _call, func, args, kwargs)
+
+
+class AsyncView(View):
+    """
+    处理方法（get/post...）为 async def 的类视图
+    as_view() 返回协程函数，Django 在 ASGI 下直接在事件循环中调用，不占用线程
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # 405 等由 View 直接返回的响应不是协程
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        return async_view
@@ -0,0 +1,37 @@
+'''
+自定义缓存后端
+'''
+from django.conf import settings
+from django.core.cache import caches
+from django_redis.cache import RedisCache
+
+from . import perf
+
+
+class InstrumentedRedisCache(RedisCache):
+    """
+    统计命中/未命中次数的 django_redis 缓存，见 my_mall.utils.perf
+    只有抽样的请求才会记录，未抽样时的额外开销只是一次 ContextVar 读取
+    """
+    _alias = None
+
+    @property
+    def alias(self):
+        # 缓存对象不知道自己的别名：在当前线程的缓存对象中找到自己
+        if self._alias is None:
+            self._alias = next((alias for alias in settings.CACHES if caches[alias] is self), '?')
+        return self._alias
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, default=default, version=version, client=client)
+        if perf.current_metrics.get() is not None:
+            hit = value is not default
+            perf.record_cache(self.alias, int(hit), int(not hit))
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, client=client)
+        if perf.current_metrics.get() is not None:
+            perf.record_cache(self.alias, len(values), len(keys) - len(values))
+        return values
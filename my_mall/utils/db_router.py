@@ -0,0 +1,234 @@
+'''
+主从数据库路由
+
+写操作总是使用主库；读操作默认也使用主库，只有在 replica_reads() 范围内才分散到从库：
+    @replica_reads()
+    def count_username(username): ...
+只读且能容忍复制延迟的查询（注册时的用户名/手机号查重、登录时按账号查询用户）显式地放到从库，
+其余查询不受影响，不会因为复制延迟读到旧数据。
+
+读己之写：ReplicaPinningMiddleware 为每个请求记录是否写过主库，
+(1) 写过主库的请求之后的读操作都使用主库；
+(2) 响应中设置 PIN_COOKIE，PIN_SECONDS 秒（应大于复制延迟）内同一浏览器的请求都只读主库；
+(3) 事务中的读操作使用主库。
+
+持久连接与健康检查：数据库配置 CONN_MAX_AGE 后，连接在请求之间复用，不必每个请求重新建立TCP连接和认证。
+Django 3.1 只在连接出过错时才检查连接是否可用，check_connections() 在 request_started 时
+检查距上次检查超过 HEALTH_CHECK_INTERVAL 秒的持久连接，关闭已断开的连接（由下一次查询重新建立），
+不可用的从库在 REPLICA_RETRY 秒内不再使用，读操作回到主库。
+路由到尚未建立连接的从库时先建立连接，连接失败（从库宕机、网络不通）同样标记为不可用并改用其他从库或主库，
+不会让查询直接抛出 OperationalError。
+
+配置项 DATABASE_ROUTING：
+    PRIMARY:               主库别名
+    REPLICAS:              从库别名列表，None 表示 DATABASES 中主库以外的所有别名
+    PIN_COOKIE:            读己之写cookie的名称
+    PIN_SECONDS:           写操作之后只读主库的时间（秒）
+    HEALTH_CHECK_INTERVAL: 持久连接的检查间隔（秒）
+    REPLICA_RETRY:         不可用的从库多久之后再次尝试（秒）
+'''
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'PRIMARY': 'default',
+    'REPLICAS': None,
+    'PIN_COOKIE': 'pin_primary',
+    'PIN_SECONDS': 5,
+    'HEALTH_CHECK_INTERVAL': 10,
+    'REPLICA_RETRY': 30,
+}
+
+# 当前请求的路由状态，请求之外（管理命令等）为 None
+current_state = contextvars.ContextVar('db_routing_state', default=None)
+
+# 是否在 replica_reads() 范围内
+_replica_scope = contextvars.ContextVar('db_replica_scope', default=False)
+
+# {从库别名: 恢复使用的时间}
+_unavailable = {}
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'DATABASE_ROUTING', {}))
+
+
+def get_replicas(options=None):
+    options = options or get_options()
+    if options['REPLICAS'] is not None:
+        return list(options['REPLICAS'])
+    return [alias for alias in settings.DATABASES if alias != options['PRIMARY']]
+
+
+class RoutingState(object):
+    """单个请求的路由状态"""
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned  # 只读主库
+        self.wrote = False  # 写过主库
+
+
+@contextmanager
+def replica_reads():
+    """范围内的读操作使用从库，可以作为装饰器使用：@replica_reads()"""
+    token = _replica_scope.set(True)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """范围内的读操作使用主库，例如写入后立即读取"""
+    token = _replica_scope.set(False)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+class PrimaryReplicaRouter(object):
+    """主从路由，配置在 DATABASE_ROUTERS 中"""
+
+    def __init__(self):
+        options = get_options()
+        self.primary = options['PRIMARY']
+        self.replicas = get_replicas(options)
+        self.aliases = {self.primary, *self.replicas}
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or not _replica_scope.get():
+            return self.primary
+        state = current_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return self.primary
+        if connections[self.primary].in_atomic_block:
+            return self.primary
+        now = time.monotonic()
+        available = [alias for alias in self.replicas if _unavailable.get(alias, 0) <= now]
+        random.shuffle(available)
+        for alias in available:
+            if connect_replica(alias):
+                return alias
+        return self.primary
+
+    def db_for_write(self, model, **hints):
+        state = current_state.get()
+        if state is not None:
+            state.wrote = True
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 主从库中是同一份数据
+        if obj1._state.db in self.aliases and obj2._state.db in self.aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 从库的表结构由复制同步
+        if db in self.replicas:
+            return False
+        return None
+
+
+def mark_unavailable(alias, seconds):
+    _unavailable[alias] = time.monotonic() + seconds
+    logger.error('数据库%s不可用，%d秒内读操作改用主库' % (alias, seconds))
+
+
+def connect_replica(alias):
+    """
+    确保从库已经连接，连接失败时标记为不可用
+    :param alias: 从库别名
+    :return: 是否可以使用
+    """
+    connection = connections[alias]
+    if connection.connection is not None:
+        return True
+    try:
+        connection.ensure_connection()
+    except DatabaseError:
+        mark_unavailable(alias, get_options()['REPLICA_RETRY'])
+        return False
+    return True
+
+
+def check_connections(**kwargs):
+    """
+    在 request_started 时检查空闲较久的持久连接：已断开的连接关闭后由下一次查询重新建立，
+    从库重连失败时暂时不再使用
+    """
+    options = get_options()
+    replicas = set(get_replicas(options))
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or not connection.settings_dict.get('CONN_MAX_AGE'):
+            continue
+        checked_at = getattr(connection, 'health_checked_at', None)
+        if checked_at is not None and now - checked_at < options['HEALTH_CHECK_INTERVAL']:
+            continue
+        connection.health_checked_at = now
+        if connection.is_usable():
+            continue
+        logger.warning('数据库%s的持久连接已断开，重新连接' % connection.alias)
+        connection.close()
+        if connection.alias in replicas:
+            try:
+                connection.ensure_connection()
+            except DatabaseError:
+                mark_unavailable(connection.alias, options['REPLICA_RETRY'])
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """
+    读己之写：写过主库的请求设置 PIN_COOKIE，带有该cookie的请求只读主库
+    放在 SessionMiddleware 之前，session、登录状态的读取也受路由控制
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.options = get_options()
+        request_started.connect(check_connections, dispatch_uid='db_router.check_connections')
+
+    def start(self, request):
+        pinned = self.options['PIN_COOKIE'] in request.COOKIES
+        state = RoutingState(pinned)
+        return current_state.set(state), state
+
+    def finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(self.options['PIN_COOKIE'], '1', max_age=self.options['PIN_SECONDS'], httponly=True)
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token, state = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        token, state = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.finish(response, state)
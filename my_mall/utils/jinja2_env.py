@@ -1,17 +1,54 @@
-from jinja2 import Environment
+import os
+import time
+
+from jinja2 import Environment, FileSystemBytecodeCache, Template
+from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.urls import reverse
 
+from . import perf
+from .response_code import RETCODE
+from .static_storage import static_bundle
+
+
+class TimedTemplate(Template):
+    """记录渲染耗时的模板，见 my_mall.utils.perf"""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            perf.record_template(time.perf_counter() - started)
+
+
+def get_bytecode_cache():
+    """
+    模板字节码缓存：编译后的模板保存在 JINJA2_BYTECODE_CACHE_DIR 目录中，
+    各worker进程启动后直接加载，不必重新解析编译模板。
+    缓存以模板源码的校验和作为键的一部分，模板修改后旧的缓存自动作废。
+    """
+    cache_dir = getattr(settings, 'JINJA2_BYTECODE_CACHE_DIR', None)
+    if not cache_dir:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    return FileSystemBytecodeCache(cache_dir)
+
 
 def jinja2_environment(**options):
+    options.setdefault('bytecode_cache', get_bytecode_cache())
     env = Environment(**options)
+    env.template_class = TimedTemplate
     env.globals.update({
         'static': staticfiles_storage.url,
+        'static_bundle': static_bundle,
         'url': reverse,
+        # 模板中按错误码显示提示：{% if register_errcode == RETCODE.USERERR %}
+        'RETCODE': RETCODE,
     })
     return env
 
 
 """
 确保可以使用模板引擎中的{{ url('') }} {{ static('') }}这类语句 
-"""
\ No newline at end of file
+"""
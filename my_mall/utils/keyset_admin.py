@@ -0,0 +1,181 @@
+'''
+大表的 admin 列表页
+
+Django admin 的列表页每次打开都执行 COUNT(*)（有过滤条件时两次），翻页使用 LIMIT/OFFSET，
+表中有几百万行时 COUNT(*) 要扫描整个索引，越往后翻页 OFFSET 跳过的行越多。
+KeysetPaginationMixin 改为：
+(1) 键集分页：按列表的排序字段记住当前页最后一行（或第一行）的值，下一页用 WHERE (排序字段) > (该值) LIMIT n，
+    每一页的开销都与页码无关，只提供“首页/上一页/下一页”；
+(2) 行数最多精确统计到 count_limit 行，超过时没有过滤条件的列表使用数据库的统计信息估算，
+    有过滤条件时显示“count_limit+”，不再统计全表行数（show_full_result_count）。
+
+排序字段需要是不为空的普通字段，并且最后一个字段唯一（ChangeList 会自动追加 -pk），
+这样的排序最好有对应的索引；按其他字段排序时退回 Django 默认的分页。
+不支持 list_editable（列表页的对象是列表而不是 QuerySet）。
+'''
+import binascii
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# 翻页游标的查询参数
+CURSOR_VAR = 'cursor'
+
+
+def estimate_count(queryset):
+    """
+    从数据库的统计信息估算表的行数
+    :return: 行数，不支持的数据库返回 None
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class KeysetChangeList(ChangeList):
+    """使用键集分页和估算行数的 ChangeList"""
+
+    def get_queryset(self, request):
+        # 游标不是过滤条件；过滤、排序、搜索的链接和表单都回到第一页
+        self.params.pop(CURSOR_VAR, None)
+        return super().get_queryset(request)
+
+    def get_keyset(self):
+        """
+        :return: [(排序字段, 是否降序), ...]，排序不能用于键集分页时返回 None
+        """
+        keyset = []
+        for item in self.queryset.query.order_by:
+            if not isinstance(item, str) or item == '?':
+                return None
+            descending, name = item.startswith('-'), item.lstrip('-')
+            try:
+                field = self.lookup_opts.pk if name == 'pk' else self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if field.null or field.is_relation:
+                return None
+            keyset.append((field, descending))
+            if field.unique:
+                return keyset
+        return None
+
+    def encode_cursor(self, keyset, direction, obj):
+        values = []
+        for field, _ in keyset:
+            value = field.value_from_object(obj)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return urlsafe_base64_encode(json.dumps([direction] + values).encode())
+
+    def decode_cursor(self, keyset, cursor):
+        """
+        :return: (方向, [排序字段的值, ...])
+        """
+        try:
+            direction, *values = json.loads(urlsafe_base64_decode(cursor))
+            if direction not in ('next', 'prev') or len(values) != len(keyset):
+                raise ValueError
+            return direction, [field.to_python(value) for (field, _), value in zip(keyset, values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            raise IncorrectLookupParameters
+
+    def seek(self, queryset, keyset, values, backward):
+        """
+        按排序字段的值定位：(a, b) > (x, y) 即 a > x OR (a = x AND b > y)
+        另外加上 a >= x，数据库才能用 (a, b) 索引做范围扫描，而不是扫描整个索引再逐行判断 OR 条件
+        """
+        condition, equal = Q(), {}
+        for (field, descending), value in zip(keyset, values):
+            lookup = '%s__%s' % (field.attname, 'lt' if descending != backward else 'gt')
+            condition |= Q(**equal, **{lookup: value})
+            equal[field.attname] = value
+        (field, descending), value = keyset[0], values[0]
+        if len(keyset) > 1:
+            condition &= Q(**{'%s__%s' % (field.attname, 'lte' if descending != backward else 'gte'): value})
+        return queryset.filter(condition)
+
+    def get_result_count(self):
+        """
+        :return: (行数, 是否精确)
+        """
+        limit = self.model_admin.count_limit
+        count = self.queryset.order_by().values('pk')[:limit + 1].count()
+        if count <= limit:
+            return count, True
+        if not self.queryset.query.has_filters():
+            estimate = estimate_count(self.queryset)
+            if estimate is not None:
+                return max(estimate, count), False
+        return limit, False
+
+    def get_results(self, request):
+        keyset = self.get_keyset()
+        if keyset is None:
+            self.keyset = None
+            return super().get_results(request)
+        self.keyset = keyset
+
+        cursor = request.GET.get(CURSOR_VAR)
+        direction, values = self.decode_cursor(keyset, cursor) if cursor else ('next', None)
+        backward = direction == 'prev'
+        queryset = self.queryset
+        if values is not None:
+            queryset = self.seek(queryset, keyset, values, backward)
+        if backward:
+            queryset = queryset.reverse()
+        # 多取一行判断是否还有下一页（向前翻页时判断是否还有上一页）
+        result_list = list(queryset[:self.list_per_page + 1])
+        has_more = len(result_list) > self.list_per_page
+        del result_list[self.list_per_page:]
+        if backward:
+            result_list.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = values is not None, has_more
+
+        result_count, exact = self.get_result_count()
+        self.result_count = result_count
+        self.result_count_display = str(result_count) if exact else (
+            '约%d' % result_count if result_count > self.model_admin.count_limit else '%d+' % result_count)
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = has_previous or has_next
+        self.paginator = None
+        self.first_page_url = self.get_query_string() if has_previous else None
+        self.previous_url = self.get_query_string(
+            {CURSOR_VAR: self.encode_cursor(keyset, 'prev', result_list[0])}) if has_previous and result_list else None
+        self.next_url = self.get_query_string(
+            {CURSOR_VAR: self.encode_cursor(keyset, 'next', result_list[-1])}) if has_next and result_list else None
+
+
+class KeysetPaginationMixin(object):
+    """
+    ModelAdmin 的 mixin，列表页使用 KeysetChangeList
+    列表页模板需要覆盖 pagination 块，显示 cl.first_page_url、cl.previous_url、cl.next_url 和 cl.result_count_display，
+    见 users/templates/admin/users/user/change_list.html
+    """
+    show_full_result_count = False
+    # 精确统计的最大行数
+    count_limit = 10000
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
@@ -0,0 +1,47 @@
+'''
+按需导入视图
+
+路由中直接引用视图类时，导入 urls.py 就会导入所有视图模块及其依赖（模板、认证、密码哈希等），
+而 worker 可能只处理其中的一部分接口。lazy_view 只记录视图的导入路径，第一次处理该路由的请求时才导入：
+    url(r'^register/$', lazy_view('users.views.RegisterView'), name='register')
+    url(r'^$', lazy_view('contents.views.AsyncIndexView', is_async=True))
+
+导入路径指向类视图时调用 as_view()，指向函数时直接使用。
+异步视图需要 is_async=True：Django 在加载视图之前就要判断它是否为协程函数。
+视图上的 csrf_exempt 等属性在导入前无法得知，这类视图不要使用 lazy_view。
+'''
+import threading
+
+from django.utils.module_loading import import_string
+
+
+def lazy_view(dotted_path, is_async=False, **initkwargs):
+    """
+    :param dotted_path: 视图类或视图函数的导入路径
+    :param is_async: 是否为异步视图
+    :param initkwargs: 传给 as_view() 的参数
+    :return: 视图函数
+    """
+    loaded = []
+    lock = threading.Lock()
+
+    def load():
+        if not loaded:
+            with lock:
+                if not loaded:
+                    view = import_string(dotted_path)
+                    loaded.append(view.as_view(**initkwargs) if isinstance(view, type) else view)
+        return loaded[0]
+
+    if is_async:
+        async def view(request, *args, **kwargs):
+            return await load()(request, *args, **kwargs)
+    else:
+        def view(request, *args, **kwargs):
+            return load()(request, *args, **kwargs)
+
+    # 与直接引用时相同的视图名称，perf 统计和 resolve() 的结果不变
+    view.__module__, _, view.__name__ = dotted_path.rpartition('.')
+    view.__qualname__ = view.__name__
+    view.__doc__ = 'lazy_view(%r)' % dotted_path
+    return view
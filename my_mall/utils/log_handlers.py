@@ -0,0 +1,147 @@
+'''
+不阻塞请求的日志处理
+
+QueuedRotatingFileHandler 在请求线程中只格式化日志并放入队列，
+由后台线程批量写入文件、统一 flush 并检查是否需要轮转，请求线程不做任何文件I/O。
+队列写满时（磁盘很慢或日志暴增）直接丢弃新日志并计数，而不是阻塞请求。
+
+在 LOGGING 中配置：
+    'file': {
+        'class': 'my_mall.utils.log_handlers.QueuedRotatingFileHandler',
+        'filename': ..., 'maxBytes': ..., 'backupCount': ..., 'formatter': 'verbose',
+    }
+'''
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，便于日志系统采集"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'lineno': record.lineno,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """批量写入的 RotatingFileHandler：逐条写入缓冲区，一批写完后才 flush"""
+
+    def __init__(self, *args, buffer_size=64 * 1024, **kwargs):
+        self.buffer_size = buffer_size
+        super().__init__(*args, **kwargs)
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size, encoding=self.encoding)
+
+    def flush(self):
+        # StreamHandler.emit 每条日志都会调用 flush，这里推迟到一批写完
+        pass
+
+    def flush_batch(self):
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    基于队列的日志处理器
+    :param filename: 日志文件
+    :param maxBytes: 单个日志文件的最大容量
+    :param backupCount: 最多保存的日志文件的数量
+    :param queueSize: 队列容量，写满后丢弃新日志
+    :param batchSize: 后台线程每批最多写入的日志条数
+    :param bufferSize: 文件写缓冲区大小
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8',
+                 queueSize=10000, batchSize=500, bufferSize=64 * 1024):
+        super().__init__(queue.Queue(queueSize))
+        self.target = BatchRotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding,
+            delay=True, buffer_size=bufferSize,
+        )
+        # 日志在请求线程中已经格式化好，后台线程原样写入
+        self.target.setFormatter(logging.Formatter('%(message)s'))
+        self.batch_size = batchSize
+        self.dropped = 0
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def ensure_listener(self):
+        """启动后台写入线程；fork 出的子进程中没有父进程的线程，需要重新启动"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self.monitor, name='log-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        self.ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def monitor(self):
+        """后台线程：阻塞等待第一条日志，再取出队列中已有的日志，一起写入后 flush 一次"""
+        while True:
+            record = self.queue.get()
+            stop = record is None
+            batch = [] if stop else [record]
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                else:
+                    batch.append(record)
+            for record in batch:
+                self.target.handle(record)
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                record = logging.LogRecord(
+                    'django', logging.WARNING, __file__, 0, '日志队列已满，丢弃了%d条日志', (dropped,), None
+                )
+                self.target.handle(self.prepare(record))
+            self.target.flush_batch()
+            if stop:
+                return
+
+    def close(self):
+        """进程退出时写完队列中剩余的日志"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            try:
+                self.queue.put(None, timeout=1)
+                self._thread.join(5)
+            except queue.Full:
+                sys.stderr.write('日志队列已满，退出时未能写完所有日志\n')
+        self._thread = None
+        self._pid = None
+        self.target.close()
+        super().close()
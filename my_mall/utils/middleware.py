@@ -0,0 +1,71 @@
+'''
+自定义中间件
+'''
+import asyncio
+import logging
+import random
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+
+from . import perf
+
+logger = logging.getLogger('django')
+
+
+class PerformanceMiddleware(MiddlewareMixin):
+    """
+    请求性能统计，见 my_mall.utils.perf
+    放在 MIDDLEWARE 的第一位，统计的耗时包括其他中间件（如加载session）
+    同时支持同步和异步调用，ASGI 部署时不会让请求绕道线程池
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.options = perf.get_options()
+        # 为之后建立的以及当前线程已有的数据库连接安装 execute_wrapper
+        connection_created.connect(perf.install_db_wrapper, dispatch_uid='perf.install_db_wrapper')
+        for connection in connections.all():
+            perf.install_db_wrapper(connection=connection)
+
+    def start(self):
+        metrics = perf.RequestMetrics() if random.random() < self.options['SAMPLE_RATE'] else None
+        return perf.current_metrics.set(metrics), metrics, time.perf_counter()
+
+    def finish(self, request, response, metrics, started):
+        wall_time = time.perf_counter() - started
+        wall_ms = wall_time * 1000
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        perf.collector.record(view, wall_ms, metrics, size)
+
+        if metrics is not None and self.options['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing(wall_time)
+        if wall_ms >= self.options['SLOW_REQUEST_MS']:
+            logger.warning('slow request %s %s %s %.1fms' % (request.method, request.path, view, wall_ms))
+        try:
+            perf.collector.maybe_dump(self.options['DUMP_DIR'], self.options['DUMP_INTERVAL'])
+        except OSError as e:
+            logger.error('写入性能统计失败：%s' % e)
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token, metrics, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            perf.current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        token, metrics, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perf.current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
@@ -0,0 +1,262 @@
+'''
+渲染结果缓存：进程内LRU + Redis(default缓存) 两级缓存整页HTML
+
+读取顺序：
+(1) 进程内LRU，LOCAL_TIMEOUT 秒内直接使用，不访问 Redis；
+(2) Redis，用一次 MGET 同时取出页面和当前版本号，版本号不一致说明已失效；
+(3) 都没有，重新渲染并写回两级缓存。
+
+过期策略（stale-while-revalidate）：
+页面在 TIMEOUT 秒内是新鲜的；之后的 STALE_TIMEOUT 秒内仍可使用，但会有一个请求
+抢到锁后重新渲染，其余请求继续使用旧页面，避免缓存失效时所有请求同时渲染模板。
+
+失效：invalidate() 将 Redis 中的版本号加一，所有进程最迟在 LOCAL_TIMEOUT 秒后看到新页面。
+
+条件请求与压缩：写入缓存时计算页面的 ETag 并预先压缩一份gzip，
+命中缓存时按 If-None-Match/If-Modified-Since 返回304，按 Accept-Encoding 返回压缩后的内容，不必每次压缩。
+'''
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django import http
+from django.core.cache import caches
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.text import compress_string
+
+from .redis_pool import RedisBatch
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default', # 使用的Django缓存别名
+    'TIMEOUT': 300, # 页面保持新鲜的时间（秒）
+    'STALE_TIMEOUT': 60, # 过期后仍可使用旧页面的时间（秒）
+    'LOCAL_SIZE': 32, # 进程内LRU的容量
+    'LOCAL_TIMEOUT': 5, # 进程内LRU不回查Redis的时间（秒）
+    'LOCK_TIMEOUT': 10, # 渲染锁的超时时间（秒）
+    'LOCK_WAIT': 2, # 缓存完全缺失时，等待其他请求渲染完成的最长时间（秒）
+    'COMPRESS': True, # 写入缓存时预先压缩一份gzip
+}
+
+
+class LocalLRU(object):
+    """线程安全的进程内LRU"""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def default_key_func(request):
+    """
+    默认的缓存键：只区分请求路径
+    页面中与用户相关的内容（如用户名）由前端从cookie中读取，因此不区分用户；
+    也不区分查询字符串，避免随意拼接的参数撑爆缓存
+    """
+    return request.path
+
+
+class PageCache(object):
+    """整页缓存"""
+
+    def __init__(self, name, key_func=default_key_func, **options):
+        """
+        :param name: 缓存名称，作为Redis键的前缀
+        :param key_func: 根据请求计算缓存键中变化的部分
+        :param options: 见 DEFAULTS
+        """
+        self.name = name
+        self.key_func = key_func
+        options = dict(DEFAULTS, **options)
+        self.cache_alias = options['CACHE_ALIAS']
+        self.timeout = options['TIMEOUT']
+        self.stale_timeout = options['STALE_TIMEOUT']
+        self.local_timeout = options['LOCAL_TIMEOUT']
+        self.lock_timeout = options['LOCK_TIMEOUT']
+        self.lock_wait = options['LOCK_WAIT']
+        self.compress = options['COMPRESS']
+        self.local = LocalLRU(options['LOCAL_SIZE'])
+        self.version_key = 'page:%s:version' % name
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def entry_key(self, request):
+        return 'page:%s:%s' % (self.name, self.key_func(request))
+
+    def fetch(self, key):
+        """
+        从两级缓存中读取页面
+        :return: 页面条目，没有或已失效返回 None
+        """
+        now = time.time()
+        entry = self.local.get(key)
+        if entry is not None and now - entry['checked_at'] < self.local_timeout and now < entry['stale_until']:
+            return entry
+
+        values = self.cache.get_many([self.version_key, key])
+        entry = values.get(key)
+        if entry is None or entry['version'] != values.get(self.version_key, 0):
+            return None
+        entry['checked_at'] = now
+        self.local.set(key, entry)
+        return entry
+
+    def peek(self, request):
+        """
+        只查询进程内LRU，不访问Redis，异步视图可以直接在事件循环中调用
+        :return: 命中新鲜的页面时返回响应，否则返回 None
+        """
+        entry = self.local.get(self.entry_key(request))
+        now = time.time()
+        if entry is not None and now - entry['checked_at'] < self.local_timeout and now < entry['fresh_until']:
+            return self.build_response(request, entry, 'hit')
+        return None
+
+    def store(self, key, response, version, batch=None):
+        """
+        将渲染结果写入两级缓存
+        :param batch: RedisBatch，写入Redis的命令加入其中，由调用者统一执行
+        """
+        now = time.time()
+        content = response.content
+        compressed = compress_string(content) if self.compress else None
+        entry = {
+            'content': content,
+            'gzip': compressed if compressed is not None and len(compressed) < len(content) else None,
+            'etag': quote_etag(hashlib.md5(content).hexdigest()),
+            'last_modified': int(now),
+            'content_type': response['Content-Type'],
+            'version': version,
+            'fresh_until': now + self.timeout,
+            'stale_until': now + self.timeout + self.stale_timeout,
+            'checked_at': now,
+        }
+        (batch or self.cache).set(key, entry, self.timeout + self.stale_timeout)
+        self.local.set(key, entry)
+        return entry
+
+    def render_and_store(self, key, render):
+        """渲染页面并写入缓存，期间持有渲染锁"""
+        try:
+            # 先取版本号再渲染，渲染期间发生的失效会使这次的结果直接作废
+            version = self.cache.get(self.version_key, 0)
+            response = render()
+        except BaseException:
+            self.release(key)
+            raise
+        response['X-Page-Cache'] = 'miss'
+        if response.status_code == 200 and not response.streaming:
+            try:
+                # 写入页面和释放渲染锁在一个pipeline中完成
+                with RedisBatch(self.cache_alias) as batch:
+                    entry = self.store(key, response, version, batch)
+                    batch.delete(key + ':lock')
+                response['ETag'] = entry['etag']
+                response['Last-Modified'] = http_date(entry['last_modified'])
+                return response
+            except Exception as e:
+                logger.error('写入页面缓存%s失败：%s' % (self.name, e))
+        self.release(key)
+        return response
+
+    def acquire(self, key):
+        return self.cache.add(key + ':lock', 1, self.lock_timeout)
+
+    def release(self, key):
+        try:
+            self.cache.delete(key + ':lock')
+        except Exception as e:
+            logger.error('释放页面缓存%s的渲染锁失败：%s' % (self.name, e))
+
+    def build_response(self, request, entry, status):
+        """
+        由缓存的页面生成响应：浏览器缓存的页面仍然有效时返回304，客户端支持gzip时返回预先压缩的内容
+        """
+        etag = entry.get('etag')
+        compressed = entry.get('gzip')
+        if compressed is not None and re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = http.HttpResponse(compressed, content_type=entry['content_type'])
+            response['Content-Encoding'] = 'gzip'
+            # 与 GZipMiddleware 相同，压缩后的内容使用弱 ETag
+            etag = 'W/' + etag
+        else:
+            response = http.HttpResponse(entry['content'], content_type=entry['content_type'])
+        if self.compress:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response['X-Page-Cache'] = status
+        if etag is None:
+            # 旧版本写入的缓存
+            return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return get_conditional_response(
+            request, etag=etag, last_modified=entry['last_modified'], response=response,
+        )
+
+    def get_or_render(self, request, render):
+        """
+        读取缓存的页面，缺失时调用 render 渲染
+        :param request: 请求对象
+        :param render: 无参函数，返回渲染好的 HttpResponse
+        :return: 响应对象
+        """
+        try:
+            key = self.entry_key(request)
+            entry = self.fetch(key)
+
+            if entry is not None:
+                if time.time() < entry['fresh_until']:
+                    return self.build_response(request, entry, 'hit')
+                # 已过期但仍可用：抢到锁的请求负责重新渲染，其余请求继续使用旧页面
+                if not self.acquire(key):
+                    return self.build_response(request, entry, 'stale')
+            elif not self.acquire(key):
+                # 完全缺失且其他请求正在渲染：等待其渲染完成
+                deadline = time.monotonic() + self.lock_wait
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = self.fetch(key)
+                    if entry is not None:
+                        return self.build_response(request, entry, 'hit')
+                return render()
+        except Exception as e:
+            # 缓存不可用时直接渲染，不影响页面访问
+            logger.error('读取页面缓存%s失败：%s' % (self.name, e))
+            return render()
+
+        return self.render_and_store(key, render)
+
+    def invalidate(self):
+        """页面内容变化时调用，使所有进程中的缓存失效"""
+        try:
+            if not self.cache.add(self.version_key, 1, None):
+                self.cache.incr(self.version_key)
+        except Exception as e:
+            logger.error('使页面缓存%s失效失败：%s' % (self.name, e))
+        self.local.clear()
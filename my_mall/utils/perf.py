@@ -0,0 +1,293 @@
+'''
+请求性能统计
+
+PerformanceMiddleware 对每个请求记录总耗时；按 SAMPLE_RATE 抽样的请求还会记录：
+    数据库查询次数和耗时      （每个数据库连接上的 execute_wrapper）
+    缓存命中/未命中次数        （InstrumentedRedisCache，见 my_mall.utils.cache_backends）
+    等待Redis连接的耗时        （InstrumentedBlockingConnectionPool，见 my_mall.utils.redis_pool）
+    模板渲染耗时              （TimedTemplate，见 my_mall.utils.jinja2_env）
+    响应大小
+抽样请求的明细通过 Server-Timing 响应头返回，浏览器开发者工具中可以直接查看。
+
+所有请求按视图汇总到进程内的直方图中，每隔 DUMP_INTERVAL 秒写入 DUMP_DIR/perf-<pid>.json，
+进程退出时删除自己的文件，第一次写入时清理已退出的进程留下的文件。
+/perf/metrics/ 返回当前进程的统计：配置了 METRICS_TOKEN 时需要在请求头 X-Metrics-Token 中带上该值，
+否则只允许 INTERNAL_IPS 访问（部署在nginx之后时所有请求都来自127.0.0.1，生产环境必须使用 METRICS_TOKEN）。
+
+配置项 PERFORMANCE：
+    SAMPLE_RATE:     记录明细的请求比例
+    SERVER_TIMING:   是否为抽样请求添加 Server-Timing 响应头
+    SLOW_REQUEST_MS: 超过该耗时的请求记录到日志中
+    DUMP_DIR:        统计文件的目录，None 表示不写文件
+    DUMP_INTERVAL:   写统计文件的间隔（秒）
+    METRICS_TOKEN:   访问 /perf/metrics/ 的令牌，None 表示按 INTERNAL_IPS 判断，空字符串表示关闭
+'''
+import atexit
+import bisect
+import contextvars
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+
+from django import http
+from django.conf import settings
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.1,
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': 500,
+    'DUMP_DIR': None,
+    'DUMP_INTERVAL': 60,
+    'METRICS_TOKEN': None,
+}
+
+# 当前请求的明细，未抽样的请求为 None；run_sync 和 sync_to_async 会把它带到线程池中
+current_metrics = contextvars.ContextVar('perf_metrics', default=None)
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'PERFORMANCE', {}))
+
+
+class RequestMetrics(object):
+    """单个抽样请求的明细"""
+    __slots__ = ('db_count', 'db_time', 'cache', 'template_count', 'template_time', 'pool_wait')
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_time = 0.0
+        self.cache = {}  # {缓存别名: [命中次数, 未命中次数]}
+        self.template_count = 0
+        self.template_time = 0.0
+        self.pool_wait = 0.0
+
+    def server_timing(self, wall_time):
+        """
+        生成 Server-Timing 响应头
+        :param wall_time: 请求总耗时（秒）
+        """
+        parts = [
+            'app;dur=%.2f' % (wall_time * 1000),
+            'db;dur=%.2f;desc="%d queries"' % (self.db_time * 1000, self.db_count),
+        ]
+        if self.template_count:
+            parts.append('tpl;dur=%.2f' % (self.template_time * 1000))
+        if self.pool_wait:
+            parts.append('redis-pool;dur=%.2f' % (self.pool_wait * 1000))
+        for alias, (hits, misses) in sorted(self.cache.items()):
+            parts.append('cache-%s;desc="hit=%d miss=%d"' % (alias, hits, misses))
+        return ', '.join(parts)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """记录抽样请求的数据库查询次数和耗时"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_count += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_db_wrapper(sender=None, connection=None, **kwargs):
+    """connection_created 信号：为每个新建的数据库连接安装 execute_wrapper"""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def record_cache(alias, hits, misses):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        counts = metrics.cache.setdefault(alias, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+def record_pool_wait(elapsed):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.pool_wait += elapsed
+
+
+def record_template(elapsed):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.template_count += 1
+        metrics.template_time += elapsed
+
+
+class Histogram(object):
+    """按固定的毫秒区间统计耗时分布"""
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+
+    def quantile(self, q):
+        """
+        估算分位数
+        :return: 分位数所在区间的上界（毫秒），超过最大区间时返回 None
+        """
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count, 3) if self.count else 0,
+            'p50_ms': self.quantile(0.5),
+            'p99_ms': self.quantile(0.99),
+            'buckets': dict(zip(['le_%d' % bound for bound in self.BOUNDS] + ['inf'], self.buckets)),
+        }
+
+
+class ViewStats(object):
+    """单个视图的汇总统计"""
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.sampled = 0
+        self.db_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.pool_wait = 0.0
+        self.cache = {}
+        self.response_bytes = 0
+
+    def add(self, wall_ms, metrics, size):
+        self.wall.add(wall_ms)
+        self.response_bytes += size
+        if metrics is not None:
+            self.sampled += 1
+            self.db_count += metrics.db_count
+            self.db_time += metrics.db_time
+            self.template_time += metrics.template_time
+            self.pool_wait += metrics.pool_wait
+            for alias, (hits, misses) in metrics.cache.items():
+                counts = self.cache.setdefault(alias, [0, 0])
+                counts[0] += hits
+                counts[1] += misses
+
+    def to_dict(self):
+        sampled = self.sampled or 1
+        return {
+            'wall': self.wall.to_dict(),
+            'sampled': self.sampled,
+            'db_queries_per_request': round(self.db_count / sampled, 2),
+            'db_ms_per_request': round(self.db_time * 1000 / sampled, 3),
+            'template_ms_per_request': round(self.template_time * 1000 / sampled, 3),
+            'redis_pool_wait_ms_per_request': round(self.pool_wait * 1000 / sampled, 3),
+            'cache': {alias: {'hits': hits, 'misses': misses} for alias, (hits, misses) in self.cache.items()},
+            'response_bytes_per_request': self.response_bytes // (self.wall.count or 1),
+        }
+
+
+class Collector(object):
+    """进程内按视图汇总的统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+        self.started = time.time()
+        self.next_dump = time.monotonic()
+        self.dump_path = None
+
+    def record(self, view, wall_ms, metrics, size):
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            stats.add(wall_ms, metrics, size)
+
+    def snapshot(self):
+        from . import redis_pool
+
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started': self.started,
+                'time': time.time(),
+                'views': {view: stats.to_dict() for view, stats in self.views.items()},
+                'redis_pools': redis_pool.snapshot(),
+            }
+
+    def maybe_dump(self, directory, interval):
+        """到达间隔时，将统计写入 directory/perf-<pid>.json"""
+        if not directory or time.monotonic() < self.next_dump:
+            return
+        self.next_dump = time.monotonic() + interval
+        path = os.path.join(directory, 'perf-%d.json' % os.getpid())
+        if self.dump_path != path:
+            # 本进程第一次写入（fork 出的子进程 pid 不同）：清理已退出的进程的文件，退出时删除自己的文件
+            self.dump_path = path
+            prune_dumps(directory)
+            atexit.register(self.remove_dump, path)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def remove_dump(self, path):
+        if path == self.dump_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def prune_dumps(directory):
+    """删除已退出的进程留下的 perf-<pid>.json（worker 被重启、被杀死时没有机会删除）"""
+    for path in glob.glob(os.path.join(directory, 'perf-*.json')):
+        pid = os.path.basename(path)[len('perf-'):-len('.json')]
+        if pid.isdigit() and not pid_alive(int(pid)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+collector = Collector()
+
+
+def metrics_view(request):
+    """
+    返回当前进程的统计，访问控制见 PERFORMANCE['METRICS_TOKEN']
+    :param request: 请求对象
+    :return: JSON
+    """
+    token = get_options()['METRICS_TOKEN']
+    if token is None:
+        allowed = request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    else:
+        allowed = bool(token) and hmac.compare_digest(
+            request.META.get('HTTP_X_METRICS_TOKEN', '').encode(), token.encode())
+    if not allowed:
+        raise http.Http404()
+    return http.JsonResponse(collector.snapshot())
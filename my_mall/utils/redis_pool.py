@@ -0,0 +1,170 @@
+'''
+Redis连接池与批量读写
+
+(1) InstrumentedBlockingConnectionPool：有上限的阻塞连接池。连接全部被占用时等待空闲连接，
+    而不是像默认的 ConnectionPool 那样不断新建连接，流量突增时每个进程到每个Redis库的连接数不超过 max_connections。
+    等待时间计入请求的性能统计（Server-Timing 中的 redis-pool），各连接池的汇总见 /perf/metrics/。
+    在 CACHES 的 OPTIONS 中配置：
+        "CONNECTION_POOL_CLASS": "my_mall.utils.redis_pool.InstrumentedBlockingConnectionPool",
+        "CONNECTION_POOL_KWARGS": {"max_connections": 50, "timeout": 2},
+(2) RedisBatch：把一个请求中相互独立的多次缓存读写放到一个pipeline中，只占用一次连接、一次网络往返。
+'''
+import threading
+import time
+import weakref
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from redis import BlockingConnectionPool
+from redis.exceptions import ConnectionError
+
+from . import perf
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:
+    RedisCache = None
+
+# 进程中所有的连接池，用于汇总统计
+_pools = weakref.WeakSet()
+
+
+class InstrumentedBlockingConnectionPool(BlockingConnectionPool):
+    """统计等待空闲连接耗时的 BlockingConnectionPool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.wait = perf.Histogram()
+        self.wait_max = 0.0
+        self.timeouts = 0
+        _pools.add(self)
+
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().get_connection(*args, **kwargs)
+        except ConnectionError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            perf.record_pool_wait(elapsed)
+            with self.stats_lock:
+                self.wait.add(elapsed * 1000)
+                self.wait_max = max(self.wait_max, elapsed)
+
+    def snapshot(self):
+        kwargs = self.connection_kwargs
+        with self.stats_lock:
+            return {
+                'location': '%s:%s/%s' % (kwargs.get('host'), kwargs.get('port'), kwargs.get('db')),
+                'max_connections': self.max_connections,
+                'connections': len(self._connections),
+                'timeouts': self.timeouts,
+                'wait': self.wait.to_dict(),
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+
+def snapshot():
+    """当前进程中各连接池的统计"""
+    return [pool.snapshot() for pool in list(_pools)]
+
+
+class BatchResult(object):
+    """批量操作中单个命令的结果，执行后才能读取 value"""
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+
+class RedisBatch(object):
+    """
+    在一个pipeline中执行多个缓存读写：
+        with RedisBatch('default') as batch:
+            user = batch.get('user:pk:1')
+            batch.set('page:index:/', entry, 300)
+            batch.delete('page:index:/:lock')
+        user.value
+    键和值的处理（前缀、版本、序列化）与 caches[alias] 一致；不是 django_redis 缓存时（如进程内缓存）逐条执行。
+    pipeline 不是事务，命令之间不能相互依赖。
+    :param alias: Django缓存别名
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.cache = caches[alias]
+        self.pipeline = None
+        if RedisCache is not None and isinstance(self.cache, RedisCache):
+            self.pipeline = self.cache.client.get_client(write=True).pipeline(transaction=False)
+        self._pending = []  # [(结果, 处理返回值的函数)]
+
+    def _queue(self, convert):
+        result = BatchResult()
+        self._pending.append((result, convert))
+        return result
+
+    def get(self, key, default=None, version=None):
+        if self.pipeline is None:
+            return BatchResult(self.cache.get(key, default, version=version))
+        client = self.cache.client
+        self.pipeline.get(client.make_key(key, version=version))
+
+        def convert(reply):
+            perf.record_cache(self.alias, int(reply is not None), int(reply is None))
+            return default if reply is None else client.decode(reply)
+
+        return self._queue(convert)
+
+    def get_many(self, keys, version=None):
+        """:return: 结果为 {key: value}，只包含存在的key"""
+        keys = list(keys)
+        if self.pipeline is None:
+            return BatchResult(self.cache.get_many(keys, version=version))
+        client = self.cache.client
+        self.pipeline.mget([client.make_key(key, version=version) for key in keys])
+
+        def convert(replies):
+            values = {key: client.decode(reply) for key, reply in zip(keys, replies) if reply is not None}
+            perf.record_cache(self.alias, len(values), len(keys) - len(values))
+            return values
+
+        return self._queue(convert)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, nx=False):
+        if self.pipeline is None:
+            if nx:
+                return BatchResult(self.cache.add(key, value, timeout, version=version))
+            return BatchResult(self.cache.set(key, value, timeout, version=version))
+        self.cache.client.set(key, value, timeout, version=version, client=self.pipeline, nx=nx)
+        return self._queue(bool)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.set(key, value, timeout, version=version, nx=True)
+
+    def delete(self, key, version=None):
+        if self.pipeline is None:
+            return BatchResult(self.cache.delete(key, version=version))
+        self.cache.client.delete(key, version=version, client=self.pipeline)
+        return self._queue(bool)
+
+    def execute(self):
+        """执行已加入的命令，并填充各个结果"""
+        pending, self._pending = self._pending, []
+        if self.pipeline is None or not pending:
+            return
+        replies = self.pipeline.execute()
+        for (result, convert), reply in zip(pending, replies):
+            result.value = convert(reply)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        elif self.pipeline is not None:
+            self.pipeline.reset()
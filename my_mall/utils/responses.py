@@ -0,0 +1,19 @@
+'''
+公共的JSON响应
+'''
+from django import http
+
+from .response_code import RETCODE, err_msg
+
+
+def throttled_response(retry_after=1):
+    """
+    访问过于频繁/服务繁忙时的响应
+    :param retry_after: 建议客户端等待的秒数
+    :return: JSON，状态码429
+    """
+    response = http.JsonResponse(
+        {'code': RETCODE.THROTTLINGERR, 'errmsg': err_msg[RETCODE.THROTTLINGERR]}, status=429
+    )
+    response['Retry-After'] = str(int(retry_after))
+    return response
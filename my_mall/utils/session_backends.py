@@ -0,0 +1,194 @@
+'''
+紧凑的session存储
+
+在 django.contrib.sessions.backends.cache 的基础上：
+(1) session数据用 msgpack（未安装时用紧凑的JSON）序列化后保存，而不是pickle整个字典；
+(2) 只包含登录状态（用户id、认证后端、密码哈希摘要、有效期）的session不写Redis，
+    而是签名后直接作为session_key保存在cookie中（以 COOKIE_KEY_PREFIX 开头），
+    已登录用户的请求读取session时不需要访问Redis；
+(3) 写入已存在的session时使用 SET XX，省去原实现中先 GET 判断是否存在的一次往返；
+    新建session时不再先检查随机key是否已存在（SET NX 本身就能发现冲突），
+    登录时更换session_key，新session的写入和旧session的删除在一个pipeline中完成。
+session本身就是懒加载的：只有访问 request.session / request.user 时才读取，没有session cookie的匿名请求不会访问Redis。
+
+签名cookie模式下服务端无法主动作废session：退出登录只能清除浏览器的cookie，
+修改密码后 _auth_user_hash 不再匹配，Django认证中间件会让旧的cookie失效。
+
+配置项 SESSION_STORE：
+    SIGNED_COOKIE: 是否将只含登录状态的session签名保存在cookie中
+'''
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import VALID_KEY_CHARS, CreateError, UpdateError
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.core import signing
+from django.utils.crypto import get_random_string
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:
+    RedisCache = None
+
+from .redis_pool import RedisBatch
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'SIGNED_COOKIE': True,
+}
+
+# 签名cookie模式的session_key前缀，随机生成的session_key中不含'.'
+COOKIE_KEY_PREFIX = 'c.'
+
+# 可以保存在签名cookie中的session键
+COOKIE_SESSION_KEYS = frozenset(['_auth_user_id', '_auth_user_backend', '_auth_user_hash', '_session_expiry'])
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'SESSION_STORE', {}))
+
+
+class CompactSerializer(object):
+    """
+    session序列化：第一个字节标明格式，更换序列化方式后已有的session仍然可以读取
+    """
+    MSGPACK = b'm'
+    JSON = b'j'
+
+    def dumps(self, obj):
+        if msgpack is not None:
+            return self.MSGPACK + msgpack.packb(obj, use_bin_type=True)
+        return self.JSON + json.dumps(obj, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        fmt, payload = data[:1], data[1:]
+        if fmt == self.MSGPACK:
+            if msgpack is None:
+                raise ValueError('session使用msgpack序列化，但没有安装msgpack')
+            return msgpack.unpackb(payload, raw=False)
+        if fmt == self.JSON:
+            return json.loads(payload.decode('latin-1'))
+        raise ValueError('无法识别的session格式')
+
+
+serializer = CompactSerializer()
+
+
+class SessionStore(CacheSessionStore):
+    """紧凑的session存储，通过 SESSION_ENGINE = 'my_mall.utils.session_backends' 使用"""
+    cookie_salt = 'my_mall.utils.session_backends'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self.signed_cookie = get_options()['SIGNED_COOKIE']
+
+    @staticmethod
+    def is_cookie_key(session_key):
+        return bool(session_key) and session_key.startswith(COOKIE_KEY_PREFIX)
+
+    def load(self):
+        session_key = self.session_key
+        if self.is_cookie_key(session_key):
+            try:
+                return signing.loads(
+                    session_key[len(COOKIE_KEY_PREFIX):], salt=self.cookie_salt,
+                    serializer=CompactSerializer, max_age=settings.SESSION_COOKIE_AGE,
+                )
+            except (signing.BadSignature, ValueError):
+                # 签名错误或已过期，开始新的session
+                self._session_key = None
+                return {}
+
+        try:
+            session_data = self._cache.get(self.cache_key)
+        except Exception:
+            session_data = None
+        if isinstance(session_data, dict):
+            # 切换存储方式之前由 django.contrib.sessions.backends.cache 保存的session
+            return session_data
+        if session_data is not None:
+            try:
+                return serializer.loads(session_data)
+            except Exception as e:
+                logger.warning('无法解析session数据：%s', e)
+        self._session_key = None
+        return {}
+
+    def in_cookie(self, data):
+        return self.signed_cookie and COOKIE_SESSION_KEYS.issuperset(data)
+
+    def create(self):
+        # 保存在cookie中的session不需要生成随机key，也就不需要到Redis中检查key是否已被占用
+        if self.in_cookie(self._get_session(no_load=True)):
+            self.save(must_create=True)
+            self.modified = True
+            return
+        super().create()
+
+    def _get_new_session_key(self):
+        # 32位随机key几乎不可能冲突，冲突时 save(must_create=True) 中的 add 会失败并重新生成
+        return get_random_string(32, VALID_KEY_CHARS)
+
+    def cycle_key(self):
+        data = self._session
+        old_key = self.session_key
+        if self.in_cookie(data) or not old_key or self.is_cookie_key(old_key):
+            return super().cycle_key()
+        # 新旧session都在Redis中
+        with RedisBatch(settings.SESSION_CACHE_ALIAS) as batch:
+            self._session_key = self._get_new_session_key()
+            created = batch.add(self.cache_key, serializer.dumps(data), self.get_expiry_age())
+            batch.delete(self.cache_key_prefix + old_key)
+        if not created.value:
+            self.create()
+        self.modified = True
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        if self.in_cookie(data):
+            old_key = self.session_key
+            self._session_key = COOKIE_KEY_PREFIX + signing.dumps(
+                data, salt=self.cookie_salt, serializer=CompactSerializer, compress=True,
+            )
+            # 原来保存在Redis中的session（create() 中新生成的随机key还没有写入，不需要删除）
+            if old_key and not must_create and not self.is_cookie_key(old_key):
+                self._cache.delete(self.cache_key_prefix + old_key)
+            return
+
+        if self.session_key is None or self.is_cookie_key(self.session_key):
+            # session中有了登录状态以外的数据，改为保存到Redis中
+            return self.create()
+
+        value = serializer.dumps(data)
+        timeout = self.get_expiry_age()
+        if must_create:
+            if not self._cache.add(self.cache_key, value, timeout):
+                raise CreateError
+        elif RedisCache is not None and isinstance(self._cache, RedisCache):
+            # SET XX：只在session仍然存在时写入，一次往返
+            if not self._cache.set(self.cache_key, value, timeout, xx=True):
+                raise UpdateError
+        elif self._cache.get(self.cache_key) is not None:
+            self._cache.set(self.cache_key, value, timeout)
+        else:
+            raise UpdateError
+
+    def exists(self, session_key):
+        if self.is_cookie_key(session_key):
+            return False
+        return super().exists(session_key)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        # 签名cookie中的session在服务端没有数据
+        if session_key is None or self.is_cookie_key(session_key):
+            return
+        self._cache.delete(self.cache_key_prefix + session_key)
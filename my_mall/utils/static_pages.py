@@ -0,0 +1,185 @@
+'''
+页面静态化：把与用户无关的页面渲染成HTML文件，由前置的nginx直接返回，请求不再进入Django
+
+    location = / {
+        root /srv/my_mall/static_pages;
+        try_files /index.html @django;   # 文件不存在时才转发给Django
+        gzip_static on;                  # 使用预先压缩的 index.html.gz
+    }
+
+生成：
+(1) python manage.py generate_index（首页），发布新模板或执行 collectstatic 之后运行（页面中引用带哈希的静态文件）；
+(2) 内容变化时调用 StaticPage.schedule()，DEBOUNCE 秒内的多次变化只在最后一次之后生成一次，
+    由后台线程（threading.Timer）完成，不阻塞调用者。
+写入时先写同目录下的临时文件再 os.replace()，nginx 和其他进程不会读到写了一半的文件。
+
+文件不存在或过期时请求仍会转发给Django，视图通过 StaticPage.serve() 直接返回文件内容（按修改时间在进程内缓存），
+读不到文件时再走原来的页面缓存和模板渲染。
+'''
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from django import http
+from django.conf import settings
+from django.middleware.gzip import re_accepts_gzip
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'PATH': None, # 生成的HTML文件
+    'DEBOUNCE': 2, # 内容变化后等待的时间（秒），期间的多次变化只生成一次
+    'COMPRESS': True, # 同时生成 .gz 文件，供 nginx 的 gzip_static 使用
+    'SERVE': True, # 视图是否直接返回已生成的文件
+}
+
+
+def get_options(name):
+    return dict(DEFAULTS, **getattr(settings, 'STATIC_PAGES', {}).get(name, {}))
+
+
+def write_atomic(path, content):
+    """先写入同目录下的临时文件，再用 os.replace() 替换，读者只会看到旧文件或完整的新文件"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class StaticPage(object):
+    """一个静态化的页面"""
+
+    def __init__(self, name, template_name, context=None):
+        """
+        :param name: 页面名称，配置见 settings.STATIC_PAGES[name]
+        :param template_name: 模板
+        :param context: 无参函数，返回模板的上下文
+        """
+        self.name = name
+        self.template_name = template_name
+        self.context = context
+        options = get_options(name)
+        self.path = options['PATH']
+        self.debounce = options['DEBOUNCE']
+        self.compress = options['COMPRESS']
+        self.serve_file = options['SERVE'] and self.path is not None
+        self._timer = None
+        self._lock = threading.Lock()
+        # 进程内缓存的文件内容：(修改时间, 大小, 条目)
+        self._loaded = None
+
+    def render(self):
+        """不带请求渲染模板：页面中不能有与用户相关的内容（用户名等由前端从cookie中读取）"""
+        return render_to_string(self.template_name, self.context() if self.context else None).encode()
+
+    def generate(self):
+        """
+        渲染并写入文件
+        :return: 写入的字节数
+        """
+        content = self.render()
+        if self.compress:
+            # 先写 .gz，nginx 看到新的 .html 时对应的 .gz 一定已经是新的
+            write_atomic(self.path + '.gz', gzip.compress(content, 9, mtime=0))
+        write_atomic(self.path, content)
+        logger.info('静态页面%s已生成：%s，%d字节' % (self.name, self.path, len(content)))
+        return len(content)
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.generate()
+        except Exception as e:
+            logger.error('生成静态页面%s失败：%s' % (self.name, e))
+
+    def schedule(self, delay=None):
+        """DEBOUNCE 秒后在后台线程中重新生成，期间再次调用会重新计时"""
+        if self.path is None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce if delay is None else delay, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def load(self):
+        """
+        读取已生成的文件，文件未变化时使用进程内的副本
+        :return: 条目，文件不存在时返回 None
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        loaded = self._loaded
+        if loaded is not None and loaded[0] == stat.st_mtime_ns and loaded[1] == stat.st_size:
+            return loaded[2]
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        compressed = None
+        if self.compress:
+            # generate() 先写 .gz 再写 .html，读到新的 .html 时 .gz 也是新的
+            try:
+                with open(self.path + '.gz', 'rb') as f:
+                    compressed = f.read()
+            except OSError:
+                compressed = gzip.compress(content, 6)
+        entry = {
+            'content': content,
+            'gzip': compressed,
+            'etag': quote_etag(hashlib.md5(content).hexdigest()),
+            'last_modified': int(stat.st_mtime),
+        }
+        self._loaded = (stat.st_mtime_ns, stat.st_size, entry)
+        return entry
+
+    def serve(self, request):
+        """
+        返回已生成的页面，处理条件请求和gzip
+        :return: 响应，没有生成过或 SERVE 为 False 时返回 None
+        """
+        if not self.serve_file:
+            return None
+        entry = self.load()
+        if entry is None:
+            return None
+        etag = entry['etag']
+        if entry['gzip'] is not None and re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = http.HttpResponse(entry['gzip'])
+            response['Content-Encoding'] = 'gzip'
+            etag = 'W/' + etag
+        else:
+            response = http.HttpResponse(entry['content'])
+        if self.compress:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response['X-Page-Cache'] = 'static'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return get_conditional_response(request, etag=etag, last_modified=entry['last_modified'], response=response)
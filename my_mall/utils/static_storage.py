@@ -0,0 +1,229 @@
+'''
+静态文件的构建与发布
+
+CompressedManifestStaticFilesStorage 在 collectstatic 时：
+(1) 压缩JS/CSS（需要安装 rjsmin / rcssmin，未安装时跳过），已经是 .min.js / .min.css 的文件不再处理；
+(2) 按 BUNDLES 把多个文件合并为一个，减少页面的请求数；
+(3) 由 ManifestStaticFilesStorage 生成带内容哈希的文件名和 staticfiles.json；
+(4) 为文本类文件预先生成 .gz 和 .br（需要安装 brotli）版本。
+模板中的 static() 从进程内的清单解析地址，结果缓存在内存中；static_bundle() 在 DEBUG 时返回合并前的各个文件。
+
+没有 nginx 等前置服务器时，可以打开 SERVE，由 serve_static 视图按 Accept-Encoding 返回预压缩的文件，
+带哈希的文件名内容不会变化，响应 Cache-Control: immutable，浏览器不再重新验证。
+
+配置项 STATIC_ASSETS：
+    MINIFY:   是否压缩JS/CSS
+    COMPRESS: 预压缩的格式，'gzip'、'br'
+    BUNDLES:  {合并后的文件: [合并前的文件, ...]}
+    SERVE:    是否由Django提供 STATIC_URL 下的文件
+    MAX_AGE:  带哈希的文件的缓存时间（秒）
+'''
+import gzip
+import logging
+import mimetypes
+import os
+import posixpath
+
+from django import http
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'MINIFY': True,
+    'COMPRESS': ('gzip', 'br'),
+    'BUNDLES': {},
+    'SERVE': False,
+    'MAX_AGE': 365 * 24 * 3600,
+}
+
+# 预压缩的文件类型，图片等已压缩的格式不再处理
+COMPRESS_EXTENSIONS = ('.js', '.css', '.svg', '.html', '.txt', '.json', '.ico')
+
+# 小于该字节数的文件不值得压缩
+COMPRESS_MIN_SIZE = 256
+
+# 内容编码 -> 预压缩文件的后缀，按优先级排列
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'STATIC_ASSETS', {}))
+
+
+def minify(name, content):
+    """
+    压缩JS/CSS
+    :return: 压缩后的内容，不需要或无法压缩时返回 None
+    """
+    if '.min.' in name:
+        return None
+    if name.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(content)
+    if name.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(content)
+    return None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """压缩、合并、带哈希文件名并预压缩的静态文件存储"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._urls = {}
+
+    def load_manifest(self):
+        hashed_files = super().load_manifest()
+        # 带哈希的文件名集合，serve_static 据此判断是否返回 immutable，不必每个请求遍历清单
+        self.hashed_names = frozenset(hashed_files.values())
+        return hashed_files
+
+    def read_text(self, name):
+        with self.open(name) as f:
+            return f.read().decode('utf-8')
+
+    def write(self, name, content):
+        """直接覆盖 STATIC_ROOT 中的文件（Storage.save 遇到同名文件会改名）"""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        assets = get_options()
+
+        if assets['MINIFY']:
+            if rjsmin is None or rcssmin is None:
+                logger.warning('没有安装 rjsmin/rcssmin，跳过JS/CSS压缩')
+            for name in list(paths):
+                if name.endswith(('.js', '.css')):
+                    minified = minify(name, self.read_text(name))
+                    if minified is not None:
+                        self.write(name, minified.encode('utf-8'))
+                        # 生成哈希文件名时读取 STATIC_ROOT 中压缩后的文件，而不是源文件
+                        paths[name] = (self, name)
+
+        for bundle, members in assets['BUNDLES'].items():
+            separator = '\n;\n' if bundle.endswith('.js') else '\n'
+            content = separator.join(self.read_text(member) for member in members)
+            self.write(bundle, content.encode('utf-8'))
+            paths[bundle] = (self, bundle)
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+        self.hashed_names = frozenset(self.hashed_files.values())
+        for hashed_name in self.hashed_names:
+            self.compress(hashed_name, assets['COMPRESS'])
+
+    def compress(self, name, encodings):
+        """为文本类文件生成 .gz/.br，压缩后没有变小时不保存"""
+        if not name.endswith(COMPRESS_EXTENSIONS):
+            return
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        for encoding, suffix in ENCODINGS:
+            if encoding not in encodings:
+                continue
+            if encoding == 'gzip':
+                compressed = gzip.compress(content, 9, mtime=0)
+            elif brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+            else:
+                continue
+            if len(compressed) < len(content):
+                self.write(name + suffix, compressed)
+
+    def url(self, name, force=False):
+        # 清单在进程启动时已经加载，同一个文件的地址只解析一次
+        if settings.DEBUG or force:
+            return super().url(name, force)
+        try:
+            return self._urls[name]
+        except KeyError:
+            url = self._urls[name] = super().url(name)
+            return url
+
+
+def static_bundle(name):
+    """
+    模板中引用合并后的文件：{% for src in static_bundle('js/vendor.js') %}...{% endfor %}
+    :return: DEBUG 时为合并前各个文件的地址，否则为合并后文件的地址
+    """
+    bundles = get_options()['BUNDLES']
+    if settings.DEBUG and name in bundles:
+        return [staticfiles_storage.url(member) for member in bundles[name]]
+    return [staticfiles_storage.url(name)]
+
+
+def accepted_encodings(request):
+    """:return: 客户端接受的内容编码"""
+    encodings = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        encoding, _, params = item.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def serve_static(request, path):
+    """
+    提供 STATIC_ROOT 中的文件：优先返回客户端接受的预压缩版本，带哈希的文件名返回 immutable
+    :param request: 请求对象
+    :param path: STATIC_URL 之后的路径
+    :return: FileResponse
+    """
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, name)
+    except Exception:
+        raise http.Http404()
+    if not os.path.isfile(full_path):
+        raise http.Http404()
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    file_path, content_encoding = full_path, None
+    accepted = accepted_encodings(request)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            file_path, content_encoding = full_path + suffix, encoding
+            break
+
+    stat = os.stat(file_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size):
+        response = http.HttpResponseNotModified()
+    else:
+        response = http.FileResponse(open(file_path, 'rb'), content_type=content_type)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+
+    if name in getattr(staticfiles_storage, 'hashed_names', ()):
+        response['Cache-Control'] = 'public, max-age=%d, immutable' % get_options()['MAX_AGE']
+    else:
+        # 未带哈希的文件名内容可能变化
+        response['Cache-Control'] = 'public, max-age=60'
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,169 @@
+'''
+流式渲染与条件请求
+
+stream_template() 使用 Jinja2 的 generate() 逐段生成页面，由 StreamingHttpResponse 边渲染边发送：
+(1) <head>（样式表、脚本的地址）在视图中先渲染好，作为第一个数据块立即发送，
+    浏览器下载静态文件的同时服务器继续渲染 <body>；head 中的模板错误仍然返回500；
+(2) 之后的内容合并到 CHUNK_SIZE 再发送，避免大量很小的写操作。
+
+响应头在视图返回时就已确定，中间件的 process_response 先于 <body> 的渲染执行：
+<body> 中不能再修改 session；用到 csrf_input 或由前端读取 csrftoken cookie 的页面需要 csrf=True（默认），预先生成CSRF令牌和cookie。
+渲染 <body> 的耗时不计入 perf 的模板耗时。
+
+TemplateValidators 根据模板文件和静态文件清单的修改时间计算 ETag/Last-Modified，
+配合 django.views.decorators.http.condition 使用：浏览器缓存的页面仍然有效时直接返回304，不再渲染模板。
+文件路径只解析一次；与 Jinja2 的 auto_reload 一致，关闭自动重新加载（生产环境）时修改时间只读取一次，
+打开时（DEBUG）最多每 STAT_INTERVAL 秒重新读取一次。
+'''
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from django import http
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.middleware.csrf import get_token
+from django.template import loader
+from django.template.backends.utils import csrf_input_lazy, csrf_token_lazy
+
+from . import perf
+
+logger = logging.getLogger('django')
+
+# 第一个数据块在该标签之后结束
+HEAD_END = '</head>'
+
+# 之后每个数据块的最小字节数
+CHUNK_SIZE = 16 * 1024
+
+# 模板自动重新加载时，两次读取文件修改时间的最小间隔（秒）
+STAT_INTERVAL = 1
+
+
+def render_head(chunks):
+    """
+    渲染到 </head> 为止
+    :param chunks: Jinja2 generate() 返回的生成器
+    :return: head 部分的字节串；模板中没有 </head> 时为整个页面
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        if HEAD_END in chunk:
+            break
+    return ''.join(parts).encode('utf-8')
+
+
+def buffered(head, chunks, template_name):
+    """先发送 head，之后的内容按 CHUNK_SIZE 合并后发送"""
+    yield head
+    parts, size = [], 0
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= CHUNK_SIZE:
+                yield ''.join(parts).encode('utf-8')
+                parts, size = [], 0
+    except Exception:
+        # 响应头已经发出，只能中断连接
+        logger.exception('流式渲染模板%s失败' % template_name)
+        raise
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+def stream_template(request, template_name, context=None, content_type=None, status=None, using=None, csrf=True):
+    """
+    流式渲染模板，参数与 django.shortcuts.render 相同
+    :param csrf: 页面中是否用到CSRF令牌，是则在发送响应头之前生成令牌
+    :return: StreamingHttpResponse；不是 Jinja2 模板时退化为 HttpResponse
+    """
+    template = loader.get_template(template_name, using=using)
+    jinja_template = getattr(template, 'template', None)
+    if not hasattr(jinja_template, 'generate'):
+        return http.HttpResponse(template.render(context, request), content_type, status)
+
+    # 与 django.template.backends.jinja2.Template.render 相同的模板上下文
+    context = dict(context or {})
+    if request is not None:
+        context['request'] = request
+        context['csrf_input'] = csrf_input_lazy(request)
+        context['csrf_token'] = csrf_token_lazy(request)
+        for context_processor in template.backend.template_context_processors:
+            context.update(context_processor(request))
+        if csrf:
+            get_token(request)
+
+    started = time.perf_counter()
+    chunks = jinja_template.generate(context)
+    head = render_head(chunks)
+    perf.record_template(time.perf_counter() - started)
+    return http.StreamingHttpResponse(buffered(head, chunks, template_name), content_type, status)
+
+
+class TemplateValidators(object):
+    """
+    页面的 ETag/Last-Modified：模板文件或静态文件清单（collectstatic 后静态文件的地址会变化）修改后随之变化
+    模板中的数据不参与计算，只适用于内容由模板本身决定的页面（数据由前端异步加载）；不检查被继承/包含的模板
+    """
+
+    def __init__(self, template_name, key_func=None, using=None):
+        """
+        :param template_name: 模板名称
+        :param key_func: key_func(request)，ETag 中按请求变化的部分（如用户id），返回 None 表示不使用条件请求
+        """
+        self.template_name = template_name
+        self.key_func = key_func
+        self.using = using
+        # (文件路径列表, 是否自动重新加载)，第一次请求时解析
+        self._sources = None
+        # (读取时间, 修改时间和大小列表)
+        self._stats = None
+
+    def source_paths(self):
+        """:return: (模板文件和静态文件清单的路径, 模板是否自动重新加载)"""
+        template = loader.get_template(self.template_name, using=self.using)
+        env = getattr(template.backend, 'env', None)
+        auto_reload = env.auto_reload if env is not None else settings.DEBUG
+        paths = [template.origin.name]
+        manifest_name = getattr(staticfiles_storage, 'manifest_name', None)
+        if manifest_name:
+            paths.append(staticfiles_storage.path(manifest_name))
+        return [path for path in paths if path], auto_reload
+
+    def stats(self):
+        now = time.monotonic()
+        if self._sources is None:
+            self._sources = self.source_paths()
+        paths, auto_reload = self._sources
+        if self._stats is not None:
+            checked_at, result = self._stats
+            if not auto_reload or now - checked_at < STAT_INTERVAL:
+                return result
+        result = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            result.append((stat.st_mtime, stat.st_size))
+        self._stats = (now, result)
+        return result
+
+    def etag(self, request, *args, **kwargs):
+        key = self.key_func(request) if self.key_func is not None else ''
+        if key is None:
+            return None
+        digest = hashlib.md5(repr((self.template_name, key, self.stats())).encode('utf-8')).hexdigest()
+        return digest[:16]
+
+    def last_modified(self, request, *args, **kwargs):
+        if self.key_func is not None and self.key_func(request) is None:
+            return None
+        stats = self.stats()
+        if not stats:
+            return None
+        return datetime.fromtimestamp(int(max(mtime for mtime, size in stats)), timezone.utc)
@@ -0,0 +1,228 @@
+'''
+访问频率限制（滑动窗口）
+
+每个限流范围（scope）配置一个频率，如 '10/m' 表示每个客户端每分钟最多10次。
+计数保存在 Redis 的有序集合中，检查与计数在一个 Lua 脚本中原子地完成，只需一次往返；
+Redis 不可用时退化为进程内的滑动窗口，限流仍然有效，只是各进程分别计数。
+
+配置项 THROTTLING：
+    CACHE_ALIAS:          保存计数的 django_redis 缓存别名
+    RATES:                {scope: '次数/周期'}，周期为 s/m/h/d，None 表示不限制
+    USE_X_FORWARDED_FOR:  部署在反向代理之后时，用 X-Forwarded-For 中的第一个地址识别客户端
+
+使用：
+    class LoginView(ThrottleMixin, View):
+        throttle_scope = 'login'
+        throttle_methods = ('POST',)
+'''
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from functools import wraps
+
+from django.conf import settings
+
+from .aio import run_sync
+from .responses import throttled_response
+
+logger = logging.getLogger('django')
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'RATES': {},
+    'USE_X_FORWARDED_FOR': False,
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS[1]: 计数键；ARGV: 当前时间(ms)、窗口长度(ms)、次数上限、本次请求的唯一标识
+# 返回 {是否允许, 需要等待的毫秒数}
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, 0}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, tonumber(oldest[2]) + window - now}
+"""
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'THROTTLING', {}))
+
+
+def parse_rate(rate):
+    """
+    解析频率
+    :param rate: 如 '10/m'
+    :return: (次数, 周期秒数)，rate 为 None 时返回 None
+    """
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+# 进程内计数清理过期客户端的间隔（秒）
+LOCAL_PURGE_INTERVAL = 60
+
+
+class LocalSlidingWindow(object):
+    """进程内的滑动窗口计数，Redis不可用时使用"""
+
+    def __init__(self):
+        # {key: (窗口长度, 访问时间的队列)}，各限流范围的窗口长度不同
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def hit(self, key, limit, window):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_purge:
+                # 定期清理已经过期的客户端，避免占用的内存无限增长；每个键按自己的窗口判断是否过期
+                self._hits = {k: v for k, v in self._hits.items() if v[1] and v[1][-1] > now - v[0]}
+                self._next_purge = now + LOCAL_PURGE_INTERVAL
+            hits = self._hits.setdefault(key, (window, deque()))[1]
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) < limit:
+                hits.append(now)
+                return True, 0
+            return False, hits[0] + window - now
+
+
+class Throttle(object):
+    """单个限流范围"""
+
+    local = LocalSlidingWindow()
+    next_warning = 0
+
+    def __init__(self, scope, rate):
+        self.scope = scope
+        self.limit, self.window = rate
+        self._script = None
+
+    def get_script(self):
+        if self._script is None:
+            from django_redis import get_redis_connection
+            redis_conn = get_redis_connection(get_options()['CACHE_ALIAS'])
+            self._script = redis_conn.register_script(SLIDING_WINDOW_SCRIPT)
+        return self._script
+
+    def hit(self, ident):
+        """
+        记录一次访问
+        :param ident: 客户端标识
+        :return: (是否允许, 需要等待的秒数)
+        """
+        key = 'throttle:%s:%s' % (self.scope, ident)
+        try:
+            allowed, wait_ms = self.get_script()(
+                keys=[key], args=[int(time.time() * 1000), self.window * 1000, self.limit, uuid.uuid4().hex]
+            )
+            return bool(allowed), wait_ms / 1000
+        except Exception as e:
+            # Redis 故障期间每个请求都会走到这里，日志每分钟只记录一次
+            if time.monotonic() >= Throttle.next_warning:
+                Throttle.next_warning = time.monotonic() + 60
+                logger.warning('Redis限流不可用，使用进程内限流：%s' % e)
+            return self.local.hit(key, self.limit, self.window)
+
+
+_throttles = {}
+
+
+def get_throttle(scope):
+    """
+    获取限流范围对应的 Throttle，未配置频率时返回 None
+    :param scope: 限流范围
+    """
+    if scope not in _throttles:
+        rate = parse_rate(get_options()['RATES'].get(scope))
+        _throttles[scope] = Throttle(scope, rate) if rate else None
+    return _throttles[scope]
+
+
+def get_client_ident(request):
+    """
+    识别客户端：默认使用 REMOTE_ADDR
+    :param request: 请求对象
+    :return: 客户端IP
+    """
+    if get_options()['USE_X_FORWARDED_FOR']:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check_throttle(request, scope):
+    """
+    检查请求是否超过频率限制
+    :return: 超过时返回响应对象，否则返回 None
+    """
+    throttle = get_throttle(scope)
+    if throttle is None:
+        return None
+    allowed, wait = throttle.hit(get_client_ident(request))
+    if allowed:
+        return None
+    return throttled_response(retry_after=max(1, wait))
+
+
+class ThrottleMixin(object):
+    """
+    类视图的限流：
+    throttle_scope 为 THROTTLING['RATES'] 中的限流范围，throttle_methods 为需要限流的请求方法。
+    与 LoginRequiredMixin 相同，需要放在 View 之前
+    """
+    throttle_scope = None
+    throttle_methods = ('GET', 'POST')
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in self.throttle_methods:
+            response = check_throttle(request, self.throttle_scope)
+            if response is not None:
+                return response
+        return super().dispatch(request, *args, **kwargs)
+
+
+class AsyncThrottleMixin(object):
+    """ThrottleMixin 的异步版本，用于 AsyncView，在线程池中访问Redis"""
+    throttle_scope = None
+    throttle_methods = ('GET', 'POST')
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in self.throttle_methods:
+            response = await run_sync(check_throttle, request, self.throttle_scope)
+            if response is not None:
+                return response
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
+def throttle(scope):
+    """
+    视图函数的限流装饰器
+    :param scope: 限流范围
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = check_throttle(request, scope)
+            if response is not None:
+                return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+'''
+声明式的参数校验
+
+    class RegisterSchema(Schema):
+        username = Field(r'[a-zA-Z0-9_-]{5,20}', code=RETCODE.USERERR, message='请输入5-20个字符的用户名')
+        password2 = Field(equals='password', code=RETCODE.CPWDERR, message='两次输入的密码不一致')
+
+    data, errors = RegisterSchema.validate(request.POST)
+    if errors:
+        return validation_error_response(errors)
+
+正则表达式在定义 Schema 时编译一次，并使用 fullmatch 匹配整个值（'^...$' 中的 '$' 会放过末尾的换行符）；
+一次校验所有字段，返回每个字段的 RETCODE 错误码和提示。
+'''
+import re
+
+from django import http
+
+from .response_code import RETCODE, err_msg
+
+
+class Field(object):
+    """
+    单个字段的校验规则
+    :param pattern: 值需要完整匹配的正则表达式（不含 ^ 和 $）
+    :param required: 是否必传，缺少必传参数时错误码为 RETCODE.NECESSARYPARAMERR
+    :param choices: 允许的取值
+    :param equals: 值必须与另一个字段相同
+    :param code: 校验失败时的错误码
+    :param message: 校验失败时的提示
+    """
+
+    def __init__(self, pattern=None, required=True, choices=None, equals=None,
+                 code=RETCODE.PARAMERR, message=None):
+        # 绑定方法，校验时少一次属性查找
+        self.fullmatch = re.compile(pattern).fullmatch if pattern is not None else None
+        self.required = required
+        self.choices = choices
+        self.equals = equals
+        self.error = (code, message or err_msg[code])
+        self.name = None
+
+
+# 缺少必传参数
+MISSING = (RETCODE.NECESSARYPARAMERR, err_msg[RETCODE.NECESSARYPARAMERR])
+
+
+class Schema(object):
+    """字段声明为类属性的校验规则集合，按声明的顺序校验"""
+    fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = {field.name: field for field in cls.fields}
+        for name, value in list(vars(cls).items()):
+            if isinstance(value, Field):
+                value.name = name
+                fields[name] = value
+        cls.fields = tuple(fields.values())
+        # 校验时直接遍历元组，不再逐个读取 Field 的属性
+        cls.rules = tuple(
+            (field.name, field.required, field.fullmatch, field.choices, field.equals, field.error)
+            for field in cls.fields
+        )
+
+    @classmethod
+    def validate(cls, data):
+        """
+        校验所有字段
+        :param data: QueryDict 或字典
+        :return: (校验通过的字段 {name: value}, 错误 {name: (code, message)})，缺省的可选字段不在结果中
+        """
+        cleaned, errors = {}, {}
+        get = data.get
+        for name, required, fullmatch, choices, equals, error in cls.rules:
+            value = get(name)
+            if value is None or value == '':
+                if required:
+                    errors[name] = MISSING
+                continue
+            if value.__class__ is not str:
+                # JSON 中的数字等
+                value = str(value)
+            if ((fullmatch is not None and fullmatch(value) is None)
+                    or (choices is not None and value not in choices)
+                    or (equals is not None and value != get(equals))):
+                errors[name] = error
+            else:
+                cleaned[name] = value
+        return cleaned, errors
+
+
+def validation_error_response(errors):
+    """
+    参数校验失败的响应
+    :param errors: Schema.validate 返回的错误
+    :return: JSON，状态码400；code/errmsg 为第一个错误，errors 为所有字段的错误
+    """
+    code, message = next(iter(errors.values()))
+    return http.JsonResponse({
+        'code': code,
+        'errmsg': message,
+        'errors': {name: {'code': code, 'errmsg': message} for name, (code, message) in errors.items()},
+    }, status=400)
@@ -11,6 +11,7 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_mall.settings')
+# 部署时默认使用生产环境配置，配置项从环境变量读取，见 my_mall.settings.prod
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_mall.settings.prod')
 
 application = get_wsgi_application()